@@ -1,21 +1,22 @@
-import glob
 import os
 import pandas as pd
 from rivus.main import rivus
+from rivus.io.archive import find_results, load_any
+from rivus.io.summary import update_summary
 import sys
 
 def reanalyse(directory):
-    """Return constants for all pickled rivus results in directory
+    """Return constants for all saved rivus results in directory
 
     Args:
-        directory: a directory with 1 or multiple pickled rivus instances
+        directory: a directory with 1 or multiple result archives (.npz,
+            see rivus.io.archive) or pickled rivus instances (.pgz)
 
     Returns:
         tuple (demand, cost, Pmax, Kappa_hub, Kappa_process) of concatenated
         DataFrames
     """
-    glob_pattern = os.path.join(directory, '*.pgz')
-    pickle_filenames = glob.glob(glob_pattern)
+    pickle_filenames = find_results(directory)
 
     demand = {}
     cost = {}
@@ -24,8 +25,9 @@ def reanalyse(directory):
     Kappa_process = {}
 
     for pf in pickle_filenames:
-        # load original problem object including solution
-        prob = rivus.load(pf)
+        # load problem object including solution; from archives only the
+        # frames used below are read
+        prob = load_any(pf, lazy=True)
 
         # truncate directory name and extension from pickle filename
         # remove 'scenario_' prefix, if present
@@ -52,5 +54,8 @@ def reanalyse(directory):
     return demand, cost, Pmax, Kappa_hub, Kappa_process
 
 if __name__ == '__main__':
+    # update the summary index (summary.csv) of each result directory,
+    # loading new or changed results in parallel
     for directory in sys.argv[1:]:
-        demand, cost, Pmax, Kappa_hub, Kappa_process = reanalyse(directory)
+        summary = update_summary(directory)
+        print(summary.drop(['file', 'mtime_ns', 'size', 'sha256'], axis=1))
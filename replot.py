@@ -1,19 +1,30 @@
-import glob
 import os
+from multiprocessing import Pool, cpu_count
+import matplotlib.pyplot as plt
 from rivus.main import rivus
+from rivus.io.archive import Result, find_results, load_any
 import sys
 
-def replot(directory):
-    """Recreate result figures for all pickled rivus results in directory
+def replot(directory, processes=1):
+    """Recreate result figures for all saved rivus results in directory
+
+    The figures of all results can be drawn in a pool of processes. Each
+    worker loads the results of its figures from their files (lazily, if
+    archives), so no result data is sent to the workers. Like
+    ``rivus.result_figures``, a pool must be started from within an
+    ``if __name__ == '__main__':`` block.
 
     Args:
-        directory: a directory with 1 or multiple pickled rivus instances
+        directory: a directory with 1 or multiple result archives (.npz,
+            see rivus.io.archive) or pickled rivus instances (.pgz)
+        processes: size of the process pool. By default (1), figures are
+            drawn in order in the calling process. With None, one process
+            per CPU.
 
     Returns:
         Nothing
     """
-    glob_pattern = os.path.join(directory, '*.pgz')
-    pickle_filenames = glob.glob(glob_pattern)
+    pickle_filenames = find_results(directory)
 
     data_dir = os.path.join('data', os.path.basename(directory).split('-')[0])
     # if directory = 'result/moosh' try to find a suitable building shapefile
@@ -33,16 +44,52 @@ def replot(directory):
                        'zorder': 1,
                        'linewidth': 0.1}]
 
+    results = []
     for pf in pickle_filenames:
-        prob = rivus.load(pf)
         figure_basename = os.path.splitext(pf)[0]
         if buildings:
             figure_basename += '_bld'
-        rivus.result_figures(prob, figure_basename,
-                             buildings=buildings,
-                             shapefiles=shapefiles)
+        results.append((pf, figure_basename))
+
+    if processes is None:
+        processes = cpu_count()
+    if processes == 1:
+        for pf, figure_basename in results:
+            rivus.result_figures(load_any(pf), figure_basename,
+                                 buildings=buildings,
+                                 shapefiles=shapefiles,
+                                 processes=1)
+        return
+
+    tasks = [(pf, figure_basename, figure)
+             for pf, figure_basename in results
+             for figure in rivus.RESULT_FIGURES]
+    with Pool(min(processes, len(tasks) or 1), initializer=_init_worker,
+              initargs=(buildings, shapefiles)) as pool:
+        pool.map(_replot_figure, tasks, chunksize=1)
+
+
+# state of a replot worker process: shapefiles and the last loaded result
+_worker = {}
+
+
+def _init_worker(buildings, shapefiles):
+    plt.switch_backend('Agg')
+    _worker.update(buildings=buildings, shapefiles=shapefiles)
+
+
+def _replot_figure(task):
+    pf, figure_basename, figure = task
+    if _worker.get('filename') != pf:
+        # tasks are ordered by file, so a worker mostly reuses its result
+        if isinstance(_worker.get('prob'), Result):
+            _worker['prob'].close()
+        _worker.update(filename=pf, prob=load_any(pf, lazy=True))
+    rivus.save_result_figure(_worker['prob'], figure_basename, figure,
+                             buildings=_worker['buildings'],
+                             shapefiles=_worker['shapefiles'])
 
 
 if __name__ == '__main__':
     for directory in sys.argv[1:]:
-        replot(directory)
+        replot(directory, processes=None)
@@ -0,0 +1,522 @@
+"""Reversible reductions of the street network before model creation.
+
+Street graphs contain many vertices, which only connect two street segments.
+Each of them adds arcs, ``Psi`` binaries and flow balance constraints to the
+model. Contracting chains of such pass-through vertices into single edges
+reduces the problem size, the results can be mapped back onto the original
+edges afterwards.
+
+Other edges can never be part of an optimal network, e.g. dead ends without
+demand or detours, which are longer than another path between their ends.
+Pruning removes them, they simply stay unbuilt in the results.
+
+Example
+-------
+::
+
+    vertex_c, edge_c, mapping = contract_degree2(data, vertex, edge)
+    vertex_c, edge_c, removed = prune_edges(data, vertex_c, edge_c)
+    prob = create_model(data, vertex_c, edge_c)
+    ...
+    _, pmax, _, _ = get_constants(prob)
+    pmax = expand_edge_result(pmax, mapping)
+"""
+import networkx as nx
+import pandas as pd
+from geopandas import GeoDataFrame
+from shapely.geometry import LineString
+
+from ..main.rivus import line_lengths
+
+
+def contract_degree2(data, vertex, edge, keep=None):
+    """Merge chains of degree-2 vertices into super-edges.
+
+    A vertex is contracted, if it connects exactly two edges, has no source
+    capacity for any commodity and is not listed in `keep`. The edges of a
+    chain are merged into one edge: geometries are joined (so the length is
+    the sum of the lengths) and area demands are summed up, other edge
+    attributes are taken from the first edge of the chain. Chains which
+    would form a loop or duplicate an existing edge keep one inner vertex.
+
+    Note, that the contracted problem is a restriction of the original one:
+    contracted vertices can not host processes and a chain is built in
+    one piece with a single capacity. Use `keep` to retain process
+    candidates.
+
+    Parameters
+    ----------
+    data : dict
+        Processed Excel spreadsheet by ``read_excel``, for the names of
+        the commodities and area types.
+    vertex : GeoDataFrame
+        Vertex IDs in column (or index) 'Vertex', source capacities of
+        commodities as columns, as awaited by ``create_model``.
+    edge : GeoDataFrame
+        Vertex IDs in columns (or index) 'Vertex1' and 'Vertex2',
+        LineString geometries and area columns, as awaited by
+        ``create_model``.
+    keep : iterable, optional
+        IDs of vertices, which must not be contracted. Vertices with a
+        source capacity are always kept. **Process candidates are not:**
+        ``create_model`` may site a process at any vertex, so a contracted
+        degree-2 vertex loses its processes. List the vertices, where
+        processes may be built, here.
+
+    Returns
+    -------
+    (vertex, edge, mapping) tuple
+        + vertex, edge: reduced copies of the input, in the input's layout.
+        + mapping: DataFrame indexed by the original (Vertex1, Vertex2)
+          with columns 'Super1', 'Super2' of the edge it was merged into,
+          'reversed' (True, if the original edge is traversed from Vertex2
+          to Vertex1 on the way from Super1 to Super2) and 'share' (the
+          edge's share of the summed area, or of the length, if the chain
+          has no area). Input for ``expand_edge_result``.
+    """
+    vertex_indexed = vertex.index.names == ['Vertex']
+    edge_indexed = edge.index.names == ['Vertex1', 'Vertex2']
+    vdf = vertex if vertex_indexed else vertex.set_index('Vertex')
+    edf = edge.reset_index() if edge_indexed else edge
+    keep = set() if keep is None else set(keep)
+
+    area_types = edf.columns.intersection(
+        data['area_demand'].index.get_level_values(0).unique())
+    source_cols = vdf.columns.intersection(data['commodity'].index)
+    has_source = (vdf[source_cols] > 0).any(axis=1)
+
+    # undirected adjacency: vertex -> [(neighbour, position in edf), ...]
+    neighbours = {}
+    for pos, (v1, v2) in enumerate(zip(edf['Vertex1'], edf['Vertex2'])):
+        neighbours.setdefault(v1, []).append((v2, pos))
+        neighbours.setdefault(v2, []).append((v1, pos))
+
+    contractible = set(
+        v for v, nbs in neighbours.items()
+        if len(nbs) == 2 and nbs[0][0] != nbs[1][0] and v not in keep and
+        not has_source.get(v, False))
+
+    chains = _find_chains(neighbours, contractible)
+    while True:
+        # split chains that would become loops or parallel edges
+        seen = set()
+        conflicts = []
+        for chain in sorted(chains, key=len):
+            start, end = chain[0][0], chain[-1][1]
+            pair = frozenset((start, end))
+            if len(chain) > 1 and (start == end or pair in seen):
+                conflicts.append(chain[len(chain) // 2][0])
+            else:
+                seen.add(pair)
+        if not conflicts:
+            break
+        contractible.difference_update(conflicts)
+        chains = _find_chains(neighbours, contractible)
+
+    rows = []
+    mapping = []
+    vertex_points = vdf.geometry if 'geometry' in vdf.columns else None
+    for chain in chains:
+        start, end = chain[0][0], chain[-1][1]
+        if len(chain) == 1:
+            # untouched edge, keep its orientation
+            pos = chain[0][2]
+            start, end = edf['Vertex1'].iat[pos], edf['Vertex2'].iat[pos]
+            chain = [(start, end, pos)]
+        elif start > end:
+            chain = [(w, v, pos) for (v, w, pos) in reversed(chain)]
+            start, end = end, start
+        members = edf.iloc[[pos for (_, _, pos) in chain]]
+
+        row = members.iloc[0].copy()
+        row['Vertex1'], row['Vertex2'] = start, end
+        if len(chain) > 1:
+            row[area_types] = members[area_types].sum()
+            first_point = (vertex_points[start]
+                           if vertex_points is not None else None)
+            row['geometry'] = _join_lines(members.geometry, first_point)
+        rows.append(row)
+
+        area = members[area_types].sum(axis=1).values
+        weight = area if area.sum() > 0 else members.geometry.length.values
+        total = weight.sum()
+        for k, (v, w, pos) in enumerate(chain):
+            mapping.append({
+                'Vertex1': edf['Vertex1'].iat[pos],
+                'Vertex2': edf['Vertex2'].iat[pos],
+                'Super1': start,
+                'Super2': end,
+                'reversed': edf['Vertex1'].iat[pos] != v,
+                'share': weight[k] / total if total > 0 else 1. / len(chain)})
+
+    edge_c = pd.DataFrame(rows, columns=edf.columns).astype(
+        edf.dtypes.to_dict())
+    if isinstance(edf, GeoDataFrame):
+        edge_c = GeoDataFrame(edge_c, geometry='geometry', crs=edf.crs)
+    # fresh row labels: create_model aligns the peak demand with them
+    edge_c = edge_c.sort_values(['Vertex1', 'Vertex2']).reset_index(
+        drop=True)
+    if edge_indexed:
+        edge_c = edge_c.set_index(['Vertex1', 'Vertex2'])
+
+    vertex_c = vdf[~vdf.index.isin(contractible)].copy()
+    if not vertex_indexed:
+        vertex_c = vertex_c.reset_index()
+
+    mapping = pd.DataFrame(mapping, columns=[
+        'Vertex1', 'Vertex2', 'Super1', 'Super2', 'reversed', 'share'])
+    mapping = mapping.set_index(['Vertex1', 'Vertex2']).sort_index()
+    return vertex_c, edge_c, mapping
+
+
+def prune_edges(data, vertex, edge, keep=None, xi_zero=None,
+                verbose=False, flow_formulation='timestep'):
+    """Remove edges, which can not be part of an optimal network.
+
+    Only edges without area demand are removed, in three steps:
+
+    1. reduced cost: edges whose ``Xi`` is 0 for all transportable
+       commodities in `xi_zero`, e.g. from
+       :func:`rivus.main.heuristics.reduced_cost_fixing`.
+    2. dead end: edges to a vertex without source capacity, which is not
+       listed in `keep` and has no other edge (repeatedly). A process
+       there is never cheaper than at the other end of the edge.
+    3. detour: chains of edges (through vertices like in dead ends, but
+       with two edges), which have another, strictly shorter path between
+       their ends (longest chains first). Transport along that path is
+       cheaper and has less losses, as all costs and losses grow with the
+       length. This assumes that capacities (cap-max) of the path do not
+       bind.
+
+    Dead ends are pruned again after step 3. Vertices without any edge
+    left are removed, unless they have source capacity or are in `keep`.
+
+    Parameters
+    ----------
+    data : dict
+        Processed Excel spreadsheet by ``read_excel``, for the names of
+        the commodities and area types.
+    vertex : GeoDataFrame
+        Vertex IDs in column (or index) 'Vertex', source capacities of
+        commodities as columns, as awaited by ``create_model``.
+    edge : GeoDataFrame
+        Vertex IDs in columns (or index) 'Vertex1' and 'Vertex2',
+        LineString geometries and area columns, as awaited by
+        ``create_model``.
+    keep : iterable, optional
+        IDs of vertices, which must not become dead ends, e.g. process
+        candidates.
+    xi_zero : iterable, optional
+        (Vertex1, Vertex2, commodity) tuples, whose ``Xi`` is 0 in any
+        optimal solution.
+    verbose : bool, optional
+        Print the number of removed edges, vertices and binaries.
+    flow_formulation : {'timestep', 'aggregated'}, optional
+        Flow formulation of ``create_model``, only to count the removed
+        binaries (``Psi`` per arc and time step or ``Delta`` per edge).
+
+    Returns
+    -------
+    (vertex, edge, removed) tuple
+        + vertex, edge: reduced copies of the input, in the input's layout.
+        + removed: DataFrame indexed by the removed (Vertex1, Vertex2) with
+          column 'reason' ('reduced cost', 'dead end' or 'detour').
+    """
+    vertex_indexed = vertex.index.names == ['Vertex']
+    edge_indexed = edge.index.names == ['Vertex1', 'Vertex2']
+    vdf = vertex if vertex_indexed else vertex.set_index('Vertex')
+    edf = edge if edge_indexed else edge.set_index(['Vertex1', 'Vertex2'])
+    keep = set() if keep is None else set(keep)
+
+    commodity = data['commodity']
+    co_transportable = commodity.index[commodity['cap-max'] > 0]
+    area_types = edf.columns.intersection(
+        data['area_demand'].index.get_level_values(0).unique())
+    has_demand = (edf[area_types] > 0).any(axis=1)
+    source_cols = vdf.columns.intersection(commodity.index)
+    has_source = (vdf[source_cols] > 0).any(axis=1)
+    fixed = set(keep).union(has_source.index[has_source])
+
+    graph = nx.Graph()
+    graph.add_nodes_from(vdf.index)
+    for (v1, v2), length in zip(edf.index, line_lengths(edf.geometry)):
+        graph.add_edge(v1, v2, length=length, edge=(v1, v2))
+    removed = []
+
+    def remove(e, reason):
+        graph.remove_edge(*e)
+        removed.append((e[0], e[1], reason))
+
+    def prune_dead_ends():
+        leaves = [v for v in graph if graph.degree(v) == 1]
+        while leaves:
+            v = leaves.pop()
+            if v in fixed or graph.degree(v) != 1:
+                continue
+            w, = graph.neighbors(v)
+            e = graph.edges[v, w]['edge']
+            if not has_demand[e]:
+                remove(e, 'dead end')
+                if graph.degree(w) == 1:
+                    leaves.append(w)
+
+    if xi_zero is not None:
+        zero = {}
+        for (v1, v2, co) in xi_zero:
+            zero.setdefault((v1, v2), set()).add(co)
+        for e, cos in zero.items():
+            if (e in edf.index and not has_demand[e] and
+                    cos.issuperset(co_transportable)):
+                remove(e, 'reduced cost')
+
+    prune_dead_ends()
+    for start, end, chain in sorted(_detour_chains(graph, fixed, has_demand),
+                                    key=lambda c: -sum(l for _, _, l in c[2])):
+        if not all(graph.has_edge(v, w) for v, w, _ in chain):
+            continue
+        length = sum(l for _, _, l in chain)
+        attrs = [graph.edges[v, w] for v, w, _ in chain]
+        graph.remove_edges_from([(v, w) for v, w, _ in chain])
+        try:
+            detour = nx.dijkstra_path_length(graph, start, end,
+                                             weight='length')
+        except nx.NetworkXNoPath:
+            detour = None
+        graph.add_edges_from((v, w, attr)
+                             for (v, w, _), attr in zip(chain, attrs))
+        if detour is not None and detour < length:
+            for attr in attrs:
+                remove(attr['edge'], 'detour')
+    prune_dead_ends()
+
+    removed = pd.DataFrame(removed, columns=['Vertex1', 'Vertex2', 'reason'])
+    removed = removed.set_index(['Vertex1', 'Vertex2']).sort_index()
+    edge_p = edf.drop(removed.index)
+    if not edge_indexed:
+        edge_p = edge_p.reset_index()
+    isolated = [v for v in graph
+                if graph.degree(v) == 0 and v not in fixed]
+    vertex_p = vdf.drop(isolated)
+    if not vertex_indexed:
+        vertex_p = vertex_p.reset_index()
+
+    if verbose:
+        if flow_formulation == 'aggregated':
+            # Xi and Delta per edge and commodity
+            per_edge = 2 * len(co_transportable)
+        else:
+            # Xi per commodity, Psi per arc, commodity and time step
+            per_edge = len(co_transportable) * (1 + 2 * len(data['time']))
+        # Phi per vertex and process (not hub, as by create_model)
+        num_processes = len(_vertex_processes(data))
+        binaries = (len(removed) * per_edge +
+                    len(isolated) * num_processes)
+        print('Pruned {} of {} edges ({}), {} vertices and {} binaries.'
+              .format(len(removed), len(edf),
+                      ', '.join('{} {}'.format(n, reason) for reason, n
+                                in removed['reason'].value_counts().items()),
+                      len(isolated), binaries))
+    return vertex_p, edge_p, removed
+
+
+def _vertex_processes(data):
+    """Return the processes, which ``create_model`` places in vertices.
+
+    These are all processes except the hubs (no fixed investment costs, no
+    minimum capacity and exactly one input with ratio 1), which are placed
+    in edges.
+    """
+    if 'process' not in data:
+        return pd.Index([])
+    process = data['process']
+    r_in = data['process_commodity'].xs('In', level='Direction')['ratio']
+    is_hub = ((process['cost-inv-fix'] == 0) & (process['cap-min'] == 0) &
+              (r_in.groupby(level='Process').count() == 1)
+              .reindex(process.index, fill_value=False) &
+              (r_in.groupby(level='Process').sum() == 1)
+              .reindex(process.index, fill_value=False))
+    return process.index[~is_hub]
+
+
+def _detour_chains(graph, fixed, has_demand):
+    """Return chains of edges without demand, candidates for detours.
+
+    A chain passes through vertices with two edges, which are not in
+    `fixed`, and ends at other vertices. Chains returning to their start
+    are included.
+
+    Returns
+    -------
+    list
+        (start, end, [(from_vertex, to_vertex, length), ...]) tuples
+    """
+    def is_free(v, w):
+        return not has_demand[graph.edges[v, w]['edge']]
+
+    def is_inner(v):
+        return (v not in fixed and graph.degree(v) == 2 and
+                all(is_free(v, w) for w in graph.neighbors(v)))
+
+    def extend(prev, current, used):
+        walk = []
+        while is_inner(current):
+            nxt, = [w for w in graph.neighbors(current) if w != prev]
+            if frozenset((current, nxt)) in used:
+                break
+            used.add(frozenset((current, nxt)))
+            walk.append((current, nxt))
+            prev, current = current, nxt
+        return current, walk
+
+    visited = set()
+    chains = []
+    for v1, v2 in graph.edges():
+        if frozenset((v1, v2)) in visited or not is_free(v1, v2):
+            continue
+        used = set([frozenset((v1, v2))])
+        end, forward = extend(v1, v2, used)
+        start, backward = extend(v2, v1, used)
+        path = [(w, v) for (v, w) in reversed(backward)] + [(v1, v2)]
+        path += forward
+        visited.update(used)
+        chains.append((start, end, [(v, w, graph.edges[v, w]['length'])
+                                    for v, w in path]))
+    return chains
+
+
+def _find_chains(neighbours, contractible):
+    """Walk the graph from all non-contractible vertices.
+
+    Vertices on cycles without any non-contractible vertex are removed from
+    `contractible` (one per cycle) to serve as chain ends.
+
+    Returns
+    -------
+    list
+        One list of (from_vertex, to_vertex, edge position) steps per chain,
+        chains without contractible vertices consist of a single edge.
+    """
+    visited = set()
+    chains = []
+
+    def walk(start, neighbour, pos):
+        chain = [(start, neighbour, pos)]
+        visited.add(pos)
+        current = neighbour
+        while current in contractible and current != start:
+            (w, next_pos), = [(w, p) for (w, p) in neighbours[current]
+                              if p not in visited]
+            chain.append((current, w, next_pos))
+            visited.add(next_pos)
+            current = w
+        return chain
+
+    starts = [v for v in neighbours if v not in contractible]
+    while True:
+        for v in starts:
+            for (w, pos) in neighbours[v]:
+                if pos not in visited:
+                    chains.append(walk(v, w, pos))
+        # cycles of contractible vertices only: keep one of them
+        rest = [v for v in contractible
+                if any(pos not in visited for (_, pos) in neighbours[v])]
+        if not rest:
+            return chains
+        contractible.discard(rest[0])
+        starts = [rest[0]]
+
+
+def _join_lines(lines, first_point=None):
+    """Join consecutive LineStrings, flipping them to form one LineString.
+
+    Parameters
+    ----------
+    lines : iterable
+        shapely LineStrings in chain order, each in arbitrary direction
+    first_point : shapely Point, optional
+        Start of the chain. If omitted, it is derived from the first two
+        lines.
+
+    Returns
+    -------
+    shapely LineString
+    """
+    lines = [list(line.coords) for line in lines]
+    if first_point is not None:
+        current = first_point.coords[0]
+    else:
+        # start at the end of the first line, which is not shared
+        head, tail = lines[0], lines[-1 if len(lines) == 1 else 1]
+        current = max((head[0], head[-1]), key=lambda p: min(
+            _squared_distance(p, tail[0]), _squared_distance(p, tail[-1])))
+
+    coords = []
+    for line in lines:
+        if (_squared_distance(line[-1], current) <
+                _squared_distance(line[0], current)):
+            line = line[::-1]
+        coords.extend(line if not coords else line[1:])
+        current = line[-1]
+    return LineString(coords)
+
+
+def _squared_distance(p, q):
+    return (p[0] - q[0]) ** 2 + (p[1] - q[1]) ** 2
+
+
+def expand_edge_result(result, mapping, directed=False, split=False):
+    """Map a result of a contracted model back onto the original edges.
+
+    Parameters
+    ----------
+    result : DataFrame or Series
+        Indexed by (Vertex1, Vertex2, ...) of the contracted edges, e.g.
+        `Pmax` or `Kappa_hub` from ``get_constants``. For arc values
+        (`directed`), the first two levels are the arc's (from, to)
+        vertices, e.g. `flows` of ``get_timeseries``.
+    mapping : DataFrame
+        As returned by ``contract_degree2``.
+    directed : bool, optional
+        If True, arc directions are turned along with reversed edges.
+    split : bool, optional
+        If False, each original edge gets the value of its super-edge,
+        which is the right choice for capacities, binaries and flows.
+        If True, values are distributed by the 'share' of the edges,
+        e.g. for the edge supply `Sigma` or hub capacities.
+
+    Returns
+    -------
+    DataFrame or Series
+        Like `result`, indexed by the original edges
+    """
+    is_series = isinstance(result, pd.Series)
+    frame = result.to_frame() if is_series else result
+    names = list(frame.index.names)
+    key_names = ['_from', '_to']
+    rest_names = ['_level{}'.format(k) for k in range(2, len(names))]
+    frame = frame.copy()
+    frame.index.names = key_names + rest_names
+    columns = list(frame.columns)
+
+    link = mapping.reset_index()
+    original = list(zip(link['Vertex1'], link['Vertex2']))
+    forward = [(v2, v1) if rev else (v1, v2)
+               for (v1, v2), rev in zip(original, link['reversed'])]
+    arcs = [(s1, s2, v, w, share) for (s1, s2, (v, w), share)
+            in zip(link['Super1'], link['Super2'], forward, link['share'])]
+    if directed:
+        arcs += [(s2, s1, w, v, share) for (s1, s2, v, w, share) in arcs]
+    else:
+        arcs = [(s1, s2, v1, v2, share) for (s1, s2, _, _, share), (v1, v2)
+                in zip(arcs, original)]
+    arcs = pd.DataFrame(arcs, columns=key_names + ['_v1', '_v2', '_share'])
+
+    expanded = frame.reset_index().merge(arcs, on=key_names, how='inner')
+    if split:
+        expanded[columns] = expanded[columns].multiply(
+            expanded['_share'], axis=0)
+    expanded = expanded.drop(columns=key_names + ['_share'])
+    expanded = expanded.set_index(['_v1', '_v2'] + rest_names).sort_index()
+    expanded.index.names = names
+    expanded = expanded[columns]
+    return expanded[columns[0]] if is_series else expanded
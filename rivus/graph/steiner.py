@@ -0,0 +1,337 @@
+"""Steiner tree heuristic for a first network design, used as MIP start.
+
+Solvers spend much of their time on finding a first feasible network
+topology. A tree, which connects a source of a commodity with all edges
+demanding it at low fixed investment costs (``cost-inv-fix`` x length), is
+found quickly on the street graph. Its flows follow from the demands by
+summing them up from the leaves to the source, which gives values for all
+model variables.
+
+Example
+-------
+::
+
+    prob = create_model(data, vertex, edge)
+    design = steiner_design(prob)
+    violated = design_start(prob, design)
+    optim = SolverFactory('appsi_highs')
+    result = optim.solve(prob, warmstart=True)
+"""
+from collections import deque
+
+import networkx as nx
+from networkx.algorithms.approximation import steiner_tree
+import pyomo.core as pyomo
+
+from ..main.rivus import update_costs
+
+
+def edge_needs(prob):
+    """Return the power (kW) each edge draws of each commodity and time.
+
+    Demand of a commodity with a source vertex is drawn from the edge
+    directly. Demand of a commodity without source is covered by hub
+    processes producing it from sourced commodities (e.g. a domestic
+    heating from gas), whose inputs are drawn from the edge instead. The
+    cheapest hub is used up to its cap-max, the remaining demand is shared
+    by the next cheapest hubs.
+
+    Parameters
+    ----------
+    prob : ConcreteModel
+        rivus model instance
+
+    Returns
+    -------
+    (need, hub_activity) tuple
+        + need: {commodity: {edge: [kW per time step]}}, time steps in the
+          order of ``prob.time``
+        + hub_activity: {(edge, hub): [kW per time step]}
+    """
+    times = list(prob.time)
+    sourced = set(co for co in prob.co_source
+                  if any(pyomo.value(prob.vertex_dict[v][co]) > 0
+                         for v in prob.vertex))
+    need = {}
+    hub_activity = {}
+    for co in prob.co_demand:
+        scaling = [prob.time_dict[t][co] for t in times]
+        direct = co in sourced and co in prob.co_transportable
+        hubs = [] if direct else hubs_by_costs(prob, co, sourced)
+        for edge, peak in prob.peak_dict[co].items():
+            if not peak > 0:
+                continue
+            demand = [peak * s for s in scaling]
+            if direct:
+                _add(need.setdefault(co, {}), edge, demand)
+                continue
+            remaining = 1.
+            for hub in hubs:
+                activity = [d / prob.r_out_dict[hub, co] for d in demand]
+                cap_max = pyomo.value(prob.hub_dict[hub]['cap-max'])
+                share = (min(remaining, cap_max / max(activity))
+                         if max(activity) > 0 else remaining)
+                remaining -= share
+                activity = [a * share for a in activity]
+                _add(hub_activity, (edge, hub), activity)
+                for ci, ratio in _hub_inputs(prob, hub):
+                    _add(need.setdefault(ci, {}), edge,
+                         [a * ratio for a in activity])
+                if remaining <= 0:
+                    break
+    return need, hub_activity
+
+
+def hubs_by_costs(prob, co, sourced):
+    """Return the hubs producing `co`, by ascending annual costs per kW.
+
+    Only hubs consuming transportable commodities out of `sourced` are
+    considered. Costs are investment and fix costs plus variable costs of
+    the hub and its inputs at full load in all time steps.
+    """
+    full_load = sum(prob.time_dict[t]['weight'] * prob.time_dict[t][co]
+                    for t in prob.time)
+    costs = {}
+    for h, ratio_out in prob.hub_outputs.get(co, ()):
+        inputs = _hub_inputs(prob, h)
+        if not all(ci in sourced and ci in prob.co_transportable
+                   for ci, _ in inputs):
+            continue
+        cost_var = pyomo.value(prob.hub_dict[h]['cost-var']) + sum(
+            ratio * pyomo.value(prob.commodity_dict[ci]['cost-var'])
+            for ci, ratio in inputs)
+        costs[h] = (pyomo.value(prob.hub_dict[h]['cost-inv-var']) +
+                    pyomo.value(prob.hub_dict[h]['cost-fix']) +
+                    full_load * cost_var) / ratio_out
+    return sorted(costs, key=costs.get)
+
+
+def steiner_design(prob, need=None):
+    """Return a tree per commodity, connecting its demand to a source.
+
+    For every transportable commodity with a source vertex and demand (see
+    ``edge_needs``), an approximate minimum Steiner tree is searched in each
+    connected part of the street graph. Terminals are the endpoints of the
+    demanding edges and the vertex with the largest source capacity, edges
+    are weighted by ``cost-inv-fix`` x length (or by length, if the
+    commodity has no fixed costs), demanding edges weigh nothing.
+
+    Parameters
+    ----------
+    prob : ConcreteModel
+        rivus model instance
+    need : dict, optional
+        As returned by ``edge_needs``, calculated if omitted.
+
+    Returns
+    -------
+    dict
+        {commodity: [edge, ...]} of the edges (as in ``prob.edge``) to be
+        built, including all demanding edges.
+    """
+    if need is None:
+        need, _ = edge_needs(prob)
+    design = {}
+    for co, edge_need in need.items():
+        if co not in prob.co_transportable:
+            continue
+        cost_fix = pyomo.value(prob.commodity_dict[co]['cost-inv-fix'])
+        demanding = set(e for e, demand in edge_need.items()
+                        if max(demand) > 0)
+        graph = nx.Graph()
+        for (v1, v2) in prob.edge:
+            length = prob.edge_length_dict[v1, v2]
+            weight = 0 if (v1, v2) in demanding else (
+                cost_fix * length if cost_fix > 0 else length)
+            graph.add_edge(v1, v2, weight=weight, edge=(v1, v2))
+
+        built = set(demanding)
+        for part in nx.connected_components(graph):
+            terminals = set(v for e in demanding if e[0] in part for v in e)
+            root = _largest_source(prob, co, part)
+            if not terminals or root is None:
+                continue
+            terminals.add(root)
+            tree = steiner_tree(graph.subgraph(part), list(terminals),
+                                weight='weight')
+            built.update(graph.edges[v1, v2]['edge']
+                         for (v1, v2) in tree.edges())
+        design[co] = sorted(built)
+    return design
+
+
+def design_start(prob, design, need=None, hub_activity=None):
+    """Assign the variable values of a network design to a model instance.
+
+    Every commodity flows through the edges of its design from the vertex
+    with the largest source capacity in each part of the design: along a
+    breadth first spanning tree, while edges closing a cycle are fed from
+    their endpoint next to the source. Flows (incl. fixed and variable
+    losses) are summed up from the leaves in each time step, which also
+    gives ``Pmax``, ``Rho`` and the direction binaries. Hubs chosen by
+    ``edge_needs`` run in the edges, processes are not built. The values
+    can be passed to a solver as MIP start, e.g. with
+    ``optim.solve(prob, warmstart=True)``.
+
+    As processes are not built, the start is infeasible, whenever a
+    demanded commodity (or the input of a needed hub) can only be produced
+    by a process in a vertex, e.g. Elec without an Elec source, but from
+    a CHP plant. This is the most common case. The start is also
+    infeasible, if a source is too small for its tree, a hub exceeds its
+    cap-max or some demand can not be reached. The violated constraints
+    are returned then, the solver will reject or repair the start.
+
+    Parameters
+    ----------
+    prob : ConcreteModel
+        rivus model instance, values of its unfixed variables are replaced
+    design : dict
+        {commodity: [edge, ...]}, e.g. from ``steiner_design``
+    need, hub_activity : dict, optional
+        As returned by ``edge_needs``, calculated if omitted.
+
+    Returns
+    -------
+    list
+        Names of violated constraints and variable bounds, empty if the
+        start is feasible.
+    """
+    if need is None or hub_activity is None:
+        need, hub_activity = edge_needs(prob)
+    times = list(prob.time)
+    timestep = getattr(prob, 'flow_formulation', 'timestep') == 'timestep'
+
+    for var in prob.component_data_objects(pyomo.Var, active=True):
+        if not var.fixed:
+            var.value = 0
+
+    for (edge, h), activity in hub_activity.items():
+        for t, a in zip(times, activity):
+            _set(prob.Epsilon_hub[edge + (h, t)], a)
+        _set(prob.Kappa_hub[edge + (h,)], max(activity))
+
+    for co, edges in design.items():
+        edge_need = need.get(co, {})
+        loss_fix = pyomo.value(prob.commodity_dict[co]['loss-fix'])
+        loss_var = pyomo.value(prob.commodity_dict[co]['loss-var'])
+        neighbours = {}
+        for (v1, v2) in edges:
+            _set(prob.Xi[v1, v2, co], 1)
+            neighbours.setdefault(v1, []).append(v2)
+            neighbours.setdefault(v2, []).append(v1)
+
+        # orient design edges away from the sources
+        arcs_from = {}
+        order = []
+        depth = {}
+        for root in sorted(neighbours, key=lambda v: -_capacity(prob, v, co)):
+            if root in depth:
+                continue
+            depth[root] = 0
+            queue = deque([root])
+            component = []
+            while queue:
+                v = queue.popleft()
+                component.append(v)
+                for w in neighbours[v]:
+                    if w not in depth:
+                        depth[w] = depth[v] + 1
+                        arcs_from.setdefault(v, []).append((w, True))
+                        queue.append(w)
+                    elif depth[w] > depth[v] or (
+                            depth[w] == depth[v] and v < w):
+                        # edge closing a cycle, fed from v
+                        arcs_from.setdefault(v, []).append((w, False))
+            order.append((root, component))
+
+        for root, component in order:
+            pin_max = {}
+            for k, t in enumerate(times):
+                outflow = {}
+                for v in reversed(component):
+                    total = 0
+                    for w, is_tree in arcs_from.get(v, ()):
+                        (v1, v2) = (v, w) if (v, w) in prob.edge else (w, v)
+                        length = prob.edge_length_dict[v1, v2]
+                        sigma = edge_need.get((v1, v2), [0] * len(times))[k]
+                        pot = outflow[w] if is_tree else 0
+                        carried = sigma + pot
+                        used = 1 if (not timestep or carried > 0) else 0
+                        pin = ((carried + used * length * loss_fix) /
+                               (1 - length * loss_var))
+                        _set(prob.Sigma[v1, v2, co, t], sigma)
+                        _set(prob.Pin[v, w, co, t], pin)
+                        _set(prob.Pot[v, w, co, t], pot)
+                        if timestep:
+                            _set(prob.Psi[v, w, co, t], used)
+                        pin_max[v1, v2] = max(pin_max.get((v1, v2), 0), pin)
+                        total += pin
+                    outflow[v] = total
+                if co in prob.co_source:
+                    _set(prob.Rho[root, co, t], outflow[root])
+            for (v1, v2), pmax in pin_max.items():
+                _set(prob.Pmax[v1, v2, co], pmax)
+            if not timestep and co in prob.co_directed:
+                for v in component:
+                    for w, _ in arcs_from.get(v, ()):
+                        if (v, w) in prob.edge:
+                            _set(prob.Delta[v, w, co], 1)
+
+    # costs follow from their definitions
+    update_costs(prob)
+
+    return violations(prob)
+
+
+def violations(prob, tolerance=1e-6):
+    """Return names of constraints and variable bounds violated by values.
+
+    Violations are relative to the size of the bound (at least 1).
+    """
+    violated = []
+    for con in prob.component_data_objects(pyomo.Constraint, active=True):
+        body = pyomo.value(con.body)
+        for bound, sign in ((con.lower, 1), (con.upper, -1)):
+            if bound is None:
+                continue
+            bound = pyomo.value(bound)
+            if sign * (body - bound) < -tolerance * max(1, abs(bound)):
+                violated.append(con.name)
+                break
+    for var in prob.component_data_objects(pyomo.Var, active=True):
+        if (var.lb is not None and var.value < var.lb - tolerance or
+                var.ub is not None and
+                var.value > var.ub + tolerance * max(1, abs(var.ub))):
+            violated.append(var.name)
+    return violated
+
+
+def _largest_source(prob, co, vertices):
+    """Return the vertex with the largest source capacity of co, or None."""
+    root, capacity = None, 0
+    for v in vertices:
+        if _capacity(prob, v, co) > capacity:
+            root, capacity = v, _capacity(prob, v, co)
+    return root
+
+
+def _capacity(prob, v, co):
+    return pyomo.value(prob.vertex_dict[v][co]) if co in prob.co_source else 0
+
+
+def _hub_inputs(prob, hub):
+    """Return [(commodity, ratio), ...] consumed by a hub."""
+    return [(co, prob.r_in_dict[h, co]) for (h, co) in prob.r_in_dict
+            if h == hub]
+
+
+def _add(table, key, values):
+    if key in table:
+        table[key] = [a + b for a, b in zip(table[key], values)]
+    else:
+        table[key] = list(values)
+
+
+def _set(vardata, value):
+    if not vardata.fixed:
+        vardata.value = value
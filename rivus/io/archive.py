@@ -0,0 +1,514 @@
+"""Compact columnar archive of solved rivus models.
+
+``rivus.save`` pickles the complete ConcreteModel: all sets, parameters,
+constraints and expressions, although the plot and report functions only
+read the input frames and the variable values. Such files are large, slow
+to load and can only be read with a compatible pyomo version.
+
+``save_result`` stores just these parts as plain numpy arrays in a single
+compressed ``.npz`` file (no pickle):
+
+- the input frames ``prob.params`` (incl. vertex and edge geometries as
+  well-known binary) and the derived ``peak``, ``r_in``, ``r_out`` and
+  ``edge_length``
+- the elements of the index sets of all variables, once per set
+- the nonzero values of all variables with their position in the product
+  of their index sets
+
+``load_result`` returns a ``Result``, which ``get_constants``,
+``get_timeseries``, ``get_entity``, ``plot``, ``result_figures``,
+``report`` and ``rivus.io.db.store`` accept in place of the model.
+
+Example
+-------
+::
+
+    save_result(prob, 'result/scenario_base.npz')
+    result = load_result('result/scenario_base.npz')
+    costs, pmax, kappa_hub, kappa_process = get_constants(result)
+    report(result, 'result/scenario_base.xlsx')
+"""
+import glob
+import json
+import os
+import struct
+import zipfile
+from collections.abc import Mapping
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pyomo.core as pyomo
+from geopandas import GeoDataFrame
+from shapely import wkb
+
+from ..main.rivus import (get_entity, get_onset_names, unique_labels,
+                          var_values, set_factors, entity_index, product_index,
+                          load)
+
+VERSION = 1
+FRAMES = ('peak', 'r_in', 'r_out', 'edge_length')
+LOCAL_HEADER = struct.Struct('<4s5H3L2H')  # zip local file header
+
+
+class Result(object):
+    """Inputs and variable values of a solved rivus model.
+
+    Attributes
+    ----------
+    params : mapping
+        Input DataFrames by name, like ``prob.params``
+    frames : mapping
+        peak, r_in, r_out and edge_length, also accessible as attributes
+        like those of the model
+    flow_formulation : str
+        'timestep' or 'aggregated', see ``create_model``
+    variables : mapping
+        Variable values by name, each a Series like returned by
+        ``get_entity``
+    archive : ArchiveReader or None
+        The open archive of a result loaded with ``lazy=True``. Its mappings
+        read each entry from the archive when it is first accessed.
+    """
+
+    def __init__(self, params, frames, flow_formulation, variables,
+                 archive=None):
+        self.params = params
+        self.frames = frames
+        self.flow_formulation = flow_formulation
+        self.variables = variables
+        self.archive = archive
+
+    def close(self):
+        """Close the archive of a lazily loaded result."""
+        if self.archive is not None:
+            self.archive.close()
+
+    @property
+    def peak(self):
+        return self.frames['peak']
+
+    @property
+    def r_in(self):
+        return self.frames['r_in']
+
+    @property
+    def r_out(self):
+        return self.frames['r_out']
+
+    @property
+    def edge_length(self):
+        return self.frames['edge_length']
+
+    def entity(self, name):
+        """Return the values of a variable, like ``get_entity``."""
+        return self.variables[name].copy()
+
+
+class LazyMapping(Mapping):
+    """Read-only mapping, calling a loader for each key on first access."""
+
+    def __init__(self, loaders):
+        self._loaders = loaders
+        self._values = {}
+
+    def __getitem__(self, key):
+        if key not in self._values:
+            self._values[key] = self._loaders[key]()
+        return self._values[key]
+
+    def __iter__(self):
+        return iter(self._loaders)
+
+    def __len__(self):
+        return len(self._loaders)
+
+
+class ArchiveReader(object):
+    """Read arrays from an ``.npz`` archive by key, one at a time.
+
+    Uncompressed members are memory-mapped (copy-on-write), compressed ones
+    are decompressed into memory. The archive stays open until the reader
+    is closed or garbage collected.
+    """
+
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.archive = zipfile.ZipFile(filepath)
+        self.members = {info.filename[:-len('.npy')]: info
+                        for info in self.archive.infolist()}
+
+    def close(self):
+        self.archive.close()
+
+    def __contains__(self, key):
+        return key in self.members
+
+    def __getitem__(self, key):
+        info = self.members[key]
+        if info.compress_type != zipfile.ZIP_STORED:
+            return self._read(info)
+
+        with open(self.filepath, 'rb') as file_handle:
+            # skip the member's local file header
+            file_handle.seek(info.header_offset)
+            header = file_handle.read(LOCAL_HEADER.size)
+            name_length, extra_length = LOCAL_HEADER.unpack(header)[-2:]
+            file_handle.seek(name_length + extra_length, os.SEEK_CUR)
+
+            version = np.lib.format.read_magic(file_handle)
+            if version == (1, 0):
+                shape, fortran_order, dtype = \
+                    np.lib.format.read_array_header_1_0(file_handle)
+            else:
+                shape, fortran_order, dtype = \
+                    np.lib.format.read_array_header_2_0(file_handle)
+            offset = file_handle.tell()
+        if dtype.hasobject:
+            raise ValueError("Archive member '{}' holds python objects"
+                             .format(key))
+        if not shape or int(np.prod(shape)) == 0:
+            # 0-d and empty arrays cannot be mapped
+            return self._read(info)
+        return np.memmap(self.filepath, dtype=dtype, mode='c', offset=offset,
+                         shape=shape, order='F' if fortran_order else 'C')
+
+    def _read(self, info):
+        with self.archive.open(info) as file_handle:
+            return np.lib.format.read_array(file_handle)
+
+
+def save_result(prob, filepath, compressed=True):
+    """Save the inputs and variable values of a solved model.
+
+    Parameters
+    ----------
+    prob
+        a solved rivus model instance (or a ``Result``)
+    filepath
+        archive file to be written, ``.npz`` is appended if missing
+    compressed : bool, optional
+        If False, store the arrays uncompressed, so that ``load_result``
+        can memory-map them. Larger files, but faster partial reads.
+
+    Returns
+    -------
+    None
+    """
+    arrays = {}
+    manifest = {
+        'version': VERSION,
+        'flow_formulation': getattr(prob, 'flow_formulation', 'timestep'),
+        'params': {},
+        'frames': {},
+        'sets': [],
+        'variables': {}}
+
+    for name, frame in prob.params.items():
+        manifest['params'][name] = _pack_frame(
+            arrays, 'params/{}'.format(name), frame)
+    for name in FRAMES:
+        manifest['frames'][name] = _pack_frame(
+            arrays, 'frames/{}'.format(name), getattr(prob, name))
+
+    if isinstance(prob, Result):
+        for name, values in prob.variables.items():
+            manifest['variables'][name] = _pack_values(
+                arrays, 'variables/{}'.format(name), values)
+    else:
+        set_keys = {}
+        for var in prob.component_objects(pyomo.Var, active=True):
+            if not var.is_indexed():
+                continue
+            manifest['variables'][var.name] = _pack_var(
+                arrays, manifest['sets'], set_keys, var)
+
+    arrays['manifest'] = np.array(json.dumps(manifest))
+    if compressed:
+        np.savez_compressed(filepath, **arrays)
+    else:
+        np.savez(filepath, **arrays)
+
+
+def load_result(filepath, lazy=False):
+    """Load a result saved by ``save_result``.
+
+    Parameters
+    ----------
+    filepath
+        absolute or relative path to the archive file
+    lazy : bool, optional
+        If True, read each frame and variable only when it is accessed, e.g.
+        only costs and capacities for ``get_constants``. The archive must
+        not be changed while the result is in use.
+
+    Returns
+    -------
+    Result
+        with the inputs and variable values of the saved model
+
+    Note
+    ----
+    Arrays of archives saved with ``compressed=False`` are memory-mapped,
+    their pages are read from disk as needed.
+    """
+    archive = ArchiveReader(filepath)
+    manifest = json.loads(str(archive['manifest'][()]))
+    if manifest['version'] > VERSION:
+        raise ValueError("Archive version {} is newer than supported "
+                         "({})".format(manifest['version'], VERSION))
+
+    sets = LazyMapping({
+        index: partial(_unpack_set, archive, levels)
+        for index, levels in enumerate(manifest['sets'])})
+    params = LazyMapping({
+        name: partial(_unpack_frame, archive, info)
+        for name, info in manifest['params'].items()})
+    frames = LazyMapping({
+        name: partial(_unpack_frame, archive, info)
+        for name, info in manifest['frames'].items()})
+    variables = LazyMapping({
+        name: partial(_unpack_var, archive, sets, info)
+        for name, info in manifest['variables'].items()})
+    if lazy:
+        return Result(params, frames, manifest['flow_formulation'], variables,
+                      archive)
+    result = Result(dict(params), dict(frames), manifest['flow_formulation'],
+                    dict(variables))
+    archive.close()
+    return result
+
+
+def to_result(prob):
+    """Return a Result with the inputs and variable values of a model.
+
+    Unlike a model, it can be pickled cheaply, e.g. to send it to worker
+    processes.
+
+    Parameters
+    ----------
+    prob
+        a rivus model instance, or a (lazily loaded) ``Result``
+
+    Returns
+    -------
+    Result
+        with all frames and variables in memory
+    """
+    if isinstance(prob, Result):
+        return Result(dict(prob.params), dict(prob.frames),
+                      prob.flow_formulation, dict(prob.variables))
+    index_cache = {}
+    variables = {var.name: get_entity(prob, var.name, index_cache)
+                 for var in prob.component_objects(pyomo.Var, active=True)
+                 if var.is_indexed()}
+    frames = {name: getattr(prob, name) for name in FRAMES}
+    return Result(dict(prob.params), frames,
+                  getattr(prob, 'flow_formulation', 'timestep'), variables)
+
+
+def load_any(filepath, **kwargs):
+    """Load an archive (``.npz``) or a pickled model (``.pgz``).
+
+    Keyword arguments (e.g. `lazy`) are passed to ``load_result``.
+    """
+    if filepath.endswith('.npz'):
+        return load_result(filepath, **kwargs)
+    return load(filepath)
+
+
+def find_results(directory):
+    """Return the result files in directory, archives and pickled models.
+
+    If a scenario was saved in both formats, only its archive is listed.
+
+    Parameters
+    ----------
+    directory
+        directory with ``.npz`` and/or ``.pgz`` result files
+
+    Returns
+    -------
+    list
+        sorted file paths
+    """
+    archives = glob.glob(os.path.join(directory, '*.npz'))
+    stems = set(os.path.splitext(path)[0] for path in archives)
+    pickles = [path for path in glob.glob(os.path.join(directory, '*.pgz'))
+               if os.path.splitext(path)[0] not in stems]
+    return sorted(archives + pickles)
+
+
+def _pack_var(arrays, sets, set_keys, var):
+    """Store the nonzero values of an indexed Var by their position."""
+    key = 'variables/{}'.format(var.name)
+    labels = unique_labels(get_onset_names(var))
+    factors = set_factors(var.index_set()) or [var.index_set()]
+    if int(np.prod([len(s) for s in factors])) != len(var):
+        # not defined on the whole product of its index sets
+        values = pd.Series(var_values(var), index=entity_index(var, labels),
+                           name=var.name)
+        return _pack_values(arrays, key, values)
+
+    indices = []
+    for factor in factors:
+        if id(factor) not in set_keys:
+            set_keys[id(factor)] = len(sets)
+            elements = list(factor)
+            if factor.dimen == 1:
+                levels = [elements]
+            else:
+                levels = [[element[n] for element in elements]
+                          for n in range(factor.dimen)]
+            sets.append([
+                _pack_column(arrays, 'sets/{}/{}'.format(len(sets), n), level)
+                for n, level in enumerate(levels)])
+        indices.append(set_keys[id(factor)])
+
+    values = var_values(var)
+    nonzero = np.flatnonzero(values != 0)  # NaN (unset) is nonzero
+    arrays[key + '/positions'] = nonzero
+    arrays[key + '/values'] = values[nonzero]
+    return {'key': key, 'name': var.name, 'sets': indices, 'labels': labels,
+            'size': len(values)}
+
+
+def _unpack_var(archive, sets, info):
+    """Restore the values of a variable, zeros included."""
+    if 'frame' in info:
+        return _unpack_frame(archive, info['frame'])
+    key = info['key']
+    dims = []
+    widths = []
+    for index in info['sets']:
+        levels = sets[index]
+        widths.append(len(levels))
+        dims.append(levels[0] if len(levels) == 1 else list(zip(*levels)))
+    values = np.zeros(info['size'])
+    values[archive[key + '/positions']] = archive[key + '/values']
+    return pd.Series(values, index=product_index(dims, info['labels'], widths),
+                     name=info['name'])
+
+
+def _unpack_set(archive, levels):
+    """Restore the elements of an index set, one list per level."""
+    return [_unpack_column(archive, level).tolist() for level in levels]
+
+
+def _pack_values(arrays, key, values):
+    """Store a Series of variable values with its complete index."""
+    return {'frame': _pack_frame(arrays, key, values)}
+
+
+def _pack_frame(arrays, key, frame):
+    """Store index and columns of a DataFrame (or Series) as arrays.
+
+    Returns the manifest entry needed to restore it.
+    """
+    series = isinstance(frame, pd.Series)
+    df = frame.to_frame() if series else frame
+    multi_columns = isinstance(df.columns, pd.MultiIndex)
+    info = {
+        'key': key,
+        'series': series,
+        'name': frame.name if series else None,
+        'geo': isinstance(frame, GeoDataFrame),
+        'crs': None,
+        'columns': [list(c) if multi_columns else c for c in df.columns],
+        'column_names': list(df.columns.names),
+        'index_names': list(df.index.names),
+        'index': [],
+        'data': []}
+    if info['geo'] and frame.crs is not None:
+        info['crs'] = frame.crs.to_string() if hasattr(frame.crs, 'to_string') \
+            else frame.crs
+
+    for n in range(df.index.nlevels):
+        info['index'].append(_pack_column(
+            arrays, '{}/index/{}'.format(key, n),
+            df.index.get_level_values(n)))
+    for n in range(df.shape[1]):
+        info['data'].append(_pack_column(
+            arrays, '{}/data/{}'.format(key, n), df.iloc[:, n]))
+    return info
+
+
+def _unpack_frame(archive, info):
+    """Restore a DataFrame (or Series) stored by ``_pack_frame``."""
+    levels = [_unpack_column(archive, level) for level in info['index']]
+    if len(levels) > 1:
+        index = pd.MultiIndex.from_arrays(levels, names=info['index_names'])
+    else:
+        index = pd.Index(levels[0], name=info['index_names'][0])
+    if info['series']:
+        return pd.Series(_unpack_column(archive, info['data'][0]),
+                         index=index, name=info['name'])
+
+    if len(info['column_names']) > 1:
+        columns = pd.MultiIndex.from_tuples(
+            [tuple(c) for c in info['columns']], names=info['column_names'])
+    else:
+        columns = pd.Index(info['columns'], name=info['column_names'][0],
+                           dtype=object if not info['columns'] else None)
+    df = pd.DataFrame(
+        {n: _unpack_column(archive, column)
+         for n, column in enumerate(info['data'])},
+        index=index, columns=range(len(columns)))
+    df.columns = columns
+    if info['geo']:
+        df = GeoDataFrame(df, crs=info['crs'])
+    return df
+
+
+def _pack_column(arrays, key, values):
+    """Store values as a numpy array without python objects.
+
+    Strings are stored as unicode array (with a mask of missing values),
+    shapely geometries as concatenated well-known binary with offsets.
+
+    Returns the manifest entry needed to restore it.
+    """
+    values = np.asarray(values)
+    if values.dtype != object:
+        arrays[key] = values
+        return {'key': key, 'encoding': 'array'}
+
+    missing = np.asarray(pd.isnull(values), dtype=bool)
+    present = values[~missing]
+    if len(present) and all(hasattr(v, 'wkb') for v in present):
+        buffers = [b'' if m else v.wkb for v, m in zip(values, missing)]
+        arrays[key] = np.frombuffer(b''.join(buffers), dtype=np.uint8)
+        arrays[key + '/offsets'] = np.cumsum([0] + [len(b) for b in buffers])
+        return {'key': key, 'encoding': 'wkb'}
+
+    if all(isinstance(v, str) for v in present):
+        arrays[key] = np.array(['' if m else v
+                                for v, m in zip(values, missing)], dtype=str)
+        if missing.any():
+            arrays[key + '/missing'] = missing
+        return {'key': key, 'encoding': 'str'}
+
+    converted = np.array(values.tolist())
+    if converted.dtype.kind not in 'biufcmM':
+        raise TypeError("Cannot archive column '{}' of mixed types".format(key))
+    arrays[key] = converted
+    return {'key': key, 'encoding': 'array'}
+
+
+def _unpack_column(archive, info):
+    """Restore values stored by ``_pack_column``."""
+    key = info['key']
+    if info['encoding'] == 'wkb':
+        data = archive[key]
+        offsets = archive[key + '/offsets']
+        values = np.empty(len(offsets) - 1, dtype=object)
+        for n, (start, end) in enumerate(zip(offsets[:-1], offsets[1:])):
+            values[n] = wkb.loads(data[start:end].tobytes()) \
+                if end > start else None
+        return values
+    if info['encoding'] == 'str':
+        values = archive[key].astype(object)
+        if key + '/missing' in archive:
+            values[archive[key + '/missing']] = np.nan
+        return values
+    return archive[key]
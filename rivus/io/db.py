@@ -30,9 +30,11 @@ def init_run(engine, runner='Havasi', start_ts=None, status='prepared',
         Any text based comment. (No length limit.)
     plot_dict : dict, optional
         Dictionary returned by the rivus.io.plot.fig3d function.
-    profiler : pandas.Series, optional
+    profiler : pandas.Series or pandas.DataFrame, optional
         Series containing profiled process name and execution time pairs.
         Execution time is measured in *seconds*
+        Or a per-component profile of the model build, as returned by
+        rivus.utils.profiler.profile_model.
 
     Returns
     -------
@@ -3,7 +3,7 @@ from numpy import union1d
 import math
 from mpl_toolkits.basemap import Basemap
 
-from rivus.main.rivus import get_constants, get_timeseries, line_length
+from rivus.main.rivus import get_constants, get_timeseries
 from rivus.utils.pandashp import total_bounds
 
 COLORS = {
@@ -351,7 +351,7 @@ def _add_edges(prob, bm, comms, comm_zs, pmax, hubs, proc, source, dz=5,
 
             if cap_txt and is_built_comm:
                 if len_txt:
-                    linelength = line_length(line)
+                    linelength = prob.edge_length[v1v2]
                 xx = abs(anchor_x - xs[0]) / \
                     annot_devider * comm_offs['cap'] + anchor_x
                 yy = abs(anchor_y - ys[0]) / \
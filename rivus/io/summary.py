@@ -0,0 +1,163 @@
+"""Persistent summary index of a directory of scenario results.
+
+Comparing hundreds of scenarios only needs a few numbers per scenario:
+its costs and the built capacities. ``update_summary`` loads the result
+files (archives or pickled models, see ``rivus.io.archive.find_results``)
+in a process pool and stores one row per scenario in a CSV index, together
+with the modification time, size and SHA-256 hash of its file. A rerun only
+loads files which are new or have changed, and reuses the index for the
+rest.
+
+Example
+-------
+::
+
+    summary = update_summary('result/hg15')
+    summary.filter(like='cost-').sum(axis=1).sort_values().head()
+"""
+import hashlib
+import os
+from multiprocessing import Pool, cpu_count
+
+import pandas as pd
+
+from ..main.rivus import get_constants
+from .archive import Result, find_results, load_any
+
+INDEX_FILE = 'summary.csv'
+FILE_COLUMNS = ['file', 'mtime_ns', 'size', 'sha256']
+
+
+def update_summary(directory, index_file=None, processes=None):
+    """Update and return the summary index of all results in directory.
+
+    Parameters
+    ----------
+    directory : str
+        Directory with result files (``.npz`` and/or ``.pgz``)
+    index_file : str, optional
+        CSV file of the index, ``summary.csv`` in `directory` by default.
+    processes : int, optional
+        Size of the process pool. If omitted, one process per changed file,
+        at most one per CPU. With 1, files are loaded in the calling
+        process.
+
+    Returns
+    -------
+    DataFrame
+        indexed by scenario name (file name without extension and
+        'scenario_' prefix), with columns
+
+        - file, mtime_ns, size, sha256: the result file
+        - cost-<cost type>: costs by type, e.g. cost-Inv
+        - pmax-<commodity>: total built capacity of a commodity's edges
+
+        Rows of removed result files are dropped from the index.
+    """
+    if index_file is None:
+        index_file = os.path.join(directory, INDEX_FILE)
+    if os.path.exists(index_file):
+        index = pd.read_csv(index_file, index_col='scenario',
+                            dtype={'scenario': str, 'file': str,
+                                   'sha256': str})
+    else:
+        index = pd.DataFrame(columns=FILE_COLUMNS)
+
+    rows = {}
+    changed = []
+    for path in find_results(directory):
+        scenario = scenario_name(path)
+        stat = os.stat(path)
+        file_info = pd.Series({'file': os.path.basename(path),
+                               'mtime_ns': stat.st_mtime_ns,
+                               'size': stat.st_size})
+        if scenario in index.index:
+            row = index.loc[scenario].copy()
+            if row['file'] == file_info['file'] and \
+                    row['size'] == file_info['size']:
+                if row['mtime_ns'] == file_info['mtime_ns']:
+                    rows[scenario] = row
+                    continue
+                # touched, but possibly not changed
+                if row['sha256'] == file_hash(path):
+                    row['mtime_ns'] = file_info['mtime_ns']
+                    rows[scenario] = row
+                    continue
+        changed.append((scenario, path, file_info))
+
+    if changed:
+        paths = [path for (_, path, _) in changed]
+        if processes is None:
+            processes = min(cpu_count(), len(paths))
+        if processes > 1:
+            with Pool(processes) as pool:
+                summaries = pool.map(_summarize_file, paths)
+        else:
+            summaries = [_summarize_file(path) for path in paths]
+
+        for (scenario, _, file_info), summary in zip(changed, summaries):
+            rows[scenario] = pd.concat([file_info, summary])
+
+    summary = pd.DataFrame.from_dict(rows, orient='index')
+    summary.index.name = 'scenario'
+    summary = summary.reindex(columns=FILE_COLUMNS + sorted(
+        column for column in summary.columns if column not in FILE_COLUMNS))
+    capacities = [column for column in summary.columns
+                  if column.startswith('pmax-')]
+    summary[capacities] = summary[capacities].fillna(0)
+    summary.sort_index(inplace=True)
+
+    # replace the index at once, so that an interrupted run leaves it intact
+    summary.to_csv(index_file + '.tmp')
+    os.replace(index_file + '.tmp', index_file)
+    return summary
+
+
+def summarize_result(path):
+    """Return costs and built capacities of a result file.
+
+    Parameters
+    ----------
+    path : str
+        Archive (``.npz``) or pickled model (``.pgz``)
+
+    Returns
+    -------
+    Series
+        cost-<cost type> and pmax-<commodity> values
+    """
+    prob = load_any(path, lazy=True)
+    try:
+        costs, pmax, _, _ = get_constants(prob)
+    finally:
+        if isinstance(prob, Result):
+            prob.close()
+    costs = costs.rename(lambda cost_type: 'cost-{}'.format(cost_type))
+    capacities = pmax.sum().rename(lambda co: 'pmax-{}'.format(co))
+    return pd.concat([costs, capacities]).astype(float)
+
+
+def _summarize_file(path):
+    """Return hash and summary of a result file, in a worker process."""
+    return pd.concat([pd.Series({'sha256': file_hash(path)}),
+                      summarize_result(path)])
+
+
+def scenario_name(path):
+    """Return the scenario name of a result file.
+
+    Example:
+        >>> scenario_name('result/hg15/scenario_base.npz')
+        'base'
+    """
+    name = os.path.splitext(os.path.basename(path))[0]
+    return name.replace('scenario_', '')
+
+
+def file_hash(path, chunk_size=2 ** 20):
+    """Return the SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file_handle:
+        for chunk in iter(lambda: file_handle.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,410 @@
+"""Benders decomposition between investment and operation.
+
+With the aggregated flow formulation (see ``create_model``), all binaries of
+a rivus model are investment decisions, and the time steps are only linked
+through them. A master problem decides on the investment variables
+(``INVESTMENT_VARIABLES``) together with the operation of few time steps
+(by default the one with the highest demand), which keeps its designs
+close to feasible. The operation of each other time step is an LP
+subproblem, which is solved in parallel worker processes. The subproblems'
+reduced costs of the investment variables give optimality cuts for the
+master, until lower and upper bound meet.
+
+Subproblems are kept feasible for any investment by slack variables for
+unmet demand and fixed losses, which are charged with a `penalty` per kWh.
+
+Example
+-------
+::
+
+    prob, history = solve_benders(data, vertex, edge, solver='glpk')
+    costs, pmax, kappa_hub, kappa_process = get_constants(prob)
+"""
+import math
+import warnings
+from copy import deepcopy
+from multiprocessing import Pool, cpu_count
+
+import pyomo.environ  # although it is not used directly, it is needed by pyomo
+import pyomo.core as pyomo
+from pyomo.opt.base import SolverFactory
+
+from .rivus import create_model, update_costs
+
+# Variables decided by the master problem, fixed in the subproblems
+INVESTMENT_VARIABLES = ('Pmax', 'Xi', 'Delta', 'Kappa_hub', 'Kappa_process',
+                        'Phi')
+
+# Time-indexed variables, which the subproblems return with the solution
+OPERATION_VARIABLES = ('Sigma', 'Pin', 'Pot', 'Rho', 'Epsilon_hub', 'Tau',
+                       'Epsilon_in', 'Epsilon_out')
+
+# subproblems of this worker process, by time step. Each time step is always
+# solved by the same worker, so that it is built only once.
+_subproblems = {}
+_worker_args = None
+
+
+def solve_benders(data, vertex, edge, solver='glpk', solver_options=None,
+                  processes=None, master_times=None, tolerance=1e-3,
+                  max_iterations=100, penalty=1e3, verbose=False,
+                  **model_kwargs):
+    """Solve a rivus problem by Benders decomposition.
+
+    Parameters
+    ----------
+    data : dict
+        Processed Excel spreadsheet by ``read_excel``
+    vertex : GeoDataFrame
+        As awaited by ``create_model``
+    edge : GeoDataFrame
+        As awaited by ``create_model``
+    solver : str, optional
+        Name of the solver, passed to pyomo's ``SolverFactory``. It must
+        return reduced costs of LPs (e.g. 'glpk', 'appsi_highs', 'gurobi').
+    solver_options : dict, optional
+        Options applied to each solver instance, e.g. ``{'mipgap': 1e-3}``
+    processes : int, optional
+        Number of worker processes for the subproblems. If omitted, one
+        process per subproblem, at most one per CPU. With 1, the
+        subproblems are solved in the calling process. Each time step is
+        assigned to one worker, which builds its subproblem once.
+    master_times : list, optional
+        Time steps, whose operation is part of the master problem. If
+        omitted, the time step with the largest sum of demand scaling
+        factors.
+    tolerance : float, optional
+        Relative gap between upper and lower bound to stop at.
+    max_iterations : int, optional
+        Maximum number of master solves. If the gap is still above
+        `tolerance` then, a warning is issued and the best solution found
+        so far is returned.
+    penalty : float, optional
+        Costs (EUR/kWh) of unmet demand and fixed losses in the
+        subproblems. Must exceed the costs of supplying them, a warning is
+        issued, if the solution still uses the slacks.
+    verbose : bool, optional
+        Print bounds of each iteration.
+    **model_kwargs
+        Passed to ``create_model``, the flow formulation is always
+        'aggregated'.
+
+    Returns
+    -------
+    (prob, history) tuple
+        + prob: rivus model instance (a monolithic ``create_model`` of the
+          whole problem in the aggregated flow formulation), which holds
+          the best solution found, so that ``get_constants`` and
+          ``get_timeseries`` work on it. At convergence, its objective is
+          the optimum of that model, which is an upper bound of the
+          default time step formulation's optimum.
+        + history: list of (lower bound, upper bound) per iteration.
+
+    Raises
+    ------
+    ValueError
+        If a commodity has a finite allowed-max, which couples time steps.
+    RuntimeError
+        If the master or a subproblem is not solved to optimality.
+    """
+    allowed_max = data['commodity']['allowed-max']
+    is_coupling = (allowed_max > 0) & ~allowed_max.apply(math.isinf)
+    if is_coupling.any():
+        raise ValueError("Commodities {} have an allowed-max, which couples "
+                         "the time steps.".format(
+                             list(allowed_max[is_coupling].index)))
+    if master_times is None:
+        scaling = data['time'][[co for co in data['time'].columns
+                                if co in data['commodity'].index]]
+        master_times = [scaling.sum(axis=1).idxmax()]
+    solver_options = {} if solver_options is None else solver_options
+    model_kwargs['flow_formulation'] = 'aggregated'
+    worker_args = (deepcopy(data), deepcopy(vertex), deepcopy(edge), solver,
+                   solver_options, penalty, model_kwargs)
+
+    prob = create_model(deepcopy(data), deepcopy(vertex), deepcopy(edge),
+                        **model_kwargs)
+    times = list(prob.time)
+    sub_times = [t for t in times if t not in master_times]
+    released = _make_master(prob, sub_times)
+    optim = SolverFactory(solver)
+    optim.options.update(solver_options)
+
+    if processes is None:
+        processes = min(cpu_count(), len(times))
+    # one single-process pool per worker, so that each time step is always
+    # sent to the worker holding its subproblem
+    pools = [Pool(1, initializer=_init_worker, initargs=worker_args)
+             for _ in range(processes)] if processes > 1 else []
+    if not pools:
+        _init_worker(*worker_args)
+    owner = {t: pools[k % len(pools)] if pools else None
+             for k, t in enumerate(times)}
+
+    def run(tasks):
+        """Solve subproblem tasks (t, investment, collect), in order."""
+        if not pools:
+            return [_solve_subproblem(task) for task in tasks]
+        pending = [owner[task[0]].apply_async(_solve_subproblem, (task,))
+                   for task in tasks]
+        return [answer.get() for answer in pending]
+
+    history = []
+    lower, best = -math.inf, (math.inf, None)
+    try:
+        # time steps cost at least their operation at free investment
+        for (t, costs, _, _, _) in run([(t, None, False)
+                                        for t in sub_times]):
+            prob.cuts.add(prob.theta[t] >= costs)
+
+        for iteration in range(max_iterations):
+            result = optim.solve(prob)
+            _check(result, 'master')
+            lower = max(lower, _lower_bound(result, prob))
+            investment = _investment_values(prob)
+
+            answers = run([(t, investment, False) for t in sub_times])
+            upper = (pyomo.value(pyomo.summation(prob.costs)) +
+                     sum(costs for (_, costs, _, _, _) in answers))
+            if upper < best[0]:
+                best = (upper, investment)
+            history.append((lower, best[0]))
+            if verbose:
+                print('Benders iteration {:3d}: lower {:14.2f}  upper '
+                      '{:14.2f}'.format(iteration, lower, best[0]))
+            if best[0] - lower <= tolerance * abs(best[0]):
+                break
+
+            for (t, costs, slopes, _, _) in answers:
+                prob.cuts.add(prob.theta[t] >= costs + sum(
+                    slope * (_component(prob, name, index) -
+                             investment[name, index])
+                    for (name, index), slope in slopes.items()))
+        else:
+            warnings.warn("Benders stopped after {} iterations with a gap of "
+                          "{:.2%}, the solution may not be optimal."
+                          .format(max_iterations,
+                                  (best[0] - lower) / abs(best[0])))
+
+        answers = run([(t, best[1], True) for t in times])
+    finally:
+        for pool in pools:
+            pool.close()
+            pool.join()
+
+    _load_solution(prob, released, best[1], answers)
+    if sum(slack for (_, _, _, slack, _) in answers) > 1e-6:
+        warnings.warn("Best solution has unmet demand or losses, increase "
+                      "the penalty.")
+    return prob, history
+
+
+def _make_master(prob, sub_times):
+    """Turn a monolithic model into the master problem, in place.
+
+    Constraints of the subproblems' time steps are deactivated and their
+    operation variables fixed to zero, their variable costs are replaced
+    by one estimate ``theta`` per time step, which is bounded by cuts.
+
+    Returns
+    -------
+    list
+        Variables fixed by this function, to be released afterwards.
+    """
+    sub_times = set(sub_times)
+    for con in prob.component_objects(pyomo.Constraint, active=True):
+        if _is_time_indexed(prob, con):
+            for index, con_data in con.items():
+                if index[-1] in sub_times:
+                    con_data.deactivate()
+    released = []
+    for var in prob.component_objects(pyomo.Var):
+        if _is_time_indexed(prob, var):
+            for index, var_data in var.items():
+                if index[-1] in sub_times and not var_data.fixed:
+                    var_data.fix(0)
+                    released.append(var_data)
+    prob.obj.deactivate()
+
+    prob.theta = pyomo.Var(
+        sorted(sub_times),
+        within=pyomo.NonNegativeReals,
+        doc='estimated variable costs (EUR) of time step')
+    prob.cuts = pyomo.ConstraintList(
+        doc='theta >= variable costs at an investment + reduced costs')
+    prob.master_obj = pyomo.Objective(
+        expr=pyomo.summation(prob.costs) + pyomo.summation(prob.theta),
+        sense=pyomo.minimize,
+        doc='Costs of the master time steps plus estimated variable costs')
+    return released
+
+
+def _load_solution(prob, released, investment, answers):
+    """Restore the monolithic model and load the best solution into it."""
+    for var_data in released:
+        var_data.unfix()
+    for (name, index), value in investment.items():
+        _component(prob, name, index).value = value
+    for (_, _, _, _, operation) in answers:
+        for (name, index), value in operation.items():
+            _component(prob, name, index).value = value
+
+    prob.del_component(prob.master_obj)
+    prob.del_component(prob.cuts)
+    prob.del_component(prob.theta)
+    for con in prob.component_data_objects(pyomo.Constraint):
+        con.activate()
+    prob.obj.activate()
+
+    # costs follow from their definitions
+    update_costs(prob)
+
+
+def _init_worker(data, vertex, edge, solver, solver_options, penalty,
+                 model_kwargs):
+    global _worker_args
+    _worker_args = (data, vertex, edge, solver, solver_options, penalty,
+                    model_kwargs)
+    _subproblems.clear()
+
+
+def _make_subproblem(t):
+    """Build the LP of time step t, with investment variables as bounds."""
+    data, vertex, edge, solver, solver_options, penalty, model_kwargs = \
+        _worker_args
+    data = deepcopy(data)
+    data['time'] = data['time'].loc[[t]]
+    kwargs = dict(model_kwargs, mode='relaxed')
+    sub = create_model(data, deepcopy(vertex), deepcopy(edge), **kwargs)
+
+    # slacks keep the subproblem feasible for any investment
+    sub.Unmet = pyomo.Var(
+        sub.edge, sub.co_demand, sub.time,
+        within=pyomo.NonNegativeReals,
+        doc='unmet demand (kW) of commodity in edge')
+    sub.Unsupplied = pyomo.Var(
+        sub.edge, sub.co_transportable, sub.time,
+        within=pyomo.NonNegativeReals,
+        doc='unsupplied fixed losses (kW) of commodity in edge')
+    for (i, j, co, t), con in sub.peak_satisfaction.items():
+        con.set_value((con.lower, con.body + sub.Unmet[i, j, co, t], None))
+    for (i, j, co, t), con in sub.edge_equation.items():
+        if co in sub.co_transportable:
+            con.set_value((None, con.body - sub.Unsupplied[i, j, co, t],
+                           con.upper))
+
+    # investment constraints belong to the master
+    for con in sub.component_objects(pyomo.Constraint, active=True):
+        if not _is_time_indexed(sub, con) and con is not sub.def_costs:
+            con.deactivate()
+    sub.def_costs['Inv'].deactivate()
+    sub.def_costs['Fix'].deactivate()
+    sub.obj.deactivate()
+    weight = sub.time_dict[t]['weight']
+    sub.sub_obj = pyomo.Objective(
+        expr=sub.costs['Var'] + penalty * weight * (
+            pyomo.summation(sub.Unmet) + pyomo.summation(sub.Unsupplied)),
+        sense=pyomo.minimize,
+        doc='Variable costs and penalties of time step')
+    sub.rc = pyomo.Suffix(direction=pyomo.Suffix.IMPORT)
+
+    sub.investment_bounds = {
+        (name, index): (var.lb, var.ub)
+        for name, index, var in _investment_variables(sub)}
+
+    optim = SolverFactory(solver)
+    optim.options.update(solver_options)
+    return sub, optim
+
+
+def _solve_subproblem(args):
+    """Solve the LP of time step t at an investment.
+
+    Without investment (None), the investment variables are free within
+    their bounds, which gives a lower bound of the time step's costs.
+
+    Returns
+    -------
+    (t, costs, slopes, slack, operation) tuple
+        Variable costs and penalties of the time step, their reduced costs
+        {(name, index): slope} w.r.t. the investment variables, the total
+        slack and, if requested, {(name, index): value} of the operation
+        variables.
+    """
+    t, investment, collect = args
+    if t not in _subproblems:
+        _subproblems[t] = _make_subproblem(t)
+    sub, optim = _subproblems[t]
+
+    bounds = (sub.investment_bounds if investment is None else
+              {key: (value, value) for key, value in investment.items()})
+    for (name, index), (lb, ub) in bounds.items():
+        var = _component(sub, name, index)
+        var.setlb(lb)
+        var.setub(ub)
+    result = optim.solve(sub)
+    _check(result, 'subproblem {}'.format(t))
+
+    slopes = {}
+    for (name, index) in investment or ():
+        slope = sub.rc.get(_component(sub, name, index), 0)
+        if slope:
+            slopes[name, index] = slope
+    slack = (sum(v.value for v in sub.Unmet.values()) +
+             sum(v.value for v in sub.Unsupplied.values()))
+    operation = {}
+    if collect:
+        for name in OPERATION_VARIABLES:
+            for index, var in getattr(sub, name).items():
+                operation[name, index] = var.value
+    return t, pyomo.value(sub.sub_obj), slopes, slack, operation
+
+
+def _investment_values(prob):
+    """Return {(name, index): value} of the investment variables."""
+    values = {}
+    for name, index, var in _investment_variables(prob):
+        value = var.value or 0
+        if not var.is_continuous():
+            value = round(value)
+        # solver tolerances must not carry over to the subproblems
+        if var.lb is not None:
+            value = max(value, var.lb)
+        if var.ub is not None:
+            value = min(value, var.ub)
+        values[name, index] = value
+    return values
+
+
+def _investment_variables(prob):
+    """Yield (name, index, var) of the investment variables."""
+    for name in INVESTMENT_VARIABLES:
+        if hasattr(prob, name):
+            for index, var in getattr(prob, name).items():
+                yield name, index, var
+
+
+def _component(prob, name, index):
+    return getattr(prob, name)[index]
+
+
+def _lower_bound(result, prob):
+    """Return the master's best bound, or its objective if unknown."""
+    bound = result.problem.lower_bound
+    try:
+        if math.isfinite(bound):
+            return bound
+    except TypeError:
+        pass
+    return pyomo.value(prob.master_obj)
+
+
+def _check(result, name):
+    status = str(result.solver.termination_condition)
+    if status != 'optimal':
+        raise RuntimeError("Benders {} was not solved to optimality: {}"
+                           .format(name, status))
+
+
+def _is_time_indexed(prob, component):
+    return any(s is prob.time for s in component.index_set().subsets())
@@ -0,0 +1,208 @@
+"""Split a rivus problem into independent subproblems and solve them in
+parallel.
+
+Vertices of different connected components of the edge graph share neither
+arcs nor hubs, so their models only interact through the commodity limits
+``allowed-max``, which are summed over all locations. If no commodity has
+such a (finite) limit, each component can be modelled and solved on its
+own. The results are merged back into frames shaped like the output of
+``get_constants`` and ``get_timeseries`` of a monolithic model.
+
+Example
+-------
+::
+
+    components = find_components(data, vertex, edge)
+    constants, timeseries = solve_components(data, components,
+                                             solver='glpk')
+    costs, pmax, kappa_hub, kappa_process = constants
+"""
+import math
+import warnings
+from copy import deepcopy
+from multiprocessing import Pool, cpu_count
+
+import pandas as pd
+import pyomo.environ  # although it is not used directly, it is needed by pyomo
+from pyomo.opt.base import SolverFactory
+
+from .rivus import create_model, get_constants, get_timeseries
+
+
+def find_components(data, vertex, edge):
+    """Split vertex and edge into independent subproblems.
+
+    Components of the edge graph, whose edges have no area demand, are left
+    out, as their optimal solution is to build nothing. So are vertices
+    without any edge.
+
+    Parameters
+    ----------
+    data : dict
+        Processed Excel spreadsheet by ``read_excel``
+    vertex : GeoDataFrame
+        As awaited by ``create_model``
+    edge : GeoDataFrame
+        As awaited by ``create_model``
+
+    Returns
+    -------
+    list
+        of (vertex, edge) tuples, one per subproblem, in the layout of the
+        input. If a commodity has a finite ``allowed-max``, the problem is
+        not split, and the list holds the input itself.
+    """
+    allowed_max = data['commodity']['allowed-max']
+    is_coupling = (allowed_max > 0) & ~allowed_max.apply(math.isinf)
+    if is_coupling.any():
+        warnings.warn("Commodities {} have a total allowed-max, which "
+                      "couples all components. Problem is not split."
+                      .format(list(allowed_max[is_coupling].index)))
+        return [(vertex, edge)]
+
+    edge_indexed = edge.index.names == ['Vertex1', 'Vertex2']
+    edf = edge.reset_index() if edge_indexed else edge
+    vertex_ids = (vertex.index if vertex.index.names == ['Vertex']
+                  else pd.Index(vertex['Vertex']))
+
+    # same undirected neighbourhood as m.neighbours of create_model
+    neighbours = {}
+    for (v1, v2) in zip(edf['Vertex1'], edf['Vertex2']):
+        neighbours.setdefault(v1, []).append(v2)
+        neighbours.setdefault(v2, []).append(v1)
+    component_of = connected_components(neighbours)
+
+    area_types = edf.columns.intersection(
+        data['area_demand'].index.get_level_values(0).unique())
+    edge_component = edf['Vertex1'].map(component_of)
+    has_demand = (edf[area_types].sum(axis=1) > 0).groupby(
+        edge_component).any()
+
+    components = []
+    for comp in sorted(has_demand[has_demand].index):
+        in_comp = (edge_component == comp).values
+        members = [v for v, c in component_of.items() if c == comp]
+        components.append((vertex[vertex_ids.isin(members)],
+                           edge[in_comp]))
+    return components
+
+
+def connected_components(neighbours):
+    """Label the connected components of an undirected graph.
+
+    Parameters
+    ----------
+    neighbours : dict
+        vertex -> list of adjacent vertices, e.g. ``m.neighbours``
+
+    Returns
+    -------
+    dict
+        vertex -> component number, numbered from 0 in order of discovery
+    """
+    component_of = {}
+    comp = -1
+    for root in neighbours:
+        if root in component_of:
+            continue
+        comp += 1
+        component_of[root] = comp
+        stack = [root]
+        while stack:
+            v = stack.pop()
+            for w in neighbours[v]:
+                if w not in component_of:
+                    component_of[w] = comp
+                    stack.append(w)
+    return component_of
+
+
+def _solve_component(args):
+    """Build and solve one subproblem, return its result frames."""
+    data, vertex, edge, solver, solver_options, model_kwargs = args
+    prob = create_model(data, vertex, edge, **model_kwargs)
+    optim = SolverFactory(solver)
+    optim.options.update(solver_options)
+    result = optim.solve(prob)
+    status = str(result.solver.termination_condition)
+    return status, get_constants(prob), get_timeseries(prob)
+
+
+def solve_components(data, components, solver='glpk', solver_options=None,
+                     processes=None, **model_kwargs):
+    """Solve subproblems in a process pool and merge their results.
+
+    Parameters
+    ----------
+    data : dict
+        Processed Excel spreadsheet by ``read_excel``
+    components : list
+        of (vertex, edge) tuples, as returned by ``find_components``
+    solver : str, optional
+        Name of the solver, passed to pyomo's ``SolverFactory``
+    solver_options : dict, optional
+        Options applied to each solver instance, e.g. ``{'mipgap': 1e-3}``
+    processes : int, optional
+        Size of the process pool. If omitted, one process per component,
+        at most one per CPU. With 1, the subproblems are solved in order in
+        the calling process.
+    **model_kwargs
+        Passed to ``create_model``
+
+    Returns
+    -------
+    (constants, timeseries) tuple
+        Merged results in the shape of ``get_constants`` and
+        ``get_timeseries``: (costs, pmax, kappa_hub, kappa_process) and
+        (source, flows, hubs, proc_io, proc_tau).
+
+    Raises
+    ------
+    RuntimeError
+        If any of the subproblems is not solved to optimality.
+    """
+    solver_options = {} if solver_options is None else solver_options
+    tasks = [(deepcopy(data), deepcopy(vertex), deepcopy(edge), solver,
+              solver_options, model_kwargs)
+             for (vertex, edge) in components]
+    if processes is None:
+        processes = min(cpu_count(), len(tasks))
+
+    if processes > 1:
+        with Pool(processes) as pool:
+            results = pool.map(_solve_component, tasks)
+    else:
+        results = [_solve_component(task) for task in tasks]
+
+    statuses = [status for (status, _, _) in results]
+    if any(status != 'optimal' for status in statuses):
+        raise RuntimeError("Subproblems were not solved to optimality: {}"
+                           .format(statuses))
+
+    constants = [constant for (_, constant, _) in results]
+    timeseries = [series for (_, _, series) in results]
+    # costs are summed, the other frames concatenated
+    costs = pd.concat([costs for (costs, _, _, _) in constants])
+    costs = costs.groupby(level=0, sort=False).sum()
+    merged_constants = (costs,) + tuple(
+        _merge_frames(frames, fill_value=0)
+        for frames in list(zip(*constants))[1:])
+    merged_timeseries = tuple(_merge_frames(frames)
+                              for frames in zip(*timeseries))
+    return merged_constants, merged_timeseries
+
+
+def _merge_frames(frames, fill_value=None):
+    """Concatenate result frames of disjoint subproblems.
+
+    Columns missing in some of the frames (e.g. a commodity that is only
+    built in one component) are filled with `fill_value`, if given. Use 0
+    for the frames of ``get_constants``, as it does for a single model.
+    """
+    frames = [frame for frame in frames if not frame.empty]
+    if not frames:
+        return pd.DataFrame([])
+    merged = pd.concat(frames)
+    if fill_value is not None:
+        merged = merged.fillna(fill_value)
+    return merged.sort_index()
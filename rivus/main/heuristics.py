@@ -0,0 +1,188 @@
+"""Heuristics, which trade proven optimality for shorter solution times.
+
+Example
+-------
+::
+
+    prob = create_model(data, vertex, edge, mode='relaxed')
+    optim = SolverFactory('glpk')
+    result, gap = relax_and_fix(prob, optim)
+    print('at most {:.1%} above optimum'.format(gap))
+    costs, pmax, kappa_hub, kappa_process = get_constants(prob)
+"""
+import pyomo.core as pyomo
+
+from .rivus import find_matching_edge
+
+
+def relax_and_fix(prob, optim, threshold=1e-9, flow_tolerance=1e-3,
+                  tee=False):
+    """Solve the relaxation, fix the rounded design and solve the rest.
+
+    1. The relaxed model (``Xi``, ``Psi`` and ``Phi`` continuous) is
+       solved, its objective is a lower bound of the MIP optimum.
+    2. ``Xi`` and ``Phi`` are rounded: values above `threshold` become 1,
+       others 0. Rounding up keeps the problem feasible (an edge or a
+       process more is allowed, its minimum capacity is affordable).
+    3. ``Psi`` is fixed to the dominant flow direction of the relaxed
+       solution (flows below `flow_tolerance` count as no flow), so the
+       remaining problem is an LP, which is solved. In the aggregated flow
+       formulation, ``Delta`` is fixed to the direction of the larger
+       flow sum over all time steps instead.
+    4. Only if that LP is infeasible (fixed losses of the now integral
+       ``Psi`` exceed the spare source capacity), ``Psi`` (or ``Delta``) of
+       the built edges is made binary again and the remaining MIP is
+       solved.
+    5. Edges without capacity and processes without throughput in that
+       solution are unbuilt (``Xi``, ``Phi`` fixed to 0), saving their fixed
+       costs, and the LP is solved once more.
+
+    Parameters
+    ----------
+    prob : ConcreteModel
+        rivus model instance, created with ``mode='relaxed'``. Its
+        ``Xi`` and ``Phi`` remain fixed after the call.
+    optim : SolverFactory
+        pyomo Solver object, e.g. prepared with
+        :func:`rivus.utils.prerun.setup_solver`
+    threshold : float, optional
+        Relaxed values of ``Xi`` and ``Phi`` above it are rounded to 1.
+        Rounding down small values may turn the problem infeasible, as
+        they still allow a capacity of `threshold` times the big-M.
+    flow_tolerance : float, optional
+        Minimum relaxed flow (kW) for an arc to be used. Fixing ``Psi`` to 1
+        on arcs with numerical noise flows would charge their fixed losses
+        without any supply behind them.
+    tee : bool, optional
+        Pipe solver output to stdout.
+
+    Returns
+    -------
+    (result, gap) tuple
+        The pyomo results object of the last solve, as returned by
+        ``optim.solve``, the solution is loaded into `prob`. The gap
+        ``(objective - bound) / objective`` is an upper bound of the
+        distance to the MIP optimum, or None if a solve failed.
+
+    Raises
+    ------
+    ValueError
+        If `prob` was not created with ``mode='relaxed'``.
+    """
+    if getattr(prob, 'mode', 'mip') != 'relaxed':
+        raise ValueError("relax_and_fix needs a model created with "
+                         "mode='relaxed'.")
+
+    result = optim.solve(prob, tee=tee)
+    if str(result.solver.termination_condition) != 'optimal':
+        return result, None
+    bound = pyomo.value(prob.obj)
+
+    for var in (prob.Xi, prob.Phi):
+        for vardata in var.values():
+            vardata.fix(1 if (vardata.value or 0) > threshold else 0)
+    timestep = getattr(prob, 'flow_formulation', 'timestep') == 'timestep'
+    if timestep:
+        for (i, j, co, t), psi in prob.Psi.items():
+            flow = prob.Pin[i, j, co, t].value or 0
+            counter_flow = prob.Pin[j, i, co, t].value or 0
+            is_dominant = flow > flow_tolerance and (
+                flow > counter_flow or
+                (flow == counter_flow and (i, j) in prob.edge))
+            psi.fix(1 if is_dominant else 0)
+    else:
+        for (i, j, co), delta in prob.Delta.items():
+            flow = sum(prob.Pin[i, j, co, t].value or 0 for t in prob.time)
+            counter_flow = sum(prob.Pin[j, i, co, t].value or 0
+                               for t in prob.time)
+            delta.fix(1 if flow >= counter_flow else 0)
+
+    result = optim.solve(prob, tee=tee, load_solutions=False)
+    if str(result.solver.termination_condition) != 'optimal':
+        if timestep:
+            for (i, j, co, t), psi in prob.Psi.items():
+                (v1, v2) = find_matching_edge(prob, i, j)
+                if prob.Xi[v1, v2, co].value == 1:
+                    psi.unfix()
+                    psi.domain = pyomo.Binary
+                else:
+                    psi.fix(0)
+        else:
+            for (i, j, co), delta in prob.Delta.items():
+                if prob.Xi[i, j, co].value == 1:
+                    delta.unfix()
+                    delta.domain = pyomo.Binary
+        result = optim.solve(prob, tee=tee, load_solutions=False)
+        if str(result.solver.termination_condition) != 'optimal':
+            return result, None
+    prob.solutions.load_from(result)
+
+    # drop what rounding built in vain
+    unused = [prob.Xi[i, j, co] for (i, j, co) in prob.Xi
+              if prob.Xi[i, j, co].value == 1 and
+              prob.Pmax[i, j, co].value <= flow_tolerance]
+    unused += [prob.Phi[v, p] for (v, p) in prob.Phi
+               if prob.Phi[v, p].value == 1 and
+               all(prob.Tau[v, p, t].value <= flow_tolerance
+                   for t in prob.time)]
+    if unused:
+        for vardata in unused:
+            vardata.fix(0)
+        if timestep:
+            for (i, j, co, t), psi in prob.Psi.items():
+                (v1, v2) = find_matching_edge(prob, i, j)
+                if prob.Xi[v1, v2, co].value == 0:
+                    psi.fix(0)
+        result = optim.solve(prob, tee=tee)
+        if str(result.solver.termination_condition) != 'optimal':
+            return result, None
+    objective = pyomo.value(prob.obj)
+    gap = (objective - bound) / objective if objective else 0.
+    return result, gap
+
+
+def reduced_cost_fixing(prob, upper_bound, tolerance=1e-6, verbose=False):
+    """Return edges and commodities, whose Xi is 0 in any better solution.
+
+    If the relaxation bound plus the reduced cost of an unbuilt ``Xi``
+    exceeds the objective of a known solution (`upper_bound`, e.g. from
+    ``relax_and_fix`` or a Steiner start), building that edge can not
+    lead to a better solution.
+
+    Parameters
+    ----------
+    prob : ConcreteModel
+        rivus model instance, created with ``mode='relaxed'`` and solved
+        with a reduced cost suffix, i.e. after
+        ``prob.rc = pyomo.Suffix(direction=pyomo.Suffix.IMPORT)``
+    upper_bound : float
+        Objective value of a feasible solution of the MIP.
+    tolerance : float, optional
+        Relaxed values of ``Xi`` up to it count as unbuilt.
+    verbose : bool, optional
+        Print the number of found ``Xi``.
+
+    Returns
+    -------
+    list
+        (Vertex1, Vertex2, commodity) tuples, e.g. for ``xi_zero`` of
+        :func:`rivus.graph.presolve.prune_edges` or to fix ``Xi`` to 0 in
+        the MIP.
+
+    Raises
+    ------
+    ValueError
+        If `prob` is not a relaxed model with imported reduced costs.
+    """
+    if getattr(prob, 'mode', 'mip') != 'relaxed' or not hasattr(prob, 'rc'):
+        raise ValueError("reduced_cost_fixing needs a model created with "
+                         "mode='relaxed' and solved with a 'rc' Suffix.")
+
+    bound = pyomo.value(prob.obj)
+    xi_zero = [(i, j, co) for (i, j, co), xi in prob.Xi.items()
+               if (xi.value or 0) <= tolerance and
+               bound + prob.rc.get(xi, 0) > upper_bound * (1 + tolerance)]
+    if verbose:
+        print('Reduced costs fix {} of {} Xi to 0.'
+              .format(len(xi_zero), len(prob.Xi)))
+    return xi_zero
@@ -9,7 +9,16 @@ except ImportError:
     warnings.warn("Support for Pyomo 3.x is now deprecated and will be removed"
                   "removed with the next release. Please upgrade to Pyomo 4.",
                   FutureWarning, stacklevel=2)
+try:
+    from pyomo.core.expr import LinearExpression
+except ImportError:
+    LinearExpression = None  # Pyomo < 5.7: fall back to quicksum
+try:
+    from pyomo.core.base.set import SetProduct
+except ImportError:
+    SetProduct = None  # Pyomo < 5.7: products have a set_tuple
 import math
+from multiprocessing import Pool, cpu_count
 import matplotlib.pyplot as plt
 import matplotlib.patheffects as pe
 import numpy as np
@@ -17,7 +26,6 @@ import os
 import pandas as pd
 from ..utils import pandashp as pdshp
 import warnings
-from geopy.distance import distance
 from mpl_toolkits.basemap import Basemap
 
 
@@ -57,6 +65,22 @@ to_rgb = lambda r,g,b: tuple(x/255. for x in (r,g,b))
 for key, val in COLORS.items():
     COLORS[key] = to_rgb(*val)
 
+# attributes that become mutable Params with create_model(mutable_params=True)
+# and can then be changed by update_parameters without rebuilding the model
+MUTABLE_ATTRIBUTES = {
+    'commodity': ['cost-inv-fix', 'cost-inv-var', 'cost-fix', 'cost-var',
+                  'loss-fix', 'loss-var', 'cap-max'],
+    'process': ['cost-inv-fix', 'cost-inv-var', 'cost-fix', 'cost-var',
+                'cap-min', 'cap-max'],
+    'hub': ['cost-inv-var', 'cost-fix', 'cost-var', 'cap-max']}
+
+# (commodity, plot_type, plot_annotations) of the figures by result_figures
+RESULT_FIGURES = [
+    (com, plot_type, plot_annotations)
+    for com, plot_type in [('Elec', 'caps'), ('Heat', 'caps'), ('Gas', 'caps'),
+                           ('Elec', 'peak'), ('Heat', 'peak')]
+    for plot_annotations in [False, True]]
+
 
 def read_excel(filepath):
     """Read Excel input file and prepare rivus input data dict.
@@ -106,7 +130,9 @@ def read_excel(filepath):
 
 
 def create_model(data, vertex, edge, peak_multiplier=None,
-                 hub_only_in_edge=True):
+                 hub_only_in_edge=True, mutable_params=False,
+                 tighten_bounds=True, mode='mip',
+                 flow_formulation='timestep'):
     """Return a rivus model instance from input file and spatial input.
 
     Parameters
@@ -126,6 +152,30 @@ def create_model(data, vertex, edge, peak_multiplier=None,
         by calling ``m.peak = peak_multiplier(m)``
     hub_only_in_edge : bool, optional
         Temporary switch between original and fixed process handling.
+    mutable_params : bool, optional
+        If True, costs, capacities, losses and source capacities (see
+        ``MUTABLE_ATTRIBUTES``) are declared as mutable Params, which
+        ``update_parameters`` can change in place for parameter sweeps.
+    tighten_bounds : bool, optional
+        If True, the flow and capacity of each commodity in each edge are
+        bounded by what can be consumed behind it (see ``arc_flow_bounds``)
+        instead of by the commodity's cap-max. Not applied together with
+        `mutable_params`, as the bounds depend on the parameter values.
+    mode : str, optional
+        'mip' (default) or 'relaxed'. In relaxed mode, the binaries ``Xi``,
+        ``Psi`` (or ``Delta``) and ``Phi`` are declared continuous in
+        [0, 1], so that the model is an LP for fast screening and a lower
+        bound of the MIP.
+        See ``rivus.main.heuristics.relax_and_fix``.
+    flow_formulation : str, optional
+        'timestep' (default) or 'aggregated'. The time step formulation has
+        a direction binary ``Psi`` per arc, commodity and time step, which
+        switches the fixed losses of the flowing arc. The aggregated
+        formulation has a single direction binary ``Delta`` per edge and
+        transportable commodity, so the flow direction of an edge cannot
+        change over time. Fixed losses are charged in every time step of a
+        built edge (``Xi``). Both restrict the time step formulation, so
+        the aggregated objective is an upper bound of its objective.
 
     Returns
     -------
@@ -137,114 +187,21 @@ def create_model(data, vertex, edge, peak_multiplier=None,
     (Reindex, insertion of values.)
 
     """
+    if mode not in ('mip', 'relaxed'):
+        raise ValueError("Unknown mode '{}', use 'mip' or 'relaxed'"
+                         .format(mode))
+    if flow_formulation not in ('timestep', 'aggregated'):
+        raise ValueError("Unknown flow_formulation '{}', use 'timestep' or "
+                         "'aggregated'".format(flow_formulation))
+
     m = pyomo.ConcreteModel()
     m.name = 'rivus'
+    m.mode = mode
+    m.flow_formulation = flow_formulation
     m.params = data
 
-    # DataFrame aliases
-    commodity = data['commodity']
-    process = data['process']
-    process_commodity = data['process_commodity']
-    time = data['time']
-    area_demand = data['area_demand']
-
-    # Handling the indexing of GeoDataFrames
-    # If we get "too clever" input,
-    # reset it to leave peak calculation untouched.
-    # If not, peak gets messed up through
-    # edge_areas and multiply_by_area_demand
-    if edge.index.names == ['Vertex1', 'Vertex2']:
-        edge = edge.reset_index()
-    if vertex.index.names == ['Vertex']:
-        vertex = vertex.reset_index()
-
-    # process input/output ratios
-    m.r_in = process_commodity.xs('In', level='Direction')['ratio']
-    m.r_out = process_commodity.xs('Out', level='Direction')['ratio']
-    # For faster value retrieval
-    m.r_in_dict = m.r_in.to_dict()
-    m.r_out_dict = m.r_out.to_dict()
-
-    # energy hubs
-    # are processes that satisfy three conditions:
-    # 1. fixed investment costs == 0
-    # 2. minimum capacity == 0
-    # 3. has only one input commodity
-    # 4. the input commodity ratio has value 1
-    # In contrast to generic processes, which are at nodes,
-    # hubs are located in edges
-    has_cost_inv_fix_0 = process['cost-inv-fix'] == 0
-    has_cap_min_0 = process['cap-min'] == 0
-    has_one_input = m.r_in.groupby(level='Process').count() == 1
-    has_r_in_1 = m.r_in.groupby(level='Process').sum() == 1
-    is_hub = (has_cost_inv_fix_0 & has_cap_min_0 & has_one_input & has_r_in_1)
-    hub = process[is_hub.reindex(process.index)]
-    m.params['hub'] = hub
-
-    # derive peak and demand of edges
-    # by selecting edge columns that are named like area types (res, com, ind)
-    area_types = list(area_demand.index.levels[0])
-    edge_areas = edge[edge.columns.intersection(area_types)]
-
-    # helper function: calculates outer product of column in table area_demand
-    # with specified series, which is applied to the columns of edge_areas
-    def multiply_by_area_demand(series, column):
-        return (area_demand[column].loc[series.name]
-                                   .apply(lambda x: x*series)
-                                   .stack())
-
-    # peak(edge, commodity) in kW
-    m.peak = (edge_areas.apply(lambda x: multiply_by_area_demand(x, 'peak'))
-                        .sum(axis=1)
-                        .unstack('Commodity'))
-
-    # reindex edges to vertex tuple index
-    vertex.set_index('Vertex', inplace=True)
-    edge.set_index(['Vertex1', 'Vertex2'], inplace=True)
-    m.peak.index = edge.index
-    m.peak.sort_index(inplace=True)
-
-    # store geographic DataFrames vertex & edge for later use
-    m.params['vertex'] = vertex.copy()
-    m.params['edge'] = edge.copy()
-    m.edge_geo_dict = m.params['edge'].geometry.to_dict()
-
-    if peak_multiplier:
-        m.peak = peak_multiplier(m)
-
-    m.peak_dict = m.peak.to_dict()
-    # construct arc set of directed (i,j), (j,i) edges
-    arcs = [arc for (v1, v2) in edge.index for arc in ((v1, v2), (v2, v1))]
-
-    # derive list of neighbours for each vertex
-    m.neighbours = {}
-    for (v1, v2) in arcs:
-        m.neighbours.setdefault(v1, [])
-        m.neighbours[v1].append(v2)
-
-    # find all commodities for which there exists demand
-    co_demand = set(area_demand.index.get_level_values('Commodity'))
-
-    # find transportable commodities, i.e. those with a positive maximum
-    # transport capacity. Commodities with 0, #NV or empty values are thus
-    # excluded
-    is_transportable = commodity['cap-max'] > 0
-    co_transportable = commodity[is_transportable].index
-
-    # find possible source commodities, i.e. those for which there are
-    # capacities within table `vertex`
-    co_source = commodity.index.intersection(vertex.columns)
-
-    # find commodities for which there exists no identically named attribute in
-    # table 'vertex' and set it to zero to disable them as source-commodities.
-    no_source_commodities = commodity.index.difference(vertex.columns)
-    for co in no_source_commodities:
-        vertex[co] = 0
-
-    # find commodities for which there is a non-zero, finite allowed maximum
-    has_allowed_max = (commodity['allowed-max'] > 0 &
-                       ~commodity['allowed-max'].apply(math.isinf))
-    co_allowed_max = commodity[has_allowed_max].index
+    sets = prepare_inputs(m, data, vertex, edge, peak_multiplier,
+                          hub_only_in_edge)
 
     # MODEL
 
@@ -252,56 +209,55 @@ def create_model(data, vertex, edge, peak_multiplier=None,
 
     # commodity
     m.commodity = pyomo.Set(
-        initialize=commodity.index,
+        initialize=sets['commodity'],
         doc='Commodities')
     m.co_demand = pyomo.Set(
         within=m.commodity,
-        initialize=co_demand,
+        initialize=sets['co_demand'],
         doc='Commodities that have demand in edges')
     m.co_source = pyomo.Set(
         within=m.commodity,
-        initialize=co_source,
+        initialize=sets['co_source'],
         doc='Commodities that may have a source at some vertex/vertices')
     m.co_transportable = pyomo.Set(
         within=m.commodity,
-        initialize=co_transportable,
+        initialize=sets['co_transportable'],
         doc='Commodities that may be transported through edges')
+    if flow_formulation == 'aggregated':
+        m.co_directed = pyomo.Set(
+            within=m.co_transportable,
+            initialize=sets['co_directed'],
+            doc='Transportable commodities with one flow direction per edge')
     m.co_allowed_max = pyomo.Set(
         within=m.commodity,
-        initialize=co_allowed_max,
+        initialize=sets['co_allowed_max'],
         doc='Commodities that have a maximum allowed generation (e.g. CO2)')
 
     # process
-    if hub_only_in_edge:
-        proc_init = process.index.difference(hub.index).values.tolist()
-        proc_input_init = m.r_in.to_frame().drop(hub.index, level=0).index.values.tolist()
-        proc_output_init = m.r_out.to_frame().drop(hub.index, level=0).index.values.tolist()
-    else:
-        proc_init = process.index
-        proc_input_init = m.r_in.index
-        proc_output_init = m.r_out.index
     m.process = pyomo.Set(
-        initialize=proc_init,
+        dimen=1,
+        initialize=sets['process'],
         doc='Processes, converting commodities in vertices')
     m.process_input_tuples = pyomo.Set(
         dimen=2,
         within=m.process*m.commodity,
-        initialize=proc_input_init,
+        initialize=sets['process_input_tuples'],
         doc='Commodities consumed by processes')
     m.process_output_tuples = pyomo.Set(
         dimen=2,
         within=m.process*m.commodity,
-        initialize=proc_output_init,
+        initialize=sets['process_output_tuples'],
         doc='Commodities emitted by processes')
 
     # hub
     m.hub = pyomo.Set(
-        initialize=hub.index,
+        dimen=1,
+        initialize=sets['hub'],
         doc='Hub processes, converting commodities in edges')
 
     # time
     m.time = pyomo.Set(
-        initialize=time.index,
+        initialize=sets['time'],
         doc='Timesteps')
 
     # storage
@@ -311,15 +267,15 @@ def create_model(data, vertex, edge, peak_multiplier=None,
 
     # graph
     m.vertex = pyomo.Set(
-        initialize=vertex.index,
+        initialize=sets['vertex'],
         doc='Connection points between edges, for source and processes')
     m.edge = pyomo.Set(
         within=m.vertex*m.vertex,
-        initialize=edge.index,
+        initialize=sets['edge'],
         doc='Undirected street segments, for demand and hubs')
     m.arc = pyomo.Set(
         within=m.vertex*m.vertex,
-        initialize=arcs,
+        initialize=sets['arc'],
         doc='Directed street segments, for power flows')
 
     # costs
@@ -328,10 +284,74 @@ def create_model(data, vertex, edge, peak_multiplier=None,
         doc='')
 
     # Parameters
-    # none needed, DataFrames work directly in equation definitions
+    # none needed by default, the dicts above work directly in equation
+    # definitions. For parameter sweeps, their entries are replaced by
+    # mutable Params, so that rules build expressions referencing them.
+    if mutable_params:
+        m.commodity_attribute = pyomo.Set(
+            initialize=MUTABLE_ATTRIBUTES['commodity'],
+            doc='Mutable commodity attributes')
+        m.process_attribute = pyomo.Set(
+            initialize=MUTABLE_ATTRIBUTES['process'],
+            doc='Mutable process attributes')
+        m.hub_attribute = pyomo.Set(
+            initialize=MUTABLE_ATTRIBUTES['hub'],
+            doc='Mutable hub attributes')
+
+        # blank (NaN) spreadsheet cells are no Reals, they stay in the dicts
+        m.commodity_param = pyomo.Param(
+            m.commodity, m.commodity_attribute,
+            initialize=param_values(m.commodity_dict, m.commodity,
+                                    m.commodity_attribute),
+            within=pyomo.Reals,
+            mutable=True,
+            doc='costs, losses and capacity of commodity')
+        m.process_param = pyomo.Param(
+            m.process, m.process_attribute,
+            initialize=param_values(m.process_dict, m.process,
+                                    m.process_attribute),
+            within=pyomo.Reals,
+            mutable=True,
+            doc='costs and capacities of process')
+        m.hub_param = pyomo.Param(
+            m.hub, m.hub_attribute,
+            initialize=param_values(m.hub_dict, m.hub, m.hub_attribute),
+            within=pyomo.Reals,
+            mutable=True,
+            doc='costs and capacity of hub process')
+        m.source_param = pyomo.Param(
+            m.vertex, m.co_source,
+            initialize=param_values(m.vertex_dict, m.vertex, m.co_source),
+            within=pyomo.Reals,
+            mutable=True,
+            doc='source capacity (kW) of commodity in vertex')
+
+        for table, param in [(m.commodity_dict, m.commodity_param),
+                             (m.process_dict, m.process_param),
+                             (m.hub_dict, m.hub_param),
+                             (m.vertex_dict, m.source_param)]:
+            for (key, attribute) in param:
+                table[key][attribute] = param[key, attribute]
+
+    # big-M of flows and capacities: commodity cap-max or tighter bounds
+    m.tighten_bounds = tighten_bounds and not mutable_params
+    if m.tighten_bounds:
+        m.arc_flow_bound_dict = arc_flow_bounds(m)
+    else:
+        m.arc_flow_bound_dict = {
+            (i, j, co): m.commodity_dict[co]['cap-max']
+            for (i, j) in sets['arc'] for co in sets['co_transportable']}
+    m.edge_capacity_bound_dict = {
+        (i, j, co): (m.commodity_dict[co]['cap-max'] if mutable_params
+                     else max(m.arc_flow_bound_dict[i, j, co],
+                              m.arc_flow_bound_dict[j, i, co]))
+        for (i, j) in sets['edge'] for co in sets['co_transportable']}
 
     # Variables
 
+    # domain of the (relaxed) binary decisions
+    binary = pyomo.Binary if mode == 'mip' else pyomo.UnitInterval
+
     # edges and arcs
     m.Sigma = pyomo.Var(
         m.edge, m.commodity, m.time,
@@ -340,22 +360,31 @@ def create_model(data, vertex, edge, peak_multiplier=None,
     m.Pin = pyomo.Var(
         m.arc, m.co_transportable, m.time,
         within=pyomo.NonNegativeReals,
+        bounds=flow_bounds_rule,
         doc='power flow (kW) of commodity into arc at time')
     m.Pot = pyomo.Var(
         m.arc, m.co_transportable, m.time,
         within=pyomo.NonNegativeReals,
+        bounds=flow_bounds_rule,
         doc='power flow (kW) of commodity out of arc at time')
-    m.Psi = pyomo.Var(
-        m.arc, m.co_transportable, m.time,
-        within=pyomo.Binary,
-        doc='1 if (directed!) arc is used at time, 0 else')
+    if flow_formulation == 'timestep':
+        m.Psi = pyomo.Var(
+            m.arc, m.co_transportable, m.time,
+            within=binary,
+            doc='1 if (directed!) arc is used at time, 0 else')
+    else:
+        m.Delta = pyomo.Var(
+            m.edge, m.co_directed,
+            within=binary,
+            doc='1 if edge flow is from Vertex1 to Vertex2, 0 if reverse')
     m.Pmax = pyomo.Var(
         m.edge, m.co_transportable,
         within=pyomo.NonNegativeReals,
+        bounds=capacity_bounds_rule,
         doc='power flow capacity (kW) for commodity in edge')
     m.Xi = pyomo.Var(
         m.edge, m.co_transportable,
-        within=pyomo.Binary,
+        within=binary,
         doc='1 if (undirected!) edge is used for commodity at all, 0 else')
 
     # vertices
@@ -381,18 +410,18 @@ def create_model(data, vertex, edge, peak_multiplier=None,
         doc='capacity (kW) of process in vertex')
     m.Phi = pyomo.Var(
         m.vertex, m.process,
-        within=pyomo.Binary,
+        within=binary,
         doc='1 if process in vertex has Kappa_process > 0, 0 else')
     m.Tau = pyomo.Var(
         m.vertex, m.process, m.time,
         within=pyomo.NonNegativeReals,
         doc='power flow (kW) through process')
     m.Epsilon_in = pyomo.Var(
-        m.vertex, m.process, m.commodity, m.time,
+        m.vertex, m.process_input_tuples, m.time,
         within=pyomo.NonNegativeReals,
         doc='power flow (kW) of commodity into process')
     m.Epsilon_out = pyomo.Var(
-        m.vertex, m.process, m.commodity, m.time,
+        m.vertex, m.process_output_tuples, m.time,
         within=pyomo.NonNegativeReals,
         doc='power flow (kW) of commodity out of process')
 
@@ -417,14 +446,20 @@ def create_model(data, vertex, edge, peak_multiplier=None,
         m.arc, m.co_transportable, m.time,
         rule=arc_flow_by_capacity_rule,
         doc='Pin <= Pmax')
-    m.arc_flow_unidirectionality = pyomo.Constraint(
-        m.arc, m.co_transportable, m.time,
-        rule=arc_flow_unidirectionality_rule,
-        doc='Pin <= Cmax * Psi')
-    m.arc_unidirectionality = pyomo.Constraint(
-        m.arc, m.co_transportable, m.time,
-        rule=arc_unidirectionality_rule,
-        doc='Psi[i,j,t] + Psi[j,i,t] <= 1')
+    if flow_formulation == 'timestep':
+        m.arc_flow_unidirectionality = pyomo.Constraint(
+            m.arc, m.co_transportable, m.time,
+            rule=arc_flow_unidirectionality_rule,
+            doc='Pin <= Cmax * Psi')
+        m.arc_unidirectionality = pyomo.Constraint(
+            m.arc, m.co_transportable, m.time,
+            rule=arc_unidirectionality_rule,
+            doc='Psi[i,j,t] + Psi[j,i,t] <= 1')
+    else:
+        m.arc_flow_direction = pyomo.Constraint(
+            m.arc, m.co_directed, m.time,
+            rule=arc_flow_direction_rule,
+            doc='Pin <= Cmax * Delta (forward), Cmax * (1 - Delta) (reverse)')
     m.edge_capacity = pyomo.Constraint(
         m.edge, m.co_transportable,
         rule=edge_capacity_rule,
@@ -495,22 +530,292 @@ def create_model(data, vertex, edge, peak_multiplier=None,
 
     return m
 
+
+def prepare_inputs(m, data, vertex, edge, peak_multiplier=None,
+                   hub_only_in_edge=True):
+    """Derive the parameters and index sets of a rivus model from its input.
+
+    Shared by ``create_model`` and other model backends. Peak demand,
+    edge lengths, ratios and plain-dict lookups (``m.peak_dict``,
+    ``m.commodity_dict``, ...) are stored as attributes of `m`, which is a
+    ConcreteModel or any other attribute container. Arguments as for
+    ``create_model``, `vertex` and `edge` are changed the same way.
+
+    Returns
+    -------
+    dict
+        Initial values of the index sets, by set name (e.g. 'commodity',
+        'co_transportable', 'process_input_tuples', 'edge', 'arc').
+    """
+    # DataFrame aliases
+    commodity = data['commodity']
+    process = data['process']
+    process_commodity = data['process_commodity']
+    time = data['time']
+    area_demand = data['area_demand']
+
+    # Handling the indexing of GeoDataFrames
+    # If we get "too clever" input,
+    # reset it to leave peak calculation untouched.
+    # If not, peak gets messed up through
+    # edge_areas and multiply_by_area_demand
+    if edge.index.names == ['Vertex1', 'Vertex2']:
+        edge = edge.reset_index()
+    if vertex.index.names == ['Vertex']:
+        vertex = vertex.reset_index()
+
+    # process input/output ratios
+    m.r_in = process_commodity.xs('In', level='Direction')['ratio']
+    m.r_out = process_commodity.xs('Out', level='Direction')['ratio']
+    # For faster value retrieval
+    m.r_in_dict = m.r_in.to_dict()
+    m.r_out_dict = m.r_out.to_dict()
+
+    # energy hubs
+    # are processes that satisfy three conditions:
+    # 1. fixed investment costs == 0
+    # 2. minimum capacity == 0
+    # 3. has only one input commodity
+    # 4. the input commodity ratio has value 1
+    # In contrast to generic processes, which are at nodes,
+    # hubs are located in edges
+    has_cost_inv_fix_0 = process['cost-inv-fix'] == 0
+    has_cap_min_0 = process['cap-min'] == 0
+    has_one_input = m.r_in.groupby(level='Process').count() == 1
+    has_r_in_1 = m.r_in.groupby(level='Process').sum() == 1
+    is_hub = (has_cost_inv_fix_0 & has_cap_min_0 & has_one_input & has_r_in_1)
+    hub = process[is_hub.reindex(process.index)]
+    m.params['hub'] = hub
+
+    # derive peak and demand of edges
+    # by selecting edge columns that are named like area types (res, com, ind)
+    area_types = list(area_demand.index.levels[0])
+    edge_areas = edge[edge.columns.intersection(area_types)]
+
+    # helper function: calculates outer product of column in table area_demand
+    # with specified series, which is applied to the columns of edge_areas
+    def multiply_by_area_demand(series, column):
+        return (area_demand[column].loc[series.name]
+                                   .apply(lambda x: x*series)
+                                   .stack())
+
+    # peak(edge, commodity) in kW
+    m.peak = (edge_areas.apply(lambda x: multiply_by_area_demand(x, 'peak'))
+                        .sum(axis=1)
+                        .unstack('Commodity'))
+
+    # reindex edges to vertex tuple index
+    vertex.set_index('Vertex', inplace=True)
+    edge.set_index(['Vertex1', 'Vertex2'], inplace=True)
+    m.peak.index = edge.index
+    m.peak.sort_index(inplace=True)
+
+    # store geographic DataFrames vertex & edge for later use
+    m.params['vertex'] = vertex.copy()
+    m.params['edge'] = edge.copy()
+
+    # geodesic length (m) of all edges, calculated once for all rules
+    m.edge_length = pd.Series(line_lengths(edge.geometry),
+                              index=edge.index, name='length')
+    m.edge_length_dict = m.edge_length.to_dict()
+
+    if peak_multiplier:
+        m.peak = peak_multiplier(m)
+
+    m.peak_dict = m.peak.to_dict()
+    # construct arc set of directed (i,j), (j,i) edges
+    arcs = [arc for (v1, v2) in edge.index for arc in ((v1, v2), (v2, v1))]
+
+    # derive list of neighbours for each vertex
+    m.neighbours = {}
+    for (v1, v2) in arcs:
+        m.neighbours.setdefault(v1, [])
+        m.neighbours[v1].append(v2)
+
+    # find all commodities for which there exists demand
+    co_demand = set(area_demand.index.get_level_values('Commodity'))
+
+    # find transportable commodities, i.e. those with a positive maximum
+    # transport capacity. Commodities with 0, #NV or empty values are thus
+    # excluded
+    is_transportable = commodity['cap-max'] > 0
+    co_transportable = commodity[is_transportable].index
+
+    # commodities, whose flows have a direction per edge in the aggregated
+    # flow formulation: all transportable ones, as without it an edge could
+    # be fed from both ends at once, unlike in the time step formulation
+    co_directed = co_transportable
+
+    # find possible source commodities, i.e. those for which there are
+    # capacities within table `vertex`
+    co_source = commodity.index.intersection(vertex.columns)
+
+    # find commodities for which there exists no identically named attribute in
+    # table 'vertex' and set it to zero to disable them as source-commodities.
+    no_source_commodities = commodity.index.difference(vertex.columns)
+    for co in no_source_commodities:
+        vertex[co] = 0
+
+    # For faster value retrieval in rules: plain dicts of the parameter
+    # tables, e.g. m.commodity_dict[co]['cap-max']
+    m.commodity_dict = commodity.to_dict(orient='index')
+    m.process_dict = process.to_dict(orient='index')
+    m.hub_dict = hub.to_dict(orient='index')
+    m.time_dict = time.to_dict(orient='index')
+    m.vertex_dict = vertex[commodity.index].to_dict(orient='index')
+
+    # find commodities for which there is a non-zero, finite allowed maximum
+    has_allowed_max = (commodity['allowed-max'] > 0 &
+                       ~commodity['allowed-max'].apply(math.isinf))
+    co_allowed_max = commodity[has_allowed_max].index
+
+    if hub_only_in_edge:
+        proc_init = process.index.difference(hub.index).values.tolist()
+        proc_input_init = m.r_in.to_frame().drop(hub.index, level=0).index.values.tolist()
+        proc_output_init = m.r_out.to_frame().drop(hub.index, level=0).index.values.tolist()
+    else:
+        proc_init = process.index
+        proc_input_init = m.r_in.index
+        proc_output_init = m.r_out.index
+
+    # incidence lists: commodity -> [(process, ratio), ...] of the processes
+    # and hubs consuming/emitting it, so that balance helpers only visit
+    # processes that actually touch a commodity
+    m.process_inputs = incidence_lists(proc_input_init, m.r_in_dict)
+    m.process_outputs = incidence_lists(proc_output_init, m.r_out_dict)
+    hub_input_init = [(h, co) for (h, co) in m.r_in_dict if h in hub.index]
+    hub_output_init = [(h, co) for (h, co) in m.r_out_dict if h in hub.index]
+    m.hub_inputs = incidence_lists(hub_input_init, m.r_in_dict)
+    m.hub_outputs = incidence_lists(hub_output_init, m.r_out_dict)
+
+    return {
+        'commodity': commodity.index,
+        'co_demand': co_demand,
+        'co_source': co_source,
+        'co_transportable': co_transportable,
+        'co_directed': co_directed,
+        'co_allowed_max': co_allowed_max,
+        'process': proc_init,
+        'process_input_tuples': proc_input_init,
+        'process_output_tuples': proc_output_init,
+        'hub': hub.index,
+        'time': time.index,
+        'vertex': vertex.index,
+        'edge': edge.index,
+        'arc': arcs}
+
+
+def update_parameters(prob, data_patch):
+    """Change costs, capacities, losses and source capacities in place.
+
+    Only works on models created with ``create_model(...,
+    mutable_params=True)``. After the update, the model can be re-solved
+    without rebuilding it. The tables in ``prob.params`` are updated, too.
+
+    Parameters
+    ----------
+    prob : ConcreteModel
+        rivus model instance with mutable Params
+    data_patch : dict
+        Keys are table names 'commodity', 'process' (incl. hubs) or 'vertex'.
+        Values are DataFrames (e.g. as yielded by ``parameter_range``) or
+        nested dicts ``{index: {column: value}}`` with the new values.
+        Unchanged values of non-mutable attributes are ignored.
+
+    Raises
+    ------
+    ValueError
+        If the model has no mutable Params, or a value that cannot be
+        changed without rebuilding the model differs from its current one.
+
+    Example
+    -------
+    ::
+
+        prob = create_model(data, vertex, edge, mutable_params=True)
+        for variant in parameter_range(data['commodity'], 'Heat', 'cost-fix'):
+            update_parameters(prob, {'commodity': variant})
+            solver.solve(prob)
+    """
+    if not hasattr(prob, 'commodity_param'):
+        raise ValueError("Model has no mutable parameters. Create it with "
+                         "create_model(..., mutable_params=True).")
+
+    for table, patch in data_patch.items():
+        if isinstance(patch, pd.DataFrame):
+            patch = patch.to_dict(orient='index')
+        for key, attributes in patch.items():
+            for attribute, value in attributes.items():
+                _update_parameter(prob, table, key, attribute, value)
+
+
+def _update_parameter(prob, table, key, attribute, value):
+    """Set a single mutable Param value and keep prob.params in sync."""
+    if table == 'commodity':
+        param, frames = prob.commodity_param, ['commodity']
+    elif table == 'process' and key in prob.hub:
+        param, frames = prob.hub_param, ['process', 'hub']
+    elif table == 'process':
+        param, frames = prob.process_param, ['process']
+    elif table == 'vertex':
+        if attribute not in prob.commodity:
+            return  # geometry and other non-commodity columns
+        param, frames = prob.source_param, ['vertex']
+    else:
+        raise ValueError("Table '{}' has no mutable parameters.".format(table))
+
+    if (key, attribute) not in param:
+        current = prob.params[table].loc[key, attribute] \
+            if attribute in prob.params[table].columns else 0
+        if value == current or (pd.isnull(value) and pd.isnull(current)):
+            return
+        raise ValueError("{}.loc[{}, {}] is not mutable. Create a new model "
+                         "to change it.".format(table, key, attribute))
+
+    param[key, attribute] = value
+    for frame in frames:
+        prob.params[frame].loc[key, attribute] = value
+
+# Parameter and bound functions
+
+def param_values(table, keys, attributes):
+    """Return {(key, attribute): value} of a dict table, without NaNs."""
+    return {(key, attribute): table[key][attribute]
+            for key in keys
+            for attribute in attributes
+            if not pd.isnull(table[key][attribute])}
+
+# the big-M of flows and capacities also as variable bounds, for the solver's
+# presolve
+def flow_bounds_rule(m, i, j, co, t):
+    if not m.tighten_bounds:
+        return (0, None)
+    return (0, finite_or_none(m.arc_flow_bound_dict[i, j, co]))
+
+def capacity_bounds_rule(m, i, j, co):
+    if not m.tighten_bounds:
+        return (0, None)
+    return (0, finite_or_none(m.edge_capacity_bound_dict[i, j, co]))
+
 # Constraint functions
 
 # edges/arcs
 def peak_satisfaction_rule(m, i, j, co, t):
     provided_power = hub_balance(m, i, j, co, t) + m.Sigma[i, j, co, t]
-    return provided_power >= m.peak_dict[co][(i, j)] * m.params['time'].loc[t][co]
+    return provided_power >= m.peak_dict[co][(i, j)] * m.time_dict[t][co]
 
 def edge_equation_rule(m, i, j, co, t):
     if co in m.co_transportable:
-        length = line_length(m.edge_geo_dict[i, j])
+        length = m.edge_length_dict[i, j]
 
-        flow_in = ( 1 - length * m.params['commodity'].loc[co]['loss-var']) * \
+        flow_in = ( 1 - length * m.commodity_dict[co]['loss-var']) * \
                   ( m.Pin[i,j,co,t] + m.Pin[j,i,co,t] )
         flow_out =  m.Pot[i,j,co,t] + m.Pot[j,i,co,t]
-        fixed_losses = ( m.Psi[i,j,co,t] + m.Psi[j,i,co,t] ) * \
-                       length * m.params['commodity'].loc[co]['loss-fix']
+        if m.flow_formulation == 'timestep':
+            is_used = m.Psi[i,j,co,t] + m.Psi[j,i,co,t]
+        else:
+            is_used = m.Xi[i,j,co]
+        fixed_losses = is_used * length * m.commodity_dict[co]['loss-fix']
 
         return m.Sigma[i,j,co,t] <= flow_in - flow_out - fixed_losses
     else:
@@ -521,13 +826,20 @@ def arc_flow_by_capacity_rule(m, i, j, co, t):
     return m.Pin[i,j,co,t] <= m.Pmax[v1, v2, co]
 
 def arc_flow_unidirectionality_rule(m, i, j, co, t):
-    return m.Pin[i,j,co,t] <= m.params['commodity'].loc[co]['cap-max'] * m.Psi[i,j,co,t]
+    return m.Pin[i,j,co,t] <= m.arc_flow_bound_dict[i,j,co] * m.Psi[i,j,co,t]
 
 def arc_unidirectionality_rule(m, i, j, co, t):
     return m.Psi[i,j,co,t] + m.Psi[j,i,co,t] <= 1
 
+def arc_flow_direction_rule(m, i, j, co, t):
+    if (i, j) in m.edge:
+        direction = m.Delta[i,j,co]
+    else:
+        direction = 1 - m.Delta[j,i,co]
+    return m.Pin[i,j,co,t] <= m.arc_flow_bound_dict[i,j,co] * direction
+
 def edge_capacity_rule(m, i, j, co):
-    return m.Pmax[i,j,co] <= m.Xi[i,j,co] * m.params['commodity'].loc[co]['cap-max']
+    return m.Pmax[i,j,co] <= m.Xi[i,j,co] * m.edge_capacity_bound_dict[i,j,co]
 
 # hubs
 def hub_supply_rule(m, i, j, co, t):
@@ -538,7 +850,7 @@ def hub_output_by_capacity_rule(m, i, j, h, t):
     return m.Epsilon_hub[i,j,h,t] <= m.Kappa_hub[i,j,h]
 
 def hub_capacity_rule(m, i, j, h):
-    return m.Kappa_hub[i,j,h] <= m.params['hub'].loc[h]['cap-max']
+    return m.Kappa_hub[i,j,h] <= m.hub_dict[h]['cap-max']
 
 # vertex
 def vertex_equation_rule(m, v, co, t):
@@ -553,30 +865,59 @@ def vertex_equation_rule(m, v, co, t):
         return 0 >= flow_required + process_required
 
 def source_vertices_rule(m, v, co, t):
-    return m.Rho[v,co,t]<= m.params['vertex'].loc[v][co]
+    return m.Rho[v,co,t]<= m.vertex_dict[v][co]
 
 # commodity
 def commodity_maximum_rule(m, co):
-    total_generation = 0
-    for t in m.time:
-        generation_per_timestep = 0
+    # weighted net generation: one linear term per (process|hub) x location x
+    # timestep that actually consumes or emits the commodity
+    weights = [(t, float(m.time_dict[t]['weight'])) for t in m.time]
+    process_in = m.process_inputs.get(co, [])
+    process_out = m.process_outputs.get(co, [])
+    hub_in = m.hub_inputs.get(co, [])
+    hub_out = m.hub_outputs.get(co, [])
+    if not (process_in or process_out or hub_in or hub_out):
+        return pyomo.Constraint.Skip
+
+    coefs, variables = [], []
+    for p, _ in process_in:
+        for v in m.vertex:
+            for (t, w) in weights:
+                coefs.append(-w)
+                variables.append(m.Epsilon_in[v,p,co,t])
+    for p, _ in process_out:
         for v in m.vertex:
-            generation_per_timestep += process_balance(m, v, co, t)
-        for e in m.edge:
-            generation_per_timestep += hub_balance(m, e[0], e[1], co, t)
-        generation_per_timestep *= m.params['time'].loc[t]['weight']
-        total_generation += generation_per_timestep
-    return total_generation <= m.params['commodity'].loc[co]['allowed-max']
+            for (t, w) in weights:
+                coefs.append(w)
+                variables.append(m.Epsilon_out[v,p,co,t])
+    for h, ratio in hub_in:
+        for (i,j) in m.edge:
+            for (t, w) in weights:
+                coefs.append(-w * ratio)
+                variables.append(m.Epsilon_hub[i,j,h,t])
+    for h, ratio in hub_out:
+        for (i,j) in m.edge:
+            for (t, w) in weights:
+                coefs.append(w * ratio)
+                variables.append(m.Epsilon_hub[i,j,h,t])
+
+    if LinearExpression is not None:
+        total_generation = LinearExpression(
+            constant=0, linear_coefs=coefs, linear_vars=variables)
+    else:
+        total_generation = pyomo.quicksum(
+            c * var for (c, var) in zip(coefs, variables))
+    return total_generation <= m.commodity_dict[co]['allowed-max']
 
 # process
 def process_throughput_by_capacity_rule(m, v, p, t):
     return m.Tau[v,p,t] <= m.Kappa_process[v, p]
 
 def process_capacity_min_rule(m, v, p):
-    return m.Kappa_process[v, p] >= m.Phi[v, p] * m.params['process'].loc[p]['cap-min']
+    return m.Kappa_process[v, p] >= m.Phi[v, p] * m.process_dict[p]['cap-min']
 
 def process_capacity_max_rule(m, v, p):
-    return m.Kappa_process[v, p] <= m.Phi[v, p] * m.params['process'].loc[p]['cap-max']
+    return m.Kappa_process[v, p] <= m.Phi[v, p] * m.process_dict[p]['cap-max']
 
 def process_input_rule(m, v, p, co, t):
     return m.Epsilon_in[v, p, co, t] == m.Tau[v, p, t] * m.r_in_dict[(p, co)]
@@ -589,39 +930,39 @@ def process_output_rule(m, v, p, co, t):
 def def_costs_rule(m, cost_type):
     if cost_type == 'Inv':
         return m.costs['Inv'] == \
-            sum(m.Kappa_hub[i,j,h] * m.params['hub'].loc[h]['cost-inv-var']
+            sum(m.Kappa_hub[i,j,h] * m.hub_dict[h]['cost-inv-var']
                 for (i,j) in m.edge for h in m.hub) + \
-            sum(m.Kappa_process[v,p] * m.params['process'].loc[p]['cost-inv-var'] +
-                m.Phi[v,p] * m.params['process'].loc[p]['cost-inv-fix']
+            sum(m.Kappa_process[v,p] * m.process_dict[p]['cost-inv-var'] +
+                m.Phi[v,p] * m.process_dict[p]['cost-inv-fix']
                 for v in m.vertex for p in m.process) + \
-            sum((m.Pmax[i,j,co] * m.params['commodity'].loc[co]['cost-inv-var'] +
-                 m.Xi[i,j,co] * m.params['commodity'].loc[co]['cost-inv-fix']) *
-                line_length(m.edge_geo_dict[(i, j)])
+            sum((m.Pmax[i,j,co] * m.commodity_dict[co]['cost-inv-var'] +
+                 m.Xi[i,j,co] * m.commodity_dict[co]['cost-inv-fix']) *
+                m.edge_length_dict[(i, j)]
                 for (i,j) in m.edge for co in m.co_transportable)
 
     elif cost_type == 'Fix':
         return m.costs['Fix'] == \
-            sum(m.Kappa_hub[i,j,h] * m.params['hub'].loc[h]['cost-fix']
+            sum(m.Kappa_hub[i,j,h] * m.hub_dict[h]['cost-fix']
                 for (i,j) in m.edge for h in m.hub) + \
-            sum(m.Kappa_process[v,p] * m.params['process'].loc[p]['cost-fix']
+            sum(m.Kappa_process[v,p] * m.process_dict[p]['cost-fix']
                 for v in m.vertex for p in m.process) + \
-            sum(m.Pmax[i,j,co] * m.params['commodity'].loc[co]['cost-fix'] *
-                line_length(m.edge_geo_dict[(i, j)])
+            sum(m.Pmax[i,j,co] * m.commodity_dict[co]['cost-fix'] *
+                m.edge_length_dict[(i, j)]
                 for (i,j) in m.edge for co in m.co_transportable)
 
     elif cost_type == 'Var':
         return m.costs['Var'] == \
             sum(m.Epsilon_hub[i,j,h,t] *
-                m.params['hub'].loc[h]['cost-var'] *
-                m.params['time'].loc[t]['weight']
+                m.hub_dict[h]['cost-var'] *
+                m.time_dict[t]['weight']
                 for (i,j) in m.edge for h in m.hub for t in m.time) + \
             sum(m.Tau[v,p,t] *
-                m.params['process'].loc[p]['cost-var'] *
-                m.params['time'].loc[t]['weight']
+                m.process_dict[p]['cost-var'] *
+                m.time_dict[t]['weight']
                 for v in m.vertex for p in m.process for t in m.time) + \
             sum(m.Rho[v,co,t] *
-                m.params['commodity'].loc[co]['cost-var'] *
-                m.params['time'].loc[t]['weight']
+                m.commodity_dict[co]['cost-var'] *
+                m.time_dict[t]['weight']
                 for v in m.vertex for co in m.co_source for t in m.time)
 
     else:
@@ -636,11 +977,10 @@ def obj_rule(m):
 def hub_balance(m, i, j, co, t):
     """Calculate commodity balance in an edge {i,j} from/to hubs. """
     balance = 0
-    for h in m.hub:
-        if (h, co) in m.r_in_dict:
-            balance -= m.Epsilon_hub[i,j,h,t] * m.r_in_dict[(h, co)] # m.r_in = 1 by definition
-        if (h, co) in m.r_out_dict:
-            balance += m.Epsilon_hub[i,j,h,t] * m.r_out_dict[(h, co)]
+    for h, ratio in m.hub_inputs.get(co, ()):
+        balance -= m.Epsilon_hub[i,j,h,t] * ratio # m.r_in = 1 by definition
+    for h, ratio in m.hub_outputs.get(co, ()):
+        balance += m.Epsilon_hub[i,j,h,t] * ratio
     return balance
 
 def flow_balance(m, v, co, t):
@@ -654,11 +994,10 @@ def flow_balance(m, v, co, t):
 def process_balance(m, v, co, t):
     """Calculate commodity balance in a vertex from/to processes. """
     balance = 0
-    for p in m.process:
-        if (p, co) in m.r_in_dict:
-            balance -= m.Epsilon_in[v,p,co,t]
-        if (p, co) in m.r_out_dict:
-            balance += m.Epsilon_out[v,p,co,t]
+    for p, _ in m.process_inputs.get(co, ()):
+        balance -= m.Epsilon_in[v,p,co,t]
+    for p, _ in m.process_outputs.get(co, ()):
+        balance += m.Epsilon_out[v,p,co,t]
     return balance
 
 def find_matching_edge(m, i, j):
@@ -671,6 +1010,270 @@ def find_matching_edge(m, i, j):
 
 # Helper functions for data preparation
 
+def incidence_lists(tuples, ratios):
+    """Group (process, commodity) tuples by commodity.
+
+    Args:
+        tuples: iterable of (process, commodity) tuples
+        ratios: dict of input or output ratios with (process, commodity) keys
+
+    Returns:
+        dict commodity -> list of (process, ratio) tuples
+
+    Example:
+        >>> incidence_lists([('CHP', 'Gas')], {('CHP', 'Gas'): 1.0})
+        {'Gas': [('CHP', 1.0)]}
+    """
+    incidence = {}
+    for (p, co) in tuples:
+        incidence.setdefault(co, []).append((p, ratios[(p, co)]))
+    return incidence
+
+
+def arc_flow_bounds(m):
+    """Calculate upper bounds of the flow of each commodity in each arc.
+
+    A flow into arc (i, j) only needs to cover what can be consumed behind
+    it: the peak demand of the edges reachable from j (if the edge is a
+    bridge, only those on j's side, else all of its graph component), the
+    inputs of hubs in these edges and of processes at any vertex, plus
+    losses on the way. If a commodity is not produced by processes or hubs,
+    the flow is also limited by the source capacities on i's side. All
+    bounds are capped by the commodity's cap-max.
+
+    Args:
+        m: rivus model instance, with all sets and dicts up to the variables
+
+    Returns:
+        dict (i, j, commodity) -> bound for all arcs and transportable
+        commodities; math.inf if no finite bound could be derived
+    """
+    edges = list(m.edge)
+    times = list(m.time)
+    commodities = list(m.commodity)
+
+    # direct demand, per edge and time step
+    need = {co: np.zeros((len(edges), len(times))) for co in commodities}
+    for co in m.co_demand:
+        peak = np.array([m.peak_dict[co][e] for e in edges])
+        scaling = np.array([m.time_dict[t][co] for t in times])
+        need[co] = np.outer(peak, scaling)
+
+    # inputs of hubs serve the demand of their own edge, inputs of processes
+    # may serve any demand of their component
+    hub_tuples = ([(h, co) for (h, co) in m.r_in_dict if h in m.hub],
+                  [(h, co) for (h, co) in m.r_out_dict if h in m.hub])
+    process_tuples = (list(m.process_input_tuples),
+                      list(m.process_output_tuples))
+    need = derived_need(need, conversion_factors(
+        *hub_tuples, r_in=m.r_in_dict, r_out=m.r_out_dict))
+    produced = set(co for (_, co) in hub_tuples[1] + process_tuples[1])
+    process_factors = conversion_factors(*process_tuples, r_in=m.r_in_dict,
+                                         r_out=m.r_out_dict)
+
+    vertices = list(m.vertex)
+    position = {v: k for k, v in enumerate(vertices)}
+    adjacency = {v: [] for v in vertices}
+    for k, (v1, v2) in enumerate(edges):
+        adjacency[v1].append((v2, k))
+        adjacency[v2].append((v1, k))
+    component, order, parent, owner, bridges = dfs_bridges(vertices,
+                                                           adjacency)
+    num_comps = component.max() + 1 if len(vertices) else 0
+    edge_comp = component[[position[v1] for (v1, _) in edges]]
+    length = np.array([m.edge_length_dict[e] for e in edges])
+    comp_length = np.bincount(edge_comp, weights=length, minlength=num_comps)
+
+    # process inputs are needed wherever the process is built
+    comp_total_need = {}
+    for co in commodities:
+        comp_total_need[co] = np.zeros((num_comps, len(times)))
+        np.add.at(comp_total_need[co], edge_comp, need[co])
+    comp_derived_need = derived_need(comp_total_need, process_factors)
+
+    bounds = {}
+    for co in m.co_transportable:
+        process_need = comp_derived_need[co] - comp_total_need[co]
+
+        # aggregate edge needs and source capacities by vertex and subtree
+        vertex_need = np.zeros((len(vertices), len(times)))
+        np.add.at(vertex_need, owner, need[co])
+        if co in produced:
+            supply = np.zeros(len(vertices))
+        else:
+            supply = np.array([m.vertex_dict[v][co] for v in vertices],
+                              dtype=float)
+        subtree_need = vertex_need.copy()
+        subtree_supply = supply.copy()
+        for v in order[::-1]:
+            if parent[v] >= 0:
+                subtree_need[parent[v]] += subtree_need[v]
+                subtree_supply[parent[v]] += subtree_supply[v]
+        comp_need = comp_total_need[co]
+        comp_supply = np.bincount(component, weights=supply,
+                                  minlength=num_comps)
+        if co in produced:
+            # processes or hubs may provide it anywhere
+            subtree_supply[:] = comp_supply[:] = np.inf
+
+        loss_var = np.nan_to_num(m.commodity_dict[co]['loss-var'])
+        loss_fix = np.nan_to_num(m.commodity_dict[co]['loss-fix'])
+        efficiency = 1 - loss_var * comp_length
+        fixed_losses = loss_fix * comp_length
+        cap_max = m.commodity_dict[co]['cap-max']
+
+        def bound(c, side_need, side_supply):
+            if efficiency[c] <= 0:
+                return min(cap_max, side_supply)
+            demand = (side_need + process_need[c]).max() + fixed_losses[c]
+            return min(cap_max, side_supply, demand / efficiency[c])
+
+        for k, (v1, v2) in enumerate(edges):
+            c = edge_comp[k]
+            if k in bridges:
+                # tree edge: parent p, child's subtree on the other side
+                child = bridges[k]
+                p = position[v1] if position[v2] == child else position[v2]
+                below_need = subtree_need[child]
+                above_need = comp_need[c] - below_need + need[co][k]
+                below_supply = subtree_supply[child]
+                above_supply = (comp_supply[c] - below_supply
+                                if co not in produced else np.inf)
+                down = bound(c, below_need, above_supply)
+                up = bound(c, above_need, below_supply)
+                if vertices[p] == v1:
+                    bounds[v1, v2, co], bounds[v2, v1, co] = down, up
+                else:
+                    bounds[v1, v2, co], bounds[v2, v1, co] = up, down
+            else:
+                bounds[v1, v2, co] = bounds[v2, v1, co] = bound(
+                    c, comp_need[c], comp_supply[c])
+    return bounds
+
+
+def finite_or_none(value):
+    """Return value, or None (no bound) if it is infinite or NaN."""
+    return value if math.isfinite(value) else None
+
+
+def conversion_factors(input_tuples, output_tuples, r_in, r_out):
+    """Find the input needed per unit of output for commodity pairs.
+
+    Args:
+        input_tuples: (process, commodity) tuples of process inputs
+        output_tuples: (process, commodity) tuples of process outputs
+        r_in, r_out: dicts of input/output ratios
+
+    Returns:
+        dict (input commodity, output commodity) -> the maximum of
+        r_in / r_out over all processes converting them
+    """
+    factors = {}
+    for (p, co_in) in input_tuples:
+        for (q, co_out) in output_tuples:
+            if p == q and r_in[p, co_in] > 0 and r_out[q, co_out] > 0:
+                factor = r_in[p, co_in] / r_out[q, co_out]
+                key = (co_in, co_out)
+                factors[key] = max(factors.get(key, 0), factor)
+    return factors
+
+
+def derived_need(need, factors):
+    """Add the inputs needed to convert into the needed commodities.
+
+    Args:
+        need: dict commodity -> array of the direct need
+        factors: dict (input, output) -> input per output, as returned by
+            ``conversion_factors``
+
+    Returns:
+        dict commodity -> array of direct plus derived need; infinite for
+        commodities in conversion cycles
+    """
+    total = dict(need)
+    for _ in range(len(need) + 1):
+        updated = dict(need)
+        for (co_in, co_out), factor in factors.items():
+            updated[co_in] = updated[co_in] + factor * total[co_out]
+        growing = [co for co in need
+                   if not np.array_equal(updated[co], total[co])]
+        total = updated
+        if not growing:
+            return total
+
+    # conversion cycle: no finite need for the commodities in it and for
+    # all inputs converted into them
+    unbounded = set(growing)
+    while True:
+        inputs = set(co_in for (co_in, co_out) in factors
+                     if co_out in unbounded) - unbounded
+        if not inputs:
+            break
+        unbounded |= inputs
+    for co in unbounded:
+        total[co] = np.full_like(total[co], np.inf)
+    return total
+
+
+def dfs_bridges(vertices, adjacency):
+    """Depth-first search for graph components and bridges.
+
+    Args:
+        vertices: list of vertices
+        adjacency: dict vertex -> list of (neighbour, edge id) tuples
+
+    Returns:
+        (component, order, parent, owner, bridges) tuple of
+        component number of each vertex position, vertex positions in
+        discovery order, position of the parent vertex in the search tree
+        (-1 for roots), the vertex position each edge id is assigned to
+        (its endpoint deeper in the search tree) and a dict of bridge edge
+        ids to the position of their child vertex.
+    """
+    position = {v: k for k, v in enumerate(vertices)}
+    num_edges = sum(len(nbs) for nbs in adjacency.values()) // 2
+    component = np.full(len(vertices), -1)
+    discovery = np.full(len(vertices), -1)
+    low = np.zeros(len(vertices), dtype=int)
+    parent = np.full(len(vertices), -1)
+    parent_edge = np.full(len(vertices), -1)
+    owner = np.zeros(num_edges, dtype=int)
+    order = []
+    for root in range(len(vertices)):
+        if discovery[root] >= 0:
+            continue
+        comp = component.max() + 1
+        stack = [(root, iter(adjacency[vertices[root]]))]
+        component[root] = comp
+        discovery[root] = low[root] = len(order)
+        order.append(root)
+        while stack:
+            v, neighbours = stack[-1]
+            for (w, k) in neighbours:
+                w = position[w]
+                if k == parent_edge[v]:
+                    continue
+                if discovery[w] < 0:
+                    component[w] = comp
+                    parent[w], parent_edge[w] = v, k
+                    discovery[w] = low[w] = len(order)
+                    order.append(w)
+                    owner[k] = w
+                    stack.append((w, iter(adjacency[vertices[w]])))
+                    break
+                elif discovery[w] < discovery[v]:
+                    # back edge to an ancestor
+                    owner[k] = v
+                    low[v] = min(low[v], discovery[w])
+            else:
+                stack.pop()
+                if parent[v] >= 0:
+                    low[parent[v]] = min(low[parent[v]], low[v])
+    bridges = {int(parent_edge[v]): v for v in order
+               if parent[v] >= 0 and low[v] > discovery[parent[v]]}
+    return component, np.array(order, dtype=int), parent, owner, bridges
+
+
 def line_length(line):
     """Calculate length of a line in meters, given in geographic coordinates.
 
@@ -680,11 +1283,101 @@ def line_length(line):
     Returns:
         Length of line in meters
     """
-    # Swap shapely (lonlat) to geopy (latlon) points
-    latlon = lambda lonlat: (lonlat[1], lonlat[0])
-    total_length = sum(distance(latlon(a), latlon(b)).meters
-                       for (a, b) in pairs(line.coords))
-    return round(total_length, 0)
+    return line_lengths([line])[0]
+
+
+def line_lengths(lines):
+    """Calculate lengths of many lines in meters at once.
+
+    All segments of all lines are measured together by ``geodesic_distance``,
+    so that no Python-level loop over the segments is needed.
+
+    Args:
+        lines: iterable of shapely LineString objects with WGS 84 coordinates
+
+    Returns:
+        numpy array of line lengths in meters, rounded to integer values
+    """
+    coords = [np.asarray(line.coords) for line in lines]
+    if not coords:
+        return np.zeros(0)
+
+    # index of the line each segment belongs to
+    num_segments = [len(c) - 1 for c in coords]
+    line_of_segment = np.repeat(np.arange(len(coords)), num_segments)
+
+    starts = np.concatenate([c[:-1] for c in coords])
+    ends = np.concatenate([c[1:] for c in coords])
+    segment_lengths = geodesic_distance(starts[:, 1], starts[:, 0],
+                                        ends[:, 1], ends[:, 0])
+
+    total_lengths = np.bincount(line_of_segment, weights=segment_lengths,
+                                minlength=len(coords))
+    return np.round(total_lengths, 0)
+
+
+def geodesic_distance(lat1, lon1, lat2, lon2, max_iter=200, tol=1e-12):
+    """Calculate distances in meters between points on the WGS 84 ellipsoid.
+
+    Vectorized implementation of Vincenty's inverse formula, which agrees
+    with geopy's ``distance`` well below a millimetre.
+
+    Args:
+        lat1, lon1: arrays of latitudes/longitudes (degrees) of start points
+        lat2, lon2: arrays of latitudes/longitudes (degrees) of end points
+        max_iter: maximum number of iterations for lambda
+        tol: convergence threshold for lambda
+
+    Returns:
+        numpy array of distances in meters
+    """
+    a = 6378137.0
+    f = 1 / 298.257223563
+    b = (1 - f) * a
+
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(x, dtype=float))
+                              for x in (lat1, lon1, lat2, lon2))
+    U1 = np.arctan((1 - f) * np.tan(lat1))
+    U2 = np.arctan((1 - f) * np.tan(lat2))
+    L = lon2 - lon1
+    sinU1, cosU1 = np.sin(U1), np.cos(U1)
+    sinU2, cosU2 = np.sin(U2), np.cos(U2)
+
+    lambda_ = L.copy()
+    for _ in range(max_iter):
+        sin_lambda, cos_lambda = np.sin(lambda_), np.cos(lambda_)
+        sin_sigma = np.hypot(cosU2 * sin_lambda,
+                             cosU1 * sinU2 - sinU1 * cosU2 * cos_lambda)
+        cos_sigma = sinU1 * sinU2 + cosU1 * cosU2 * cos_lambda
+        sigma = np.arctan2(sin_sigma, cos_sigma)
+
+        # coincident points have sin_sigma == 0; avoid division by zero
+        safe_sin_sigma = np.where(sin_sigma == 0, 1, sin_sigma)
+        sin_alpha = cosU1 * cosU2 * sin_lambda / safe_sin_sigma
+        cos_sq_alpha = 1 - sin_alpha ** 2
+        # equatorial lines have cos_sq_alpha == 0
+        safe_cos_sq_alpha = np.where(cos_sq_alpha == 0, 1, cos_sq_alpha)
+        cos_2sigma_m = np.where(
+            cos_sq_alpha == 0, 0,
+            cos_sigma - 2 * sinU1 * sinU2 / safe_cos_sq_alpha)
+
+        C = f / 16 * cos_sq_alpha * (4 + f * (4 - 3 * cos_sq_alpha))
+        lambda_prev = lambda_
+        lambda_ = L + (1 - C) * f * sin_alpha * (
+            sigma + C * sin_sigma * (
+                cos_2sigma_m + C * cos_sigma * (-1 + 2 * cos_2sigma_m ** 2)))
+        if np.all(np.abs(lambda_ - lambda_prev) < tol):
+            break
+
+    u_sq = cos_sq_alpha * (a ** 2 - b ** 2) / b ** 2
+    A = 1 + u_sq / 16384 * (4096 + u_sq * (-768 + u_sq * (320 - 175 * u_sq)))
+    B = u_sq / 1024 * (256 + u_sq * (-128 + u_sq * (74 - 47 * u_sq)))
+    delta_sigma = B * sin_sigma * (
+        cos_2sigma_m + B / 4 * (
+            cos_sigma * (-1 + 2 * cos_2sigma_m ** 2) -
+            B / 6 * cos_2sigma_m * (-3 + 4 * sin_sigma ** 2) *
+            (-3 + 4 * cos_2sigma_m ** 2)))
+    return b * A * (sigma - delta_sigma)
 
 
 def pairs(lst):
@@ -719,21 +1412,36 @@ def pairs(lst):
 
 # Technical helper functions for data retrieval
 
-def get_entity(instance, name):
+def get_entity(instance, name, index_cache=None):
     """Return a DataFrame for an entity in model instance.
 
+    Values of indexed variables are read into a numpy array in index order.
+    Their index is built from the index sets' elements without creating the
+    index tuples, once per combination of index sets if `index_cache` is
+    given.
+
     Args:
-        instance: a Pyomo ConcreteModel instance
+        instance: a Pyomo ConcreteModel instance, or a result loaded by
+            ``rivus.io.archive.load_result`` (variables only)
         name: name of a Set, Param, Var, Constraint or Objective
+        index_cache: optional dict, shared by calls for variables of the
+            same domain (e.g. Pin, Pot, Psi) to reuse their index
 
     Returns:
         a single-columned Pandas DataFrame with domain as index
     """
+    if not isinstance(instance, pyomo.Block):
+        return instance.entity(name)
 
     # retrieve entity, its type and its onset names
     entity = instance.__getattribute__(name)
     labels = get_onset_names(entity)
 
+    if isinstance(entity, pyomo.Var) and entity.is_indexed():
+        values = var_values(entity)
+        index = entity_index(entity, unique_labels(labels), index_cache)
+        return pd.Series(values, index=index, name=name)
+
     # extract values
     if isinstance(entity, pyomo.Set):
         # Pyomo sets don't have values, only elements
@@ -749,26 +1457,22 @@ def get_entity(instance, name):
 
     elif isinstance(entity, pyomo.Param):
         if entity.dim() > 1:
-            results = pd.DataFrame([v[0]+(v[1],) for v in entity.iteritems()])
+            results = pd.DataFrame([v[0]+(v[1],) for v in entity.items()])
         else:
-            results = pd.DataFrame(entity.iteritems())
+            results = pd.DataFrame(list(entity.items()))
     else:
         # create DataFrame
         if entity.dim() > 1:
             # concatenate index tuples with value if entity has
             # multidimensional indices v[0]
             results = pd.DataFrame(
-                [v[0]+(v[1].value,) for v in entity.iteritems()])
+                [v[0]+(v[1].value,) for v in entity.items()])
         else:
             # otherwise, create tuple from scalar index v[0]
             results = pd.DataFrame(
-                [(v[0], v[1].value) for v in entity.iteritems()])
+                [(v[0], v[1].value) for v in entity.items()])
 
-    # check for duplicate onset names and append one to several "_" to make
-    # them unique, e.g. ['sit', 'sit', 'com'] becomes ['sit', 'sit_', 'com']
-    for k, label in enumerate(labels):
-        if label in labels[:k]:
-            labels[k] = labels[k] + "_"
+    labels = unique_labels(labels)
 
     # name columns according to labels + entity name
     results.columns = labels + [name]
@@ -777,6 +1481,105 @@ def get_entity(instance, name):
     return results
 
 
+def var_values(entity):
+    """Return the values of an indexed Var as float array, in index order.
+
+    Unset values become NaN.
+    """
+    data = getattr(entity, '_data', None)
+    if data is not None and len(data) == len(entity.index_set()):
+        # dense variables are stored in index order, which is faster to
+        # read directly than through the component's iterators
+        datas = data.values()
+    else:
+        datas = entity.values()
+    return np.array([v.value for v in datas], dtype=float)
+
+
+def unique_labels(labels):
+    """Append "_" to duplicate onset names.
+
+    Example:
+        >>> unique_labels(['sit', 'sit', 'com'])
+        ['sit', 'sit_', 'com']
+    """
+    labels = list(labels)
+    for k, label in enumerate(labels):
+        if label in labels[:k]:
+            labels[k] = labels[k] + "_"
+    return labels
+
+
+def entity_index(entity, labels, index_cache=None):
+    """Return the (Multi)Index of an indexed component, in index order.
+
+    If the component is defined for all elements of the product of its
+    index sets, the index levels are repeated and tiled from the sets'
+    elements. Otherwise the index is built from the component's keys.
+
+    Args:
+        entity: indexed Pyomo component, e.g. a Var
+        labels: index level names
+        index_cache: optional dict, (index sets) -> index, shared across
+            calls for components of the same domain
+
+    Returns:
+        a Pandas Index or MultiIndex
+    """
+    factors = set_factors(entity.index_set()) or [entity.index_set()]
+    key = tuple(id(s) for s in factors)
+    if index_cache is not None and key in index_cache:
+        index = index_cache[key][1]
+        if len(index) == len(entity):
+            return index
+
+    dims = [list(s) for s in factors]
+    if int(np.prod([len(dim) for dim in dims])) == len(entity):
+        index = product_index(dims, labels, [s.dimen for s in factors])
+    elif len(labels) > 1:
+        index = pd.MultiIndex.from_tuples(list(entity.keys()), names=labels)
+    else:
+        index = pd.Index(list(entity.keys()), name=labels[0])
+    if index_cache is not None:
+        # keep the index sets, so that their ids stay unique
+        index_cache[key] = (factors, index)
+    return index
+
+
+def product_index(dims, names, widths):
+    """Return the MultiIndex of the cartesian product of index sets.
+
+    Elements of a set of width > 1 are tuples (e.g. edges), which span as
+    many levels. Levels are repeated and tiled as numpy arrays, without
+    building the product's tuples.
+
+    Args:
+        dims: list of index sets, each a list of elements
+        names: index level names
+        widths: number of levels of each index set
+
+    Returns:
+        a Pandas Index (single level) or MultiIndex
+    """
+    sizes = [len(dim) for dim in dims]
+    arrays = []
+    for k, dim in enumerate(dims):
+        inner = int(np.prod(sizes[k + 1:]))
+        outer = int(np.prod(sizes[:k]))
+        if widths[k] == 1:
+            levels = [dim]
+        else:
+            levels = [[element[n] for element in dim]
+                      for n in range(widths[k])]
+        for level in levels:
+            values = np.empty(len(level), dtype=object)
+            values[:] = level
+            arrays.append(np.tile(np.repeat(values, inner), outer))
+    if len(arrays) == 1:
+        return pd.Index(arrays[0], name=names[0])
+    return pd.MultiIndex.from_arrays(arrays, names=names)
+
+
 def get_entities(instance, names):
     """Return one DataFrame with entities in columns and a common index.
 
@@ -791,9 +1594,16 @@ def get_entities(instance, names):
         a Pandas DataFrame with entities as columns and domains as index
     """
 
+    index_cache = {}
+    return _join_entities(
+        lambda name: get_entity(instance, name, index_cache), names)
+
+
+def _join_entities(entity, names):
+    """Outer join the Series returned by `entity` for all `names`."""
     df = pd.DataFrame()
     for name in names:
-        other = get_entity(instance, name)
+        other = entity(name)
 
         if isinstance(other, pd.Series):
             other = other.to_frame()
@@ -849,7 +1659,7 @@ def list_entities(instance, entity_type):
             raise ValueError("Unknown entity_type '{}'".format(entity_type))
 
     # iterate through all model components and keep only
-    iter_entities = instance.__dict__.iteritems()
+    iter_entities = instance.__dict__.items()
     entities = sorted(
         (name, entity.doc, get_onset_names(entity))
         for (name, entity) in iter_entities
@@ -879,18 +1689,19 @@ def get_onset_names(entity):
     labels = []
 
     if isinstance(entity, pyomo.Set):
-        if entity.dimen > 1:
+        factors = set_factors(entity)
+        if factors:
             # N-dimensional set tuples, possibly with nested set tuples within
-            if entity.domain:
-                domains = entity.domain.set_tuple
-            else:
-                domains = entity.set_tuple
-
-            for domain_set in domains:
+            for domain_set in factors:
                 labels.extend(get_onset_names(domain_set))
 
+        elif entity.dimen > 1:
+            # N-dimensional subset of a set tuple
+            labels.extend(get_onset_names(entity.domain))
+
         elif entity.dimen == 1:
-            if entity.domain:
+            if entity.domain is not None and \
+                    entity.domain is not getattr(pyomo, 'Any', None):
                 # 1D subset; add domain name
                 labels.append(entity.domain.name)
             else:
@@ -902,8 +1713,8 @@ def get_onset_names(entity):
 
     elif isinstance(entity, (pyomo.Param, pyomo.Var, pyomo.Constraint,
                     pyomo.Objective)):
-        if entity.dim() > 0 and entity._index:
-            labels = get_onset_names(entity._index)
+        if entity.is_indexed():
+            labels = get_onset_names(entity.index_set())
         else:
             # zero dimensions, so no onset labels
             pass
@@ -914,11 +1725,42 @@ def get_onset_names(entity):
     return labels
 
 
+def set_factors(entity):
+    """Return the factor sets of a set product, or [] for other sets."""
+    if SetProduct is not None:
+        if isinstance(entity, SetProduct):
+            return list(entity.subsets(expand_all_set_operators=False))
+        return []
+    return list(getattr(entity, 'set_tuple', None) or [])
+
+
+def update_costs(prob):
+    """Set the cost variables to the value of their definitions.
+
+    Useful after values were assigned to the other variables outside of a
+    solver, e.g. by a heuristic. Each ``def_costs`` constraint is linear in
+    its cost variable, so that is solved for.
+
+    Args:
+        prob: a rivus model instance with values for all other variables
+
+    Returns:
+        Nothing
+    """
+    for ct, con in prob.def_costs.items():
+        prob.costs[ct].value = 0
+        body_0 = pyomo.value(con.body)
+        prob.costs[ct].value = 1
+        slope = pyomo.value(con.body) - body_0
+        prob.costs[ct].value = (pyomo.value(con.lower) - body_0) / slope
+
+
 def get_constants(prob):
     """Retrieve time-independent variables/quantities.
 
     Args:
-        prob: a rivus model instance
+        prob: a rivus model instance, or a result loaded by
+            ``rivus.io.archive.load_result``
 
     Returns:
         (costs, pmax, kappa_hub, kappa_process) tuple
@@ -926,10 +1768,23 @@ def get_constants(prob):
     Example:
         costs, pmax, kappa_hub, kappa_process = get_constants(prob)
     """
-    costs = get_entity(prob, 'costs')
-    Pmax = get_entity(prob, 'Pmax')
-    Kappa_hub = get_entity(prob, 'Kappa_hub')
-    Kappa_process = get_entity(prob, 'Kappa_process')
+    return collect_constants(entity_accessor(prob))
+
+
+def collect_constants(entity):
+    """Retrieve time-independent quantities through an entity accessor.
+
+    Args:
+        entity: function returning the values of a variable by name, as a
+            Series indexed like the result of ``get_entity``
+
+    Returns:
+        (costs, pmax, kappa_hub, kappa_process) tuple, see ``get_constants``
+    """
+    costs = entity('costs')
+    Pmax = entity('Pmax')
+    Kappa_hub = entity('Kappa_hub')
+    Kappa_process = entity('Kappa_process')
 
     # nicer index names
     Pmax.index.names = ['Vertex1', 'Vertex2', 'commodity']
@@ -969,17 +1824,52 @@ def get_timeseries(prob):
         source, flows, hubs, proc_io, proc_tau = get_timeseries(prob)
 
     Args:
-        prob: a rivus model instance
+        prob: a rivus model instance, or a result loaded by
+            ``rivus.io.archive.load_result``
 
     Returns:
         (source, flows, hubs, proc_io, proc_tau) tuple
     """
+    return collect_timeseries(entity_accessor(prob),
+                              getattr(prob, 'flow_formulation', 'timestep'))
+
+
+def entity_accessor(prob):
+    """Return a function retrieving the values of a variable by name.
+
+    Args:
+        prob: a rivus model instance, or a result loaded by
+            ``rivus.io.archive.load_result``
+
+    Returns:
+        function of a variable name, returning a Series like ``get_entity``
+    """
+    if not isinstance(prob, pyomo.Block):
+        return prob.entity
+    index_cache = {}
+    return lambda name: get_entity(prob, name, index_cache)
+
 
-    source = get_entity(prob, 'Rho')
-    flows = get_entities(prob, ['Pin', 'Pot', 'Psi', 'Sigma'])
-    hubs = get_entity(prob, 'Epsilon_hub')
-    proc_io = get_entities(prob, ['Epsilon_in', 'Epsilon_out'])
-    proc_tau = get_entity(prob, 'Tau')
+def collect_timeseries(entity, flow_formulation='timestep'):
+    """Retrieve time-dependent quantities through an entity accessor.
+
+    Args:
+        entity: function returning the values of a variable by name, as a
+            Series indexed like the result of ``get_entity``
+        flow_formulation: 'timestep' or 'aggregated', see ``create_model``
+
+    Returns:
+        (source, flows, hubs, proc_io, proc_tau) tuple, see
+        ``get_timeseries``
+    """
+    source = entity('Rho')
+    if flow_formulation == 'timestep':
+        flows = _join_entities(entity, ['Pin', 'Pot', 'Psi', 'Sigma'])
+    else:
+        flows = _join_entities(entity, ['Pin', 'Pot', 'Sigma'])
+    hubs = entity('Epsilon_hub')
+    proc_io = _join_entities(entity, ['Epsilon_in', 'Epsilon_out'])
+    proc_tau = entity('Tau')
 
     # fill NaN's
     flows.fillna(0, inplace=True)
@@ -1018,7 +1908,8 @@ def plot(prob, commodity, plot_demand=False, mapscale=False, tick_labels=True,
     Parameters
     ----------
     prob
-        rivus ConcreteModel
+        rivus ConcreteModel, or a result loaded by
+        ``rivus.io.archive.load_result``
     commodity
         str like `Elec`, `Heat` etc.
     plot_demand
@@ -1169,8 +2060,11 @@ def plot(prob, commodity, plot_demand=False, mapscale=False, tick_labels=True,
                         **annotate_defaults)
 
         # Kappa_process: Process capacities consuming/producing a commodity
-        r_in = prob.r_in.xs(commodity, level='Commodity')
-        r_out = prob.r_out.xs(commodity, level='Commodity')
+        r_in, r_out = [
+            ratios.xs(commodity, level='Commodity')
+            if commodity in ratios.index.get_level_values('Commodity')
+            else pd.Series(dtype=float)
+            for ratios in (prob.r_in, prob.r_out)]
 
         # sources: Commodity source terms
         try:
@@ -1353,58 +2247,117 @@ def plot(prob, commodity, plot_demand=False, mapscale=False, tick_labels=True,
 
     return fig
 
-def result_figures(prob, file_basename, buildings=None, shapefiles=None):
+def result_figures(prob, file_basename, buildings=None, shapefiles=None,
+                   processes=1, figures=None):
     """Call rivus.plot with hard-coded combinations of plot_type and commodity.
 
-    This is a convenience wrapper to shorten scripts.
+    This is a convenience wrapper to shorten scripts. The figures are
+    independent, so they can be drawn in a pool of processes with the
+    non-interactive Agg backend. The variable values are then retrieved once
+    (see ``rivus.io.archive.to_result``) and sent to each worker once,
+    instead of the model.
+
+    A pool re-imports the calling script in each worker under the spawn
+    start method (default on Windows and macOS), so a script that passes
+    processes other than 1 must call result_figures from within an
+    ``if __name__ == '__main__':`` block.
     TODO: Generalise so that no hard-coding of commodity names is needed.
 
     Args:
-        prob: a rivus model instance
+        prob: a rivus model instance, or a result loaded by
+            ``rivus.io.archive.load_result``
         file_basename: filename prefix for figures
         buildings: optional filename to buildings shapefile
         shapefiles: list of dicts of shapefiles that shall be drawn by
                     basemap function readshapefile. is passed as `**kwargs`
+        processes: size of the process pool. By default (1), figures are
+            drawn in order in the calling process. With None, one process
+            per figure, at most one per CPU.
+        figures: optional list of (commodity, plot_type, plot_annotations)
+            tuples, RESULT_FIGURES by default
     Returns:
         Nothing
     """
-    for com, plot_type in [('Elec', 'caps'), ('Heat', 'caps'), ('Gas', 'caps'),
-                           ('Elec', 'peak'), ('Heat', 'peak')]:
+    if figures is None:
+        figures = RESULT_FIGURES
+    if processes is None:
+        processes = min(cpu_count(), len(figures))
+    if processes == 1:
+        for figure in figures:
+            save_result_figure(prob, file_basename, figure,
+                               buildings=buildings, shapefiles=shapefiles)
+        return
+
+    from ..io.archive import to_result
+    with Pool(processes, initializer=_init_figure_worker,
+              initargs=(to_result(prob), buildings, shapefiles)) as pool:
+        pool.map(_save_worker_figure,
+                 [(file_basename, figure) for figure in figures],
+                 chunksize=1)
+
+
+def save_result_figure(prob, file_basename, figure, buildings=None,
+                       shapefiles=None):
+    """Draw one of the RESULT_FIGURES and save it in all formats.
+
+    Args:
+        prob: a rivus model instance or result, see ``result_figures``
+        file_basename: filename prefix for figures
+        figure: (commodity, plot_type, plot_annotations) tuple
+        buildings, shapefiles: see ``result_figures``
+
+    Returns:
+        Nothing
+    """
+    com, plot_type, plot_annotations = figure
+
+    # create plot
+    fig = plot(prob, com, mapscale=False, tick_labels=False,
+               plot_demand=(plot_type == 'peak'),
+               buildings=buildings,
+               shapefiles=shapefiles,
+               annotations=plot_annotations)
+    plt.title('')
+
+    # save to file
+    for ext, transp in [('png', True), ('png', False), ('pdf', True)]:
+        # split scenario name from subdirectory
+        base_dir, sce = os.path.split(file_basename)
+
+        # create subdirectory according to plot variant
+        sub_dir = 'annotated' if plot_annotations else 'plain'
+        sub_dir += '-transparent' if transp and ext != 'pdf' else ''
+
+        # create subdirectory if does not exist yet
+        fig_dir = os.path.join(base_dir, sub_dir)
+        os.makedirs(fig_dir, exist_ok=True)  # workers may race here
+
+        # create complete relative figure filename
+        fig_basename = '{}-{}-{}.{}'.format(sce, plot_type, com, ext)
+        fig_filename = os.path.join(fig_dir, fig_basename)
 
-        # two plot variants
-        for plot_annotations in [False, True]:
-            # create plot
-            fig = plot(prob, com, mapscale=False, tick_labels=False,
-                       plot_demand=(plot_type == 'peak'),
-                       buildings=buildings,
-                       shapefiles=shapefiles,
-                       annotations=plot_annotations)
-            plt.title('')
+        # save the figure
+        fig.savefig(fig_filename, dpi=300, bbox_inches='tight',
+                    transparent=transp)
+    # free memory
+    plt.close(fig)
 
-            # save to file
-            for ext, transp in [('png', True), ('png', False), ('pdf', True)]:
-                # split scenario name from subdirectory
-                base_dir, sce = os.path.split(file_basename)
 
-                # create subdirectory according to plot variant
-                sub_dir = 'annotated' if plot_annotations else 'plain'
-                sub_dir += '-transparent' if transp and ext != 'pdf' else ''
+# state of a result_figures worker process, set once by _init_figure_worker
+_figure_worker = {}
 
-                # create subdirectory if does not exist yet
-                fig_dir = os.path.join(base_dir, sub_dir)
-                if not os.path.exists(fig_dir):
-                    os.makedirs(fig_dir)
 
-                # create complete relative figure filename
-                fig_basename = '{}-{}-{}.{}'.format(sce, plot_type, com, ext)
-                fig_filename = os.path.join(fig_dir, fig_basename)
+def _init_figure_worker(prob, buildings, shapefiles):
+    plt.switch_backend('Agg')
+    _figure_worker.update(prob=prob, buildings=buildings,
+                          shapefiles=shapefiles)
 
-                # save the figure
-                fig.savefig(fig_filename, dpi=300, bbox_inches='tight',
-                            transparent=transp)
-            # free memory
-            plt.close(fig)
 
+def _save_worker_figure(task):
+    file_basename, figure = task
+    save_result_figure(_figure_worker['prob'], file_basename, figure,
+                       buildings=_figure_worker['buildings'],
+                       shapefiles=_figure_worker['shapefiles'])
 
 
 def report(prob, filename):
@@ -1415,7 +2368,8 @@ def report(prob, filename):
     and process input/output/throughput per time step.
 
     Args:
-        prob: a rivus model instance
+        prob: a rivus model instance, or a result loaded by
+            ``rivus.io.archive.load_result``
         filename: Excel spreadsheet filename, will be overwritten if exists
 
     Returns:
@@ -0,0 +1,562 @@
+"""Build the rivus problem directly as sparse matrices, without pyomo.
+
+``create_model`` creates one pyomo expression per constraint index, which
+dominates build time and memory of large problems. The formulation is
+linear, so its coefficients can also be assembled at once: every variable
+gets a block of columns (a numpy array of positions, shaped like its index
+sets), every constraint a block of rows, and the terms of a constraint
+family are broadcast over these arrays. The result is the problem
+
+    min c x  s.t.  row_lb <= A x <= row_ub,  lb <= x <= ub,
+    x integer where integrality == 1
+
+with the same variables and constraints as the pyomo model. It is solved
+with ``scipy.optimize.milp`` (HiGHS) or written as MPS file for any other
+solver. ``get_constants`` and ``get_timeseries`` return the same frames as
+their counterparts in ``rivus.main.rivus``.
+
+Example
+-------
+::
+
+    problem = build_matrices(data, vertex, edge)
+    result = solve_matrices(problem, time_limit=600)
+    costs, pmax, kappa_hub, kappa_process = get_constants(problem, result.x)
+    source, flows, hubs, proc_io, proc_tau = get_timeseries(problem, result.x)
+"""
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+try:
+    from scipy.optimize import milp, Bounds, LinearConstraint
+except ImportError:  # scipy < 1.9
+    milp = None
+
+from .rivus import (prepare_inputs, arc_flow_bounds, product_index,
+                    collect_constants, collect_timeseries)
+
+# variable name -> names of its index levels, as returned by get_entity
+INDEX_NAMES = {
+    'Sigma': ['vertex', 'vertex_', 'commodity', 'time'],
+    'Pin': ['vertex', 'vertex_', 'commodity', 'time'],
+    'Pot': ['vertex', 'vertex_', 'commodity', 'time'],
+    'Psi': ['vertex', 'vertex_', 'commodity', 'time'],
+    'Delta': ['vertex', 'vertex_', 'co_transportable'],
+    'Pmax': ['vertex', 'vertex_', 'commodity'],
+    'Xi': ['vertex', 'vertex_', 'commodity'],
+    'Rho': ['vertex', 'commodity', 'time'],
+    'Kappa_hub': ['vertex', 'vertex_', 'hub'],
+    'Epsilon_hub': ['vertex', 'vertex_', 'hub', 'time'],
+    'Kappa_process': ['vertex', 'process'],
+    'Phi': ['vertex', 'process'],
+    'Tau': ['vertex', 'process', 'time'],
+    'Epsilon_in': ['vertex', 'process', 'commodity', 'time'],
+    'Epsilon_out': ['vertex', 'process', 'commodity', 'time'],
+    'costs': ['cost_type']}
+
+# index sets of tuples, spanning two index levels
+TUPLE_SETS = ('edge', 'arc', 'process_input_tuples', 'process_output_tuples')
+
+
+def build_matrices(data, vertex, edge, peak_multiplier=None,
+                   hub_only_in_edge=True, tighten_bounds=True, mode='mip',
+                   flow_formulation='timestep'):
+    """Return the rivus problem of the input as sparse matrices.
+
+    Parameters
+    ----------
+    data, vertex, edge, peak_multiplier, hub_only_in_edge, tighten_bounds,
+    mode, flow_formulation
+        As for ``create_model``. Parameters are fixed numbers here, so there
+        is no `mutable_params`.
+
+    Returns
+    -------
+    dict
+        + c, A, row_lb, row_ub, lb, ub, integrality: objective (ndarray),
+          constraint matrix (scipy.sparse.csr_matrix), row and column bounds
+          (ndarray, +-inf if unbounded) and integrality (1 for binaries,
+          0 else) of the problem
+        + columns: {variable: ndarray of column positions}, shaped like the
+          variable's index sets
+        + rows: {constraint: ndarray of row positions}
+        + sets: {set name: list of elements} of the index sets
+        + flow_formulation: as given
+
+    Raises
+    ------
+    ValueError
+        For an unknown mode or flow_formulation.
+    """
+    if mode not in ('mip', 'relaxed'):
+        raise ValueError("Unknown mode '{}', use 'mip' or 'relaxed'"
+                         .format(mode))
+    if flow_formulation not in ('timestep', 'aggregated'):
+        raise ValueError("Unknown flow_formulation '{}', use 'timestep' or "
+                         "'aggregated'".format(flow_formulation))
+
+    m = SimpleNamespace(params=data, flow_formulation=flow_formulation)
+    init = prepare_inputs(m, data, vertex, edge, peak_multiplier,
+                          hub_only_in_edge)
+    commodity = list(init['commodity'])
+    sets = {
+        'commodity': commodity,
+        'co_demand': [co for co in commodity if co in init['co_demand']],
+        'co_source': list(init['co_source']),
+        'co_transportable': list(init['co_transportable']),
+        'co_directed': list(init['co_directed']),
+        'co_allowed_max': list(init['co_allowed_max']),
+        'process': list(init['process']),
+        'process_input_tuples': [tuple(pc) for pc in
+                                 init['process_input_tuples']],
+        'process_output_tuples': [tuple(pc) for pc in
+                                  init['process_output_tuples']],
+        'hub': list(init['hub']),
+        'time': list(init['time']),
+        'vertex': list(init['vertex']),
+        'edge': list(init['edge']),
+        'arc': init['arc'],
+        'cost_type': ['Inv', 'Fix', 'Var']}
+    for name, elements in sets.items():
+        setattr(m, name, elements)
+
+    # big-M of flows and capacities, as in create_model
+    if tighten_bounds:
+        arc_bound = arc_flow_bounds(m)
+    else:
+        arc_bound = {(i, j, co): m.commodity_dict[co]['cap-max']
+                     for (i, j) in m.arc for co in m.co_transportable}
+    s = sets
+    E, V, T = len(s['edge']), len(s['vertex']), len(s['time'])
+    C, Ct = len(s['commodity']), len(s['co_transportable'])
+    H, P = len(s['hub']), len(s['process'])
+    # flow bound per arc and transportable commodity, arcs of edge k at
+    # positions 2k (v1, v2) and 2k + 1 (v2, v1)
+    flow_bound = np.array(
+        [[arc_bound[i, j, co] for co in s['co_transportable']]
+         for (i, j) in s['arc']], dtype=float).reshape(2 * E, Ct)
+    capacity_bound = np.maximum(flow_bound[0::2], flow_bound[1::2])
+
+    # columns
+    lp = {'columns': {}, 'lb': [], 'ub': [], 'integrality': [], 'size': 0}
+    binary = 1 if mode == 'mip' else 0
+
+    def variable(name, shape, ub=np.inf, integrality=0):
+        size = int(np.prod(shape))
+        lp['columns'][name] = lp['size'] + np.arange(size).reshape(shape)
+        lp['lb'].append(np.zeros(size))
+        lp['ub'].append(np.broadcast_to(np.asarray(ub, dtype=float),
+                                        shape).ravel())
+        lp['integrality'].append(np.full(size, integrality))
+        lp['size'] += size
+        return lp['columns'][name]
+
+    flow_ub = (flow_bound[:, :, np.newaxis] if tighten_bounds else np.inf)
+    capacity_ub = capacity_bound if tighten_bounds else np.inf
+    Sigma = variable('Sigma', (E, C, T))
+    Pin = variable('Pin', (2 * E, Ct, T), flow_ub)
+    Pot = variable('Pot', (2 * E, Ct, T), flow_ub)
+    if flow_formulation == 'timestep':
+        Psi = variable('Psi', (2 * E, Ct, T), 1, binary)
+    else:
+        Delta = variable('Delta', (E, len(s['co_directed'])), 1, binary)
+    Pmax = variable('Pmax', (E, Ct), capacity_ub)
+    Xi = variable('Xi', (E, Ct), 1, binary)
+    Rho = variable('Rho', (V, len(s['co_source']), T))
+    Kappa_hub = variable('Kappa_hub', (E, H))
+    Epsilon_hub = variable('Epsilon_hub', (E, H, T))
+    Kappa_process = variable('Kappa_process', (V, P))
+    Phi = variable('Phi', (V, P), 1, binary)
+    Tau = variable('Tau', (V, P, T))
+    Epsilon_in = variable(
+        'Epsilon_in', (V, len(s['process_input_tuples']), T))
+    Epsilon_out = variable(
+        'Epsilon_out', (V, len(s['process_output_tuples']), T))
+    costs = variable('costs', (3,))
+
+    # rows
+    rows = {'rows': {}, 'lb': [], 'ub': [], 'row': [], 'col': [], 'val': [],
+            'size': 0}
+
+    def constraint(name, shape, lb=-np.inf, ub=np.inf):
+        size = int(np.prod(shape))
+        rows['rows'][name] = rows['size'] + np.arange(size).reshape(shape)
+        rows['lb'].append(np.broadcast_to(np.asarray(lb, dtype=float),
+                                          shape).ravel())
+        rows['ub'].append(np.broadcast_to(np.asarray(ub, dtype=float),
+                                          shape).ravel())
+        rows['size'] += size
+        return rows['rows'][name]
+
+    def term(row, col, val=1.):
+        row, col, val = np.broadcast_arrays(row, col, np.asarray(val, float))
+        rows['row'].append(row.ravel())
+        rows['col'].append(col.ravel())
+        rows['val'].append(val.ravel())
+
+    # parameter arrays
+    pos = {name: {x: k for k, x in enumerate(elements)}
+           for name, elements in s.items() if name != 'arc'}
+    ct_pos = [pos['commodity'][co] for co in s['co_transportable']]
+    length = np.array([m.edge_length_dict[e] for e in s['edge']])
+    weight = np.array([m.time_dict[t]['weight'] for t in s['time']],
+                      dtype=float)
+
+    def commodity_attribute(attribute, commodities):
+        return np.array([m.commodity_dict[co][attribute]
+                         for co in commodities], dtype=float)
+
+    def process_attribute(table, attribute, processes):
+        return np.array([table[p][attribute] for p in processes],
+                        dtype=float)
+
+    # edges/arcs
+    co_demand = [pos['commodity'][co] for co in s['co_demand']]
+    peak = np.array([[m.peak_dict[co][e] for co in s['co_demand']]
+                     for e in s['edge']], dtype=float).reshape(
+                         E, len(co_demand))
+    scaling = np.array([[m.time_dict[t][co] for t in s['time']]
+                        for co in s['co_demand']], dtype=float).reshape(
+                            len(co_demand), T)
+    row = constraint('peak_satisfaction', (E, len(co_demand), T),
+                     lb=peak[:, :, np.newaxis] * scaling[np.newaxis])
+    term(row, Sigma[:, co_demand])
+    for k, co in enumerate(s['co_demand']):
+        _add_hub_balance(m, pos, term, row[:, k], Epsilon_hub, co)
+
+    row = constraint('edge_equation', (E, C, T), ub=0)
+    term(row, Sigma)
+    loss_var = commodity_attribute('loss-var', s['co_transportable'])
+    loss_fix = commodity_attribute('loss-fix', s['co_transportable'])
+    row_t = row[:, ct_pos]
+    efficiency = 1 - length[:, np.newaxis, np.newaxis] * \
+        loss_var[np.newaxis, :, np.newaxis]
+    fixed_losses = length[:, np.newaxis, np.newaxis] * \
+        loss_fix[np.newaxis, :, np.newaxis]
+    for direction in (0, 1):
+        term(row_t, Pin[direction::2], -efficiency)
+        term(row_t, Pot[direction::2])
+        if flow_formulation == 'timestep':
+            term(row_t, Psi[direction::2], fixed_losses)
+    if flow_formulation == 'aggregated':
+        term(row_t, Xi[:, :, np.newaxis], fixed_losses)
+
+    edge_of_arc = np.repeat(np.arange(E), 2)
+    row = constraint('arc_flow_by_capacity', (2 * E, Ct, T), ub=0)
+    term(row, Pin)
+    term(row, Pmax[edge_of_arc][:, :, np.newaxis], -1)
+    if flow_formulation == 'timestep':
+        row = constraint('arc_flow_unidirectionality', (2 * E, Ct, T), ub=0)
+        term(row, Pin)
+        term(row, Psi, -flow_bound[:, :, np.newaxis])
+        partner = np.arange(2 * E) ^ 1
+        row = constraint('arc_unidirectionality', (2 * E, Ct, T), ub=1)
+        term(row, Psi)
+        term(row, Psi[partner])
+    else:
+        cd = [s['co_transportable'].index(co) for co in s['co_directed']]
+        forward = np.arange(2 * E) % 2 == 0
+        big_m = flow_bound[:, cd]
+        # reverse arcs: Pin <= M (1 - Delta)  <=>  Pin + M Delta <= M
+        row = constraint('arc_flow_direction', (2 * E, len(cd), T),
+                         ub=np.where(forward[:, np.newaxis], 0, big_m)
+                         [:, :, np.newaxis])
+        term(row, Pin[:, cd])
+        term(row, Delta[edge_of_arc][:, :, np.newaxis],
+             np.where(forward[:, np.newaxis], -big_m, big_m)
+             [:, :, np.newaxis])
+    row = constraint('edge_capacity', (E, Ct), ub=0)
+    term(row, Pmax)
+    term(row, Xi, -capacity_bound)
+
+    # hubs
+    row = constraint('hub_supply', (E, C, T), ub=0)
+    term(row, Sigma, -1)
+    for co in s['commodity']:
+        _add_hub_balance(m, pos, term, row[:, pos['commodity'][co]],
+                         Epsilon_hub, co, sign=-1)
+    row = constraint('hub_output_by_capacity', (E, H, T), ub=0)
+    term(row, Epsilon_hub)
+    term(row, Kappa_hub[:, :, np.newaxis], -1)
+    row = constraint('hub_capacity', (E, H), ub=process_attribute(
+        m.hub_dict, 'cap-max', s['hub'])[np.newaxis])
+    term(row, Kappa_hub)
+
+    # vertex
+    row = constraint('vertex_equation', (V, C, T), lb=0)
+    cs = [pos['commodity'][co] for co in s['co_source']]
+    term(row[:, cs], Rho)
+    tail = np.array([pos['vertex'][i] for (i, _) in s['arc']], dtype=int)
+    head = np.array([pos['vertex'][j] for (_, j) in s['arc']], dtype=int)
+    row_t = row[:, ct_pos]
+    term(row_t[head], Pot)
+    term(row_t[tail], Pin, -1)
+    for k, (p, co) in enumerate(s['process_input_tuples']):
+        term(row[:, pos['commodity'][co]], Epsilon_in[:, k], -1)
+    for k, (p, co) in enumerate(s['process_output_tuples']):
+        term(row[:, pos['commodity'][co]], Epsilon_out[:, k])
+    source = np.array([[m.vertex_dict[v][co] for co in s['co_source']]
+                       for v in s['vertex']], dtype=float).reshape(V, len(cs))
+    row = constraint('source_vertices', (V, len(cs), T),
+                     ub=source[:, :, np.newaxis])
+    term(row, Rho)
+
+    # commodity
+    limited = [co for co in s['co_allowed_max']
+               if co in m.process_inputs or co in m.process_outputs or
+               co in m.hub_inputs or co in m.hub_outputs]
+    row = constraint('commodity_maximum', (len(limited),),
+                     ub=commodity_attribute('allowed-max', limited))
+    for k, co in enumerate(limited):
+        for tuples, var, sign in ((s['process_input_tuples'], Epsilon_in, -1),
+                                  (s['process_output_tuples'], Epsilon_out,
+                                   1)):
+            for n, (_, c) in enumerate(tuples):
+                if c == co:
+                    term(row[k], var[:, n], sign * weight)
+        _add_hub_balance(m, pos, term, row[k], Epsilon_hub, co,
+                         factor=weight[np.newaxis])
+
+    # process
+    row = constraint('process_throughput_by_capacity', (V, P, T), ub=0)
+    term(row, Tau)
+    term(row, Kappa_process[:, :, np.newaxis], -1)
+    row = constraint('process_capacity_min', (V, P), lb=0)
+    term(row, Kappa_process)
+    term(row, Phi, -process_attribute(m.process_dict, 'cap-min',
+                                      s['process']))
+    row = constraint('process_capacity_max', (V, P), ub=0)
+    term(row, Kappa_process)
+    term(row, Phi, -process_attribute(m.process_dict, 'cap-max',
+                                      s['process']))
+    for name, tuples, var, ratios in (
+            ('process_input', s['process_input_tuples'], Epsilon_in,
+             m.r_in_dict),
+            ('process_output', s['process_output_tuples'], Epsilon_out,
+             m.r_out_dict)):
+        row = constraint(name, (V, len(tuples), T), lb=0, ub=0)
+        term(row, var)
+        for k, (p, co) in enumerate(tuples):
+            term(row[:, k], Tau[:, pos['process'][p]], -ratios[p, co])
+
+    # costs
+    row = constraint('def_costs', (3,), lb=0, ub=0)
+    term(row, costs)
+    commodity_cost = {attribute: commodity_attribute(
+        attribute, s['co_transportable'])[np.newaxis] * length[:, np.newaxis]
+        for attribute in ('cost-inv-var', 'cost-inv-fix', 'cost-fix')}
+    hub_cost = {attribute: process_attribute(
+        m.hub_dict, attribute, s['hub'])[np.newaxis]
+        for attribute in ('cost-inv-var', 'cost-fix', 'cost-var')}
+    process_cost = {attribute: process_attribute(
+        m.process_dict, attribute, s['process'])[np.newaxis]
+        for attribute in ('cost-inv-var', 'cost-inv-fix', 'cost-fix',
+                          'cost-var')}
+    term(row[0], Kappa_hub, -hub_cost['cost-inv-var'])
+    term(row[0], Kappa_process, -process_cost['cost-inv-var'])
+    term(row[0], Phi, -process_cost['cost-inv-fix'])
+    term(row[0], Pmax, -commodity_cost['cost-inv-var'])
+    term(row[0], Xi, -commodity_cost['cost-inv-fix'])
+    term(row[1], Kappa_hub, -hub_cost['cost-fix'])
+    term(row[1], Kappa_process, -process_cost['cost-fix'])
+    term(row[1], Pmax, -commodity_cost['cost-fix'])
+    term(row[2], Epsilon_hub, -hub_cost['cost-var'][:, :, np.newaxis] *
+         weight)
+    term(row[2], Tau, -process_cost['cost-var'][:, :, np.newaxis] * weight)
+    term(row[2], Rho, -commodity_attribute('cost-var', s['co_source'])
+         [np.newaxis, :, np.newaxis] * weight)
+
+    c = np.zeros(lp['size'])
+    c[costs] = 1
+    A = sp.coo_matrix((np.concatenate(rows['val']),
+                       (np.concatenate(rows['row']),
+                        np.concatenate(rows['col']))),
+                      shape=(rows['size'], lp['size'])).tocsr()
+    A.sum_duplicates()
+    A.eliminate_zeros()
+    return {
+        'c': c,
+        'A': A,
+        'row_lb': np.concatenate(rows['lb']),
+        'row_ub': np.concatenate(rows['ub']),
+        'lb': np.concatenate(lp['lb']),
+        'ub': np.concatenate(lp['ub']),
+        'integrality': np.concatenate(lp['integrality']),
+        'columns': lp['columns'],
+        'rows': rows['rows'],
+        'sets': sets,
+        'flow_formulation': flow_formulation}
+
+
+def _add_hub_balance(m, pos, term, row, Epsilon_hub, co, sign=1,
+                     factor=1.):
+    """Add the hub balance of commodity co in all edges to rows.
+
+    Inputs of hubs count negative, outputs positive, all times `sign` and
+    `factor`, just like ``rivus.main.rivus.hub_balance``.
+    """
+    for h, ratio in m.hub_inputs.get(co, ()):
+        term(row, Epsilon_hub[:, pos['hub'][h]], -sign * ratio * factor)
+    for h, ratio in m.hub_outputs.get(co, ()):
+        term(row, Epsilon_hub[:, pos['hub'][h]], sign * ratio * factor)
+
+
+def solve_matrices(problem, time_limit=None, mip_rel_gap=None,
+                   verbose=False):
+    """Solve a problem of ``build_matrices`` with ``scipy.optimize.milp``.
+
+    Parameters
+    ----------
+    problem : dict
+        As returned by ``build_matrices``
+    time_limit : float, optional
+        Maximum solver time (s)
+    mip_rel_gap : float, optional
+        Relative MIP gap at which the solver stops, HiGHS' default if None
+    verbose : bool, optional
+        If True, print the solver log.
+
+    Returns
+    -------
+    scipy.optimize.OptimizeResult
+        x holds the variable values (None if no solution was found), fun the
+        objective value, status and message the termination reason.
+
+    Raises
+    ------
+    ImportError
+        If scipy is older than 1.9 (no ``milp``).
+    """
+    if milp is None:
+        raise ImportError("solve_matrices needs scipy >= 1.9. Use "
+                          "write_mps and another solver instead.")
+    options = {'disp': verbose}
+    if time_limit is not None:
+        options['time_limit'] = time_limit
+    if mip_rel_gap is not None:
+        options['mip_rel_gap'] = mip_rel_gap
+    return milp(problem['c'],
+                integrality=problem['integrality'],
+                bounds=Bounds(problem['lb'], problem['ub']),
+                constraints=LinearConstraint(problem['A'], problem['row_lb'],
+                                             problem['row_ub']),
+                options=options)
+
+
+def write_mps(problem, filename):
+    """Write a problem of ``build_matrices`` as free MPS file.
+
+    Columns are named x0, x1, ... and rows c0, c1, ... in the order of
+    ``problem['columns']`` and ``problem['rows']``. Binaries are enclosed
+    in integer markers with an upper bound of 1.
+
+    Parameters
+    ----------
+    problem : dict
+        As returned by ``build_matrices``
+    filename : str
+        Path of the MPS file to write
+    """
+    row_lb, row_ub = problem['row_lb'], problem['row_ub']
+    equal = row_lb == row_ub
+    lower_only = ~equal & np.isinf(row_ub)
+    ranged = ~equal & ~lower_only & np.isfinite(row_lb)
+    sense = np.where(equal, 'E', np.where(lower_only, 'G', 'L'))
+    rhs = np.where(lower_only, row_lb, row_ub)
+
+    A = problem['A'].tocsc()
+    lines = ['NAME rivus', 'ROWS', ' N obj']
+    lines.extend(' {} c{}'.format(s, i) for i, s in enumerate(sense))
+    lines.append('COLUMNS')
+    integer = False
+    for j in range(A.shape[1]):
+        if bool(problem['integrality'][j]) != integer:
+            integer = not integer
+            lines.append(" MARKER 'MARKER' '{}'".format(
+                'INTORG' if integer else 'INTEND'))
+        if problem['c'][j]:
+            lines.append(' x{} obj {!r}'.format(j, problem['c'][j]))
+        for k in range(A.indptr[j], A.indptr[j + 1]):
+            lines.append(' x{} c{} {!r}'.format(j, A.indices[k], A.data[k]))
+        if A.indptr[j] == A.indptr[j + 1] and not problem['c'][j]:
+            lines.append(' x{} obj 0'.format(j))
+    if integer:
+        lines.append(" MARKER 'MARKER' 'INTEND'")
+    lines.append('RHS')
+    lines.extend(' rhs c{} {!r}'.format(i, rhs[i])
+                 for i in np.flatnonzero(rhs != 0))
+    if ranged.any():
+        lines.append('RANGES')
+        lines.extend(' rng c{} {!r}'.format(i, row_ub[i] - row_lb[i])
+                     for i in np.flatnonzero(ranged))
+    lines.append('BOUNDS')
+    lb, ub = problem['lb'], problem['ub']
+    lines.extend(' LO bnd x{} {!r}'.format(j, lb[j])
+                 for j in np.flatnonzero(lb != 0))
+    lines.extend(' UP bnd x{} {!r}'.format(j, ub[j])
+                 for j in np.flatnonzero(np.isfinite(ub)))
+    lines.append('ENDATA')
+    with open(filename, 'w') as file_handle:
+        file_handle.write('\n'.join(lines) + '\n')
+
+
+def get_entity(problem, x, name):
+    """Return the values of a variable as Series, like ``rivus.get_entity``.
+
+    Parameters
+    ----------
+    problem : dict
+        As returned by ``build_matrices``
+    x : ndarray
+        Variable values, e.g. ``solve_matrices(problem).x``
+    name : str
+        Variable name, e.g. 'Pin'
+
+    Returns
+    -------
+    Series
+        Values named `name`, indexed by the variable's index sets
+    """
+    columns = problem['columns'][name]
+    s = problem['sets']
+    dims = {
+        'Sigma': ['edge', 'commodity', 'time'],
+        'Pin': ['arc', 'co_transportable', 'time'],
+        'Pot': ['arc', 'co_transportable', 'time'],
+        'Psi': ['arc', 'co_transportable', 'time'],
+        'Delta': ['edge', 'co_directed'],
+        'Pmax': ['edge', 'co_transportable'],
+        'Xi': ['edge', 'co_transportable'],
+        'Rho': ['vertex', 'co_source', 'time'],
+        'Kappa_hub': ['edge', 'hub'],
+        'Epsilon_hub': ['edge', 'hub', 'time'],
+        'Kappa_process': ['vertex', 'process'],
+        'Phi': ['vertex', 'process'],
+        'Tau': ['vertex', 'process', 'time'],
+        'Epsilon_in': ['vertex', 'process_input_tuples', 'time'],
+        'Epsilon_out': ['vertex', 'process_output_tuples', 'time'],
+        'costs': ['cost_type']}[name]
+    index = product_index([s[dim] for dim in dims], INDEX_NAMES[name],
+                          [2 if dim in TUPLE_SETS else 1 for dim in dims])
+    return pd.Series(np.asarray(x)[columns.ravel()], index=index, name=name)
+
+
+def get_constants(problem, x):
+    """Return (costs, pmax, kappa_hub, kappa_process) of a solution.
+
+    Same as ``rivus.main.rivus.get_constants`` of a pyomo model with the
+    variable values `x`.
+    """
+    return collect_constants(lambda name: get_entity(problem, x, name))
+
+
+def get_timeseries(problem, x):
+    """Return (source, flows, hubs, proc_io, proc_tau) of a solution.
+
+    Same as ``rivus.main.rivus.get_timeseries`` of a pyomo model with the
+    variable values `x`.
+    """
+    return collect_timeseries(lambda name: get_entity(problem, x, name),
+                              problem['flow_formulation'])
@@ -0,0 +1,76 @@
+"""Small test networks, shared by the test modules."""
+import unittest
+import pandas as pd
+from pyomo.environ import SolverFactory
+from geopandas import GeoDataFrame
+from shapely.geometry import LineString, Point
+
+POINTS = [(11.5, 48.1), (11.501, 48.1), (11.502, 48.1)]
+PAIRS = [(0, 1), (1, 2)]
+SOLVER = 'appsi_highs'
+
+
+def solver():
+    """Return a new instance of the test SOLVER."""
+    return SolverFactory(SOLVER)
+
+
+def solver_available():
+    """Return whether the test SOLVER is installed."""
+    return bool(solver().available(exception_flag=False))
+
+
+requires_solver = unittest.skipUnless(
+    solver_available(), '{} is not available'.format(SOLVER))
+
+
+def small_network(points=POINTS, pairs=PAIRS, residential=(100., 50.),
+                  gas=1000., heat_loss_fix=0):
+    """Return data, vertex, edge of a gas source in vertex 0 and heat demand
+    in the edges, covered by a gas boiler hub.
+
+    By default the network is 0 -- 1 -- 2 with demand in both edges.
+
+    Args:
+        points: (lon, lat) of the vertices
+        pairs: (Vertex1, Vertex2) of the edges
+        residential: residential area of each edge
+        gas: gas source capacity of vertex 0
+        heat_loss_fix: fixed heat loss (kW/m)
+
+    Returns:
+        (data, vertex, edge) tuple, as awaited by ``create_model``
+    """
+    vertex = GeoDataFrame(
+        {'Vertex': range(len(points)),
+         'Gas': [gas] + [0.] * (len(points) - 1)},
+        geometry=[Point(p) for p in points])
+    edge = GeoDataFrame(
+        {'Vertex1': [v1 for v1, _ in pairs],
+         'Vertex2': [v2 for _, v2 in pairs],
+         'residential': list(residential)},
+        geometry=[LineString([points[v1], points[v2]]) for v1, v2 in pairs])
+    nan = float('nan')
+    data = {
+        'commodity': pd.DataFrame(
+            [[100, 0.001, 0, 0.3, 0.001, 0, 1000, nan],
+             [1500, 0.01, 0, 0.07, heat_loss_fix, 0.00002, 1000, nan]],
+            index=pd.Index(['Gas', 'Heat'], name='Commodity'),
+            columns=['cost-inv-fix', 'cost-inv-var', 'cost-fix', 'cost-var',
+                     'loss-fix', 'loss-var', 'cap-max', 'allowed-max']),
+        'process': pd.DataFrame(
+            [[0, 0.3, 0, 0, 0, 1000]],
+            index=pd.Index(['Boiler'], name='Process'),
+            columns=['cost-inv-fix', 'cost-inv-var', 'cost-fix', 'cost-var',
+                     'cap-min', 'cap-max']),
+        'process_commodity': pd.DataFrame(
+            {'ratio': [1., 0.9]}, index=pd.MultiIndex.from_tuples(
+                [('Boiler', 'Gas', 'In'), ('Boiler', 'Heat', 'Out')],
+                names=['Process', 'Commodity', 'Direction'])),
+        'time': pd.DataFrame(
+            {'weight': [100., 8660.], 'Heat': [1., 0.5]},
+            index=pd.Index(['peak', 'base'], name='Time')),
+        'area_demand': pd.DataFrame(
+            {'peak': [1.]}, index=pd.MultiIndex.from_tuples(
+                [('residential', 'Heat')], names=['Area', 'Commodity']))}
+    return data, vertex, edge
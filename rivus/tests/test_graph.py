@@ -0,0 +1,173 @@
+import contextlib
+import io
+import unittest
+import pandas as pd
+from geopandas import GeoDataFrame
+from shapely.geometry import LineString, Point
+import pyomo.environ
+from rivus.main.rivus import create_model
+from rivus.graph.presolve import contract_degree2, expand_edge_result
+from rivus.graph.presolve import prune_edges
+from rivus.graph.steiner import steiner_design, design_start
+from rivus.tests.networks import small_network
+
+
+class RivusGraphTest(unittest.TestCase):
+
+    def test_contract_degree2(self):
+        # 0 -- 1 -- 2 -- 3 with a branch 2 -- 4, source only in 0
+        points = [(0, 0), (1, 0), (2, 0), (3, 0), (2, 1)]
+        vertex = GeoDataFrame({'Vertex': range(5),
+                               'Gas': [100, 0, 0, 0, 0]},
+                              geometry=[Point(p) for p in points])
+        pairs = [(0, 1), (1, 2), (2, 3), (2, 4)]
+        edge = GeoDataFrame(
+            {'Vertex1': [v1 for v1, _ in pairs],
+             'Vertex2': [v2 for _, v2 in pairs],
+             'residential': [10., 20., 30., 40.]},
+            # (1, 2) is digitized in reverse direction
+            geometry=[LineString([points[0], points[1]]),
+                      LineString([points[2], points[1]]),
+                      LineString([points[2], points[3]]),
+                      LineString([points[2], points[4]])])
+        data = {
+            'commodity': pd.DataFrame(index=pd.Index(['Gas'])),
+            'area_demand': pd.DataFrame(
+                {'peak': [1.]}, index=pd.MultiIndex.from_tuples(
+                    [('residential', 'Gas')], names=['Area', 'Commodity']))}
+
+        vertex_c, edge_c, mapping = contract_degree2(data, vertex, edge)
+
+        self.assertEqual(sorted(vertex_c['Vertex']), [0, 2, 3, 4])
+        edge_c = edge_c.set_index(['Vertex1', 'Vertex2'])
+        self.assertEqual(sorted(edge_c.index), [(0, 2), (2, 3), (2, 4)])
+        self.assertEqual(edge_c.loc[(0, 2), 'residential'], 30.)
+        self.assertEqual(list(edge_c.loc[(0, 2), 'geometry'].coords),
+                         [(0, 0), (1, 0), (2, 0)])
+        self.assertEqual(mapping.loc[(1, 2), 'Super2'], 2)
+        self.assertAlmostEqual(mapping.loc[(0, 1), 'share'], 1 / 3.)
+
+        pmax = pd.Series([5, 6, 7], index=pd.MultiIndex.from_tuples(
+            [(0, 2), (2, 3), (2, 4)], names=['Vertex1', 'Vertex2']))
+        expanded = expand_edge_result(pmax, mapping)
+        self.assertEqual(expanded.to_dict(),
+                         {(0, 1): 5, (1, 2): 5, (2, 3): 6, (2, 4): 7})
+
+        flow = pd.Series([1, 2], index=pd.MultiIndex.from_tuples(
+            [(0, 2, 'Gas'), (2, 0, 'Gas')]))
+        expanded = expand_edge_result(flow, mapping, directed=True)
+        self.assertEqual(expanded.to_dict(),
+                         {(0, 1, 'Gas'): 1, (1, 2, 'Gas'): 1,
+                          (1, 0, 'Gas'): 2, (2, 1, 'Gas'): 2})
+
+        # degree-2 vertices with a source, or listed in keep, stay
+        vertex_s = vertex.copy()
+        vertex_s.loc[1, 'Gas'] = 50
+        vertex_c, _, _ = contract_degree2(data, vertex_s, edge)
+        self.assertEqual(sorted(vertex_c['Vertex']), [0, 1, 2, 3, 4])
+        vertex_c, _, _ = contract_degree2(data, vertex, edge, keep=[1])
+        self.assertEqual(sorted(vertex_c['Vertex']), [0, 1, 2, 3, 4])
+
+    def test_contract_degree2_model_peak(self):
+        # chains 0-1-2 and 2-3-4 and the single edge 2-5, listed unsorted
+        points = [(11.5 + 0.001 * k, 48.1) for k in range(5)] + [
+            (11.502, 48.101)]
+        pairs = [(3, 4), (2, 5), (0, 1), (2, 3), (1, 2)]
+        data, vertex, edge = small_network(
+            points, pairs, residential=[10., 20., 30., 40., 50.])
+        edge['commercial'] = [1., 2., 3., 4., 5.]
+        data['area_demand'] = pd.DataFrame(
+            {'peak': [1., 10., 2.]}, index=pd.MultiIndex.from_tuples(
+                [('residential', 'Heat'), ('commercial', 'Heat'),
+                 ('commercial', 'Gas')],
+                names=['Area', 'Commodity']))
+        data['time']['Gas'] = [1., 0.5]
+        vertex_c, edge_c, _ = contract_degree2(data, vertex, edge)
+
+        prob = create_model(data, vertex_c, edge_c)
+        # areas summed over the chains
+        residential = {(0, 2): 30. + 50., (2, 4): 10. + 40., (2, 5): 20.}
+        commercial = {(0, 2): 3. + 5., (2, 4): 1. + 4., (2, 5): 2.}
+        self.assertEqual(sorted(prob.peak.index), sorted(residential))
+        for e in residential:
+            self.assertAlmostEqual(prob.peak.loc[e, 'Heat'],
+                                   residential[e] + 10 * commercial[e])
+            self.assertAlmostEqual(prob.peak.loc[e, 'Gas'],
+                                   2 * commercial[e])
+
+    def test_prune_edges(self):
+        # demand in 0 -- 1, source in 0, dead end 1 -- 2 -- 3,
+        # detour 0 -- 4 -- 1 next to 0 -- 1
+        points = [(11.5, 48.1), (11.501, 48.1), (11.502, 48.1),
+                  (11.503, 48.1), (11.5005, 48.101)]
+        _, vertex, edge = small_network(
+            points, [(0, 1), (1, 2), (2, 3), (0, 4), (1, 4)],
+            residential=[10., 0., 0., 0., 0.], gas=100.)
+        data = {
+            'commodity': pd.DataFrame({'cap-max': [1000.]},
+                                      index=pd.Index(['Gas'])),
+            'time': pd.DataFrame({'weight': [1.]}),
+            'area_demand': pd.DataFrame(
+                {'peak': [1.]}, index=pd.MultiIndex.from_tuples(
+                    [('residential', 'Gas')], names=['Area', 'Commodity']))}
+
+        vertex_p, edge_p, removed = prune_edges(data, vertex, edge,
+                                                verbose=False)
+        self.assertEqual(list(zip(edge_p['Vertex1'], edge_p['Vertex2'])),
+                         [(0, 1)])
+        self.assertEqual(sorted(vertex_p['Vertex']), [0, 1])
+        self.assertEqual(dict(removed['reason']),
+                         {(1, 2): 'dead end', (2, 3): 'dead end',
+                          (0, 4): 'detour', (1, 4): 'detour'})
+
+        _, edge_p, removed = prune_edges(data, vertex, edge, keep=[3],
+                                         xi_zero=[(1, 2, 'Gas')],
+                                         verbose=False)
+        self.assertEqual(removed.loc[(1, 2), 'reason'], 'reduced cost')
+        self.assertEqual(removed.loc[(2, 3), 'reason'], 'dead end')
+
+    def test_prune_edges_binaries(self):
+        # the logged binaries are those create_model saves, with the Phi
+        # of a boiler, which is no hub due to its fixed investment costs
+        points = [(11.5, 48.1), (11.501, 48.1), (11.502, 48.1),
+                  (11.503, 48.1), (11.5005, 48.101)]
+        data, vertex, edge = small_network(
+            points, [(0, 1), (1, 2), (2, 3), (0, 4), (1, 4)],
+            residential=[10., 0., 0., 0., 0.], gas=100.)
+        data['process'].loc['Boiler', 'cost-inv-fix'] = 1.
+
+        def num_binaries(prob):
+            return sum(1 for var in prob.component_data_objects(
+                pyomo.environ.Var) if var.is_binary())
+
+        for flow_formulation in ['timestep', 'aggregated']:
+            out = io.StringIO()
+            with contextlib.redirect_stdout(out):
+                vertex_p, edge_p, _ = prune_edges(
+                    data, vertex, edge, verbose=True,
+                    flow_formulation=flow_formulation)
+            logged = int(out.getvalue().split(' binaries')[0].split()[-1])
+            saved = (num_binaries(create_model(
+                         data, vertex, edge,
+                         flow_formulation=flow_formulation)) -
+                     num_binaries(create_model(
+                         data, vertex_p, edge_p,
+                         flow_formulation=flow_formulation)))
+            self.assertEqual(logged, saved)
+
+    def test_steiner_design_start(self):
+        # 0 -- 1 -- 2 -- 3, 2 -- 4 -- 0, gas source in 0, heat demand in
+        # (2, 3) and (2, 4), covered by a gas boiler hub
+        points = [(11.5, 48.1), (11.501, 48.1), (11.502, 48.1),
+                  (11.503, 48.1), (11.502, 48.101)]
+        data, vertex, edge = small_network(
+            points, [(0, 1), (1, 2), (2, 3), (2, 4), (0, 4)],
+            residential=[0., 0., 100., 50., 0.], heat_loss_fix=1)
+        prob = create_model(data, vertex, edge)
+
+        design = steiner_design(prob)
+        self.assertEqual(design, {'Gas': [(0, 1), (1, 2), (2, 3), (2, 4)]})
+        self.assertEqual(design_start(prob, design), [])
+        self.assertAlmostEqual(prob.Epsilon_hub[2, 3, 'Boiler', 'peak'].value,
+                               100 / 0.9)
+        self.assertEqual(prob.Xi[0, 4, 'Gas'].value, 0)
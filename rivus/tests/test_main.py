@@ -1,8 +1,48 @@
 import unittest
+import os
+import tempfile
+import warnings
+from copy import deepcopy
+import numpy as np
+import pandas as pd
 # For line length test
-from rivus.main.rivus import line_length
+import pyomo.environ
+import pyomo.core as pyomo
+from rivus.main.rivus import line_length, line_lengths, update_parameters
+from rivus.main.rivus import dfs_bridges, create_model, get_entity
+from rivus.main.rivus import get_constants, get_timeseries, result_figures
+from rivus.main.decompose import connected_components, find_components
+from rivus.main.decompose import solve_components
+from rivus.main.heuristics import relax_and_fix, reduced_cost_fixing
+from rivus.main.benders import solve_benders
+from rivus.main import sparse
+from rivus.io.archive import save_result, load_result
+from rivus.io.summary import update_summary
+from rivus.graph.steiner import violations
+from rivus.tests.networks import small_network, solver, requires_solver
 from shapely.geometry import LineString
 
+# known LineStrings with length and LonLat(x-y) coordinates
+LINES = (LineString(((11.6625881, 48.2680606),
+                     (11.6527176, 48.2493919),
+                     (11.6424179, 48.2366107),
+                     (11.6235352, 48.1952043),
+                     (11.608429, 48.184218),
+                     (11.5871429, 48.1647573),
+                     (11.5795898, 48.1455182))),
+         LineString(((11.5795898, 48.1455182),
+                     (11.6142654, 48.1379581),
+                     (11.6630173, 48.1391036),
+                     (11.6781235, 48.1372707),
+                     (11.6963196, 48.142311),
+                     (11.7581177, 48.1432274))),
+         LineString(((11.5710926, 48.1596505),
+                     (11.5704918, 48.1586199),
+                     (11.5718651, 48.1582764))),
+         LineString(((11.571908, 48.1490288),
+                     (11.5755129, 48.1544401))))
+LENS = [15181, 13553, 232, 659]
+
 
 class RivusMainTest(unittest.TestCase):
 
@@ -10,33 +50,253 @@ class RivusMainTest(unittest.TestCase):
     # which reside in the code-base untested. Bellow some placeholders.
 
     def test_line_length(self):
-        # known LineStrings with length and LonLat(x-y) coordinates
-        lines = (LineString(((11.6625881, 48.2680606),
-                             (11.6527176, 48.2493919),
-                             (11.6424179, 48.2366107),
-                             (11.6235352, 48.1952043),
-                             (11.608429, 48.184218),
-                             (11.5871429, 48.1647573),
-                             (11.5795898, 48.1455182))),
-                 LineString(((11.5795898, 48.1455182),
-                             (11.6142654, 48.1379581),
-                             (11.6630173, 48.1391036),
-                             (11.6781235, 48.1372707),
-                             (11.6963196, 48.142311),
-                             (11.7581177, 48.1432274))),
-                 LineString(((11.5710926, 48.1596505),
-                             (11.5704918, 48.1586199),
-                             (11.5718651, 48.1582764))),
-                 LineString(((11.571908, 48.1490288),
-                             (11.5755129, 48.1544401))))
-        lens = [15181, 13553, 232, 659]
-
-        for line, length in zip(lines, lens):
+        for line, length in zip(LINES, LENS):
             calculated = round(line_length(line), 0)
             self.assertTrue(calculated == length,
                             msg=('Calculated line length is invalid. {}<>{}'
                                  .format(calculated, length)))
 
+    def test_line_lengths(self):
+        calculated = list(line_lengths(LINES))
+        self.assertEqual(calculated, LENS,
+                         msg=('Vectorized line lengths are invalid. {}<>{}'
+                              .format(calculated, LENS)))
+
+    def test_update_parameters_needs_mutable_model(self):
+        with self.assertRaises(ValueError):
+            update_parameters(pyomo.ConcreteModel(),
+                              {'commodity': {'Heat': {'cost-fix': 1}}})
+
+    @requires_solver
+    def test_update_parameters(self):
+        data, vertex, edge = small_network()
+        prob = create_model(deepcopy(data), vertex.copy(), edge.copy(),
+                            mutable_params=True)
+        solver().solve(prob)
+        objective = pyomo.value(prob.obj)
+
+        update_parameters(prob, {'commodity': {'Gas': {'cost-var': 0.5}},
+                                 'vertex': {0: {'Gas': 500.}}})
+        solver().solve(prob)
+        self.assertGreater(pyomo.value(prob.obj), objective)
+
+        data['commodity'].loc['Gas', 'cost-var'] = 0.5
+        vertex.loc[0, 'Gas'] = 500.
+        rebuilt = create_model(data, vertex, edge)
+        solver().solve(rebuilt)
+        self.assertAlmostEqual(pyomo.value(prob.obj),
+                               pyomo.value(rebuilt.obj), places=2)
+
+    def test_relax_and_fix_needs_relaxed_model(self):
+        with self.assertRaises(ValueError):
+            relax_and_fix(pyomo.ConcreteModel(), optim=None)
+
+    @requires_solver
+    def test_relax_and_fix(self):
+        data, vertex, edge = small_network()
+        mip = create_model(deepcopy(data), vertex.copy(), edge.copy())
+        solver().solve(mip)
+        prob = create_model(data, vertex, edge, mode='relaxed')
+        result, gap = relax_and_fix(prob, solver())
+        self.assertGreaterEqual(gap, 0)
+        self.assertEqual(violations(prob, tolerance=1e-5), [])
+        self.assertTrue(all(xi.value in (0, 1) for xi in prob.Xi.values()))
+        # a feasible design costs at least the MIP optimum
+        self.assertGreaterEqual(pyomo.value(prob.obj),
+                                pyomo.value(mip.obj) * (1 - 1e-6))
+
+    @requires_solver
+    def test_aggregated_flow_formulation(self):
+        objectives = {}
+        for flow_formulation in ('timestep', 'aggregated'):
+            prob = create_model(*small_network(),
+                                flow_formulation=flow_formulation)
+            result = solver().solve(prob)
+            self.assertEqual(str(result.solver.termination_condition),
+                             'optimal')
+            objectives[flow_formulation] = pyomo.value(prob.obj)
+        # one flow direction for all time steps restricts the model
+        self.assertGreaterEqual(objectives['aggregated'],
+                                objectives['timestep'] * (1 - 1e-6))
+
+        # every transportable commodity has a direction, with or without
+        # mutable Params
+        prob = create_model(*small_network(), flow_formulation='aggregated',
+                            mutable_params=True)
+        self.assertEqual(sorted(prob.co_directed), ['Gas', 'Heat'])
+        solver().solve(prob)
+        self.assertAlmostEqual(pyomo.value(prob.obj),
+                               objectives['aggregated'], places=2)
+
+    @requires_solver
+    def test_reduced_cost_fixing(self):
+        data, vertex, edge = small_network()
+        prob = create_model(data, vertex, edge, mode='relaxed')
+        prob.rc = pyomo.Suffix(direction=pyomo.Suffix.IMPORT)
+        solver().solve(prob)
+        gap = 1000.
+        upper_bound = pyomo.value(prob.obj) + gap
+        # the LP is degenerate here (all reduced costs of Xi are 0), so
+        # they are set to values around the gap
+        prob.rc[prob.Xi[0, 1, 'Heat']] = 2 * gap
+        prob.rc[prob.Xi[1, 2, 'Heat']] = gap / 2
+        prob.rc[prob.Xi[0, 1, 'Gas']] = 2 * gap  # built
+        self.assertEqual(reduced_cost_fixing(prob, upper_bound),
+                         [(0, 1, 'Heat')])
+
+    def test_create_model_rejects_unknown_flow_formulation(self):
+        with self.assertRaises(ValueError):
+            create_model({}, None, None, flow_formulation='pipe')
+
+    def test_benders_rejects_allowed_max(self):
+        commodity = pd.DataFrame({'allowed-max': [float('inf'), 1e6]},
+                                 index=['Heat', 'CO2'])
+        with self.assertRaises(ValueError):
+            solve_benders({'commodity': commodity}, None, None)
+
+    @requires_solver
+    def test_benders_converges_to_monolithic(self):
+        # Benders works on the aggregated flow formulation
+        data, vertex, edge = small_network()
+        prob = create_model(deepcopy(data), vertex.copy(), edge.copy(),
+                            flow_formulation='aggregated')
+        solver().solve(prob)
+        for processes in (1, 2):
+            result, history = solve_benders(
+                deepcopy(data), vertex.copy(), edge.copy(),
+                solver='appsi_highs', processes=processes)
+            lower, upper = history[-1]
+            self.assertEqual(len(history), 2)
+            self.assertLessEqual(upper - lower, 1e-3 * abs(upper))
+            self.assertAlmostEqual(pyomo.value(result.obj),
+                                   pyomo.value(prob.obj), places=1)
+        self.assertAlmostEqual(pyomo.value(prob.obj), 236755.40, places=1)
+
+    @requires_solver
+    def test_benders_warns_without_convergence(self):
+        data, vertex, edge = small_network()
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            _, history = solve_benders(data, vertex, edge,
+                                       solver='appsi_highs', processes=1,
+                                       max_iterations=1)
+        self.assertEqual(len(history), 1)
+        self.assertTrue(any('Benders stopped' in str(w.message)
+                            for w in caught))
+
+    def test_connected_components(self):
+        neighbours = {1: [2], 2: [1, 3], 3: [2], 7: [8], 8: [7]}
+        self.assertEqual(connected_components(neighbours),
+                         {1: 0, 2: 0, 3: 0, 7: 1, 8: 1})
+
+    @requires_solver
+    def test_solve_components(self):
+        # two networks 0-1-2 and 3-4-5, each with its own gas source
+        points = [(11.5, 48.1), (11.501, 48.1), (11.502, 48.1),
+                  (11.51, 48.1), (11.511, 48.1), (11.512, 48.1)]
+        data, vertex, edge = small_network(
+            points, [(0, 1), (1, 2), (3, 4), (4, 5)],
+            residential=[100., 50., 80., 40.])
+        vertex.loc[3, 'Gas'] = 1000.
+        components = find_components(data, vertex, edge)
+        self.assertEqual(len(components), 2)
+        constants, timeseries = solve_components(
+            data, components, solver='appsi_highs', processes=1)
+
+        prob = create_model(deepcopy(data), vertex.copy(), edge.copy())
+        solver().solve(prob)
+        # costs are rounded per component
+        costs = get_constants(prob)[0]
+        self.assertLessEqual((constants[0] - costs).abs().max(), 1)
+        for merged, frame in zip(constants[1:] + timeseries,
+                                 get_constants(prob)[1:] +
+                                 get_timeseries(prob)):
+            if frame.empty:
+                self.assertTrue(merged.empty)
+                continue
+            pd.testing.assert_frame_equal(merged, frame.sort_index(),
+                                          check_dtype=False)
+
+    def test_dfs_bridges(self):
+        # triangle a-b-c with pendant edge c-d
+        vertices = ['a', 'b', 'c', 'd']
+        edges = [('a', 'b'), ('b', 'c'), ('c', 'a'), ('c', 'd')]
+        adjacency = {v: [] for v in vertices}
+        for k, (v1, v2) in enumerate(edges):
+            adjacency[v1].append((v2, k))
+            adjacency[v2].append((v1, k))
+        component, order, parent, owner, bridges = dfs_bridges(vertices,
+                                                               adjacency)
+        self.assertEqual(list(component), [0, 0, 0, 0])
+        self.assertEqual(bridges, {3: vertices.index('d')})
+        self.assertEqual(owner[3], vertices.index('d'))
+
+    def test_arc_flow_bounds(self):
+        data, vertex, edge = small_network()
+        prob = create_model(data, vertex, edge)
+        bounds = prob.arc_flow_bound_dict
+        # Heat is produced by the Boiler hubs from Gas (ratio 0.9), its
+        # flows are limited by the peak demand behind each arc plus losses
+        self.assertGreaterEqual(bounds[0, 1, 'Heat'], 150.)
+        self.assertGreaterEqual(bounds[1, 2, 'Heat'], 50.)
+        self.assertLess(bounds[1, 2, 'Heat'], bounds[0, 1, 'Heat'])
+        for (i, j), need in [((0, 1), 150. / .9), ((1, 2), 50. / .9)]:
+            self.assertGreaterEqual(bounds[i, j, 'Gas'], need)
+            self.assertLess(bounds[i, j, 'Gas'], 1.01 * need)
+        # no Gas source behind the arcs towards vertex 0
+        self.assertEqual(bounds[1, 0, 'Gas'], 0)
+        self.assertEqual(bounds[2, 1, 'Gas'], 0)
+
+    @requires_solver
+    def test_tighten_bounds_keeps_objective(self):
+        objectives = []
+        for tighten_bounds in (True, False):
+            prob = create_model(*small_network(),
+                                tighten_bounds=tighten_bounds)
+            solver().solve(prob)
+            objectives.append(pyomo.value(prob.obj))
+        self.assertAlmostEqual(objectives[0], objectives[1], places=2)
+
+    def test_sparse_matrices_match_model(self):
+        data, vertex, edge = small_network()
+        prob = create_model(deepcopy(data), vertex.copy(), edge.copy())
+        problem = sparse.build_matrices(data, vertex, edge)
+        self.assertEqual(problem['A'].shape, (
+            sum(1 for _ in prob.component_data_objects(pyomo.Constraint)),
+            sum(1 for _ in prob.component_data_objects(pyomo.Var))))
+        if sparse.milp is None:
+            return  # scipy < 1.9
+
+        result = sparse.solve_matrices(problem)
+        self.assertEqual(result.status, 0)
+        for name in problem['columns']:
+            variable = getattr(prob, name)
+            for index, value in sparse.get_entity(problem, result.x,
+                                                  name).items():
+                variable[index].set_value(value, skip_validation=True)
+        self.assertEqual(violations(prob, tolerance=1e-5), [])
+        self.assertAlmostEqual(pyomo.value(prob.obj), result.fun, places=3)
+
+        costs, pmax, _, _ = sparse.get_constants(problem, result.x)
+        self.assertEqual(list(costs.index), ['Inv', 'Fix', 'Var'])
+        self.assertEqual(list(pmax.index.names), ['Vertex1', 'Vertex2'])
+
+    def test_get_entity(self):
+        data, vertex, edge = small_network()
+        prob = create_model(data, vertex, edge)
+        for k, var in enumerate(prob.Pin.values()):
+            var.value = k
+        index_cache = {}
+        pin = get_entity(prob, 'Pin', index_cache)
+        pot = get_entity(prob, 'Pot', index_cache)
+        self.assertEqual(list(pin.index.names),
+                         ['vertex', 'vertex_', 'commodity', 'time'])
+        self.assertIs(pin.index, pot.index)
+        self.assertEqual([prob.Pin[index].value for index in pin.index],
+                         list(pin))
+        self.assertEqual(list(get_entity(prob, 'Epsilon_hub').index.names),
+                         ['vertex', 'vertex_', 'hub', 'time'])
+
     def test_source_calculation(self):
         pass
 
@@ -46,5 +306,83 @@ class RivusMainTest(unittest.TestCase):
     def test_save_load(self):
         pass
 
+    def test_save_load_result(self):
+        data, vertex, edge = small_network()
+        prob = create_model(data, vertex, edge)
+        for var in prob.component_objects(pyomo.Var):
+            for k, var_data in enumerate(var.values()):
+                var_data.value = k % 3
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'result.npz')
+            save_result(prob, filename)
+            result = load_result(filename)
+        for expected, actual in zip(get_constants(prob) + get_timeseries(prob),
+                                    get_constants(result) +
+                                    get_timeseries(result)):
+            self.assertTrue(expected.equals(actual))
+        self.assertTrue(all(
+            a.equals(b) for a, b in zip(prob.params['edge'].geometry,
+                                        result.params['edge'].geometry)))
+        self.assertTrue(prob.peak.equals(result.peak))
+
+    def test_load_result_lazy(self):
+        data, vertex, edge = small_network()
+        prob = create_model(data, vertex, edge)
+        for var in prob.component_objects(pyomo.Var):
+            for k, var_data in enumerate(var.values()):
+                var_data.value = k % 3
+        with tempfile.TemporaryDirectory() as tmp:
+            filename = os.path.join(tmp, 'result.npz')
+            save_result(prob, filename, compressed=False)
+            result = load_result(filename, lazy=True)
+            self.assertIsInstance(result.archive['frames/peak/data/0'],
+                                  np.memmap)
+            costs = get_constants(result)[0]
+            self.assertTrue(costs.equals(get_constants(prob)[0]))
+            # only the variables of get_constants have been read
+            self.assertEqual(sorted(result.variables._values),
+                             ['Kappa_hub', 'Kappa_process', 'Pmax', 'costs'])
+            result.close()
+
+    def test_update_summary(self):
+        data, vertex, edge = small_network()
+        prob = create_model(data, vertex, edge)
+        for var in prob.component_objects(pyomo.Var):
+            for var_data in var.values():
+                var_data.value = 1
+        with tempfile.TemporaryDirectory() as tmp:
+            save_result(prob, os.path.join(tmp, 'scenario_a.npz'))
+            save_result(prob, os.path.join(tmp, 'scenario_b.npz'))
+            summary = update_summary(tmp, processes=1)
+            self.assertEqual(list(summary.index), ['a', 'b'])
+            self.assertEqual(summary.loc['a', 'pmax-Heat'], 2)
+
+            prob.costs['Inv'].value = 5
+            save_result(prob, os.path.join(tmp, 'scenario_b.npz'))
+            os.remove(os.path.join(tmp, 'scenario_a.npz'))
+            summary = update_summary(tmp, processes=1)
+            self.assertEqual(list(summary.index), ['b'])
+            self.assertEqual(summary.loc['b', 'cost-Inv'], 5)
+
+    @requires_solver
+    def test_result_figures_pool(self):
+        # plot needs a map extent in both directions
+        data, vertex, edge = small_network(
+            points=[(11.5, 48.1), (11.501, 48.101), (11.502, 48.1)])
+        prob = create_model(data, vertex, edge)
+        solver().solve(prob)
+        figures = [('Heat', 'caps', False), ('Gas', 'caps', True),
+                   ('Heat', 'peak', False)]
+        file_sets = []
+        for processes in (1, 2):
+            with tempfile.TemporaryDirectory() as tmp:
+                result_figures(prob, os.path.join(tmp, 'small'),
+                               processes=processes, figures=figures)
+                file_sets.append(sorted(
+                    os.path.relpath(os.path.join(root, name), tmp)
+                    for root, _, names in os.walk(tmp) for name in names))
+        self.assertEqual(len(file_sets[0]), 3 * len(figures))
+        self.assertEqual(file_sets[0], file_sets[1])
+
     def test_read_excel(self):
         pass
@@ -2,9 +2,25 @@ import unittest
 import os
 pdir = os.path.dirname
 from rivus.utils.notify import email_me
-from rivus.utils.runmany import parameter_range
-from rivus.main.rivus import read_excel
+from rivus.utils.runmany import parameter_range, solve_sweep
+from rivus.utils.runmany import _clear_flow_values
+from rivus.utils.timeagg import aggregate_time
+from rivus.utils.profiler import profile_model
+from rivus.utils.prerun import analyze_inputs, setup_solver
+from rivus.utils.cache import input_hash, trim_cache, solver_name
+from rivus.utils.cache import cached_solve
+from geopandas import GeoDataFrame
+from shapely.geometry import LineString, Point
+from rivus.main.rivus import read_excel, create_model, get_constants
+from rivus.tests.networks import small_network, solver, requires_solver
 import json
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+import pyomo.environ as pyomo
+from copy import deepcopy
+from pyomo.environ import SolverFactory
 
 
 class RivusUtilsTest(unittest.TestCase):
@@ -49,6 +65,174 @@ class RivusUtilsTest(unittest.TestCase):
             self.assertTrue(min(got_parameters) >= lims['lim_lo'] * the_param,
                             msg='Got parameter smaller than awaited.')
 
+    def test_aggregate_time(self):
+        """Aggregated series keeps duration, total demand and peak."""
+        hours = np.arange(96)
+        scaling = pd.DataFrame({
+            'Elec': 0.6 + 0.4 * np.sin(2 * np.pi * hours / 24),
+            'Heat': 0.5 + 0.5 * np.cos(2 * np.pi * hours / 96)})
+        time, labels, report = aggregate_time(scaling, k=6)
+
+        self.assertEqual(len(time), 6)
+        self.assertEqual(time.index.name, 'Time')
+        self.assertAlmostEqual(time['weight'].sum(), len(hours))
+        self.assertTrue(set(labels) <= set(time.index))
+        self.assertTrue(np.allclose(report['energy'], 0))
+        self.assertTrue(np.allclose(report['peak'], 0))
+
+    def test_profile_model(self):
+        """Profile lists each component once, with sizes and nonzeros."""
+        def build(data, vertex, edge):
+            m = pyomo.ConcreteModel()
+            m.edge = pyomo.Set(initialize=edge)
+            m.x = pyomo.Var(m.edge, m.edge)
+            m.c = pyomo.Constraint(
+                m.edge, rule=lambda m, e: sum(m.x[e, f] for f in m.edge) <= 1)
+            return m
+
+        prob, profile = profile_model(None, None, [1, 2, 3], builder=build)
+        self.assertEqual(list(profile.index), ['edge', 'x', 'c', 'other'])
+        self.assertEqual(list(profile['type'][:3]),
+                         ['Set', 'Var', 'Constraint'])
+        self.assertEqual(list(profile['size'][:3]), [3, 9, 3])
+        self.assertEqual(profile.loc['c', 'nonzeros'], 9)
+        self.assertTrue((profile['time'] >= 0).all())
+        self.assertEqual(len(prob.x), 9)
+
+    def test_analyze_inputs(self):
+        """Predicted sizes match the model, infeasible inputs are found."""
+        # 0 -- 1 -- 2 with gas source in 0, separate 3 -- 4, heat demand in
+        # (1, 2) and (3, 4), covered by a gas boiler hub
+        points = [(11.5, 48.1), (11.501, 48.1), (11.502, 48.1),
+                  (11.5, 48.2), (11.501, 48.2)]
+        data, vertex, edge = small_network(
+            points, [(0, 1), (1, 2), (3, 4)], residential=[0., 100., 50.])
+
+        size, issues = analyze_inputs(data, vertex, edge)
+        self.assertEqual(len(issues), 1)
+        self.assertTrue(issues[0].startswith('reachability: demand of Heat'))
+        self.assertIn('(3, 4)', issues[0])
+
+        prob, profile = profile_model(data.copy(), vertex.copy(),
+                                      edge.copy())
+        built = profile.loc[size.index]
+        self.assertEqual(list(size['size']), list(built['size']))
+        constraints = size['type'] == 'Constraint'
+        self.assertEqual(list(size['nonzeros'][constraints]),
+                         list(built['nonzeros'][constraints]))
+        self.assertEqual(size['binary'].sum(), sum(
+            1 for var in prob.component_data_objects(pyomo.Var)
+            if var.is_binary()))
+
+        vertex['Gas'] = [1., 0, 0, 0, 0]
+        _, issues = analyze_inputs(data, vertex, edge)
+        self.assertTrue(issues[0].startswith('supply: peak demand 150 kW'))
+
+    def test_input_hash(self):
+        """Equal inputs give equal keys, changed values or options not."""
+        vertex = GeoDataFrame({'Vertex': [0, 1], 'Gas': [1000., 0]},
+                              geometry=[Point(0, 0), Point(1, 0)])
+        edge = GeoDataFrame({'Vertex1': [0], 'Vertex2': [1],
+                             'residential': [100.]},
+                            geometry=[LineString([(0, 0), (1, 0)])])
+        data = {'commodity': pd.DataFrame({'cap-max': [1000.]},
+                                          index=['Gas'])}
+        key = input_hash(data, vertex, edge)
+        self.assertEqual(key, input_hash({'commodity': data['commodity']
+                                          .copy()}, vertex.copy(),
+                                         edge.copy()))
+        self.assertNotEqual(key, input_hash(data, vertex, edge,
+                                            mode='relaxed'))
+        moved = edge.copy()
+        moved['geometry'] = [LineString([(0, 0), (1, 1)])]
+        self.assertNotEqual(key, input_hash(data, vertex, moved))
+
+    def test_trim_cache(self):
+        """Least recently used entries are removed first."""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            for k, key in enumerate(['old', 'new', 'kept']):
+                filename = os.path.join(cache_dir, key + '.npz')
+                with open(filename, 'w') as file_handle:
+                    file_handle.write('x' * 100)
+                os.utime(filename, (time.time() + k, time.time() + k))
+            self.assertEqual(trim_cache(cache_dir, 250, keep=['kept']),
+                             ['old'])
+            self.assertEqual(trim_cache(cache_dir, 50, keep=['kept']),
+                             ['new'])
+            self.assertEqual(os.listdir(cache_dir), ['kept.npz'])
+
+    @requires_solver
+    def test_cached_solve(self):
+        """A second identical run loads the stored solution."""
+        data, vertex, edge = small_network()
+        with tempfile.TemporaryDirectory() as cache_dir:
+            miss, hit = cached_solve(data, vertex, edge, solver(),
+                                     cache_dir=cache_dir)
+            self.assertFalse(hit)
+            self.assertEqual(len(os.listdir(cache_dir)), 1)
+            cached, hit = cached_solve(data, vertex, edge, solver(),
+                                       cache_dir=cache_dir)
+            self.assertTrue(hit)
+            costs_miss = get_constants(miss)[0]
+            costs_hit = get_constants(cached)[0]
+            self.assertAlmostEqual(costs_hit.sum(), 236755.40, delta=1)
+            pd.testing.assert_series_equal(costs_hit, costs_miss)
+            _, hit = cached_solve(data, vertex, edge, solver(),
+                                  cache_dir=cache_dir, mode='relaxed')
+            self.assertFalse(hit)
+
+    def test_solver_name(self):
+        """Solver instances of the same kind give the same cache key."""
+        self.assertEqual(solver_name('glpk'), 'glpk')
+        self.assertEqual(solver_name(SolverFactory('glpk')), 'glpk')
+        first, second = SolverFactory('appsi_highs'), SolverFactory(
+            'appsi_highs')
+        self.assertEqual(solver_name(first), 'appsi_highs')
+        data, vertex, edge = small_network()
+        self.assertEqual(input_hash(data, vertex, edge,
+                                    solver=solver_name(first)),
+                         input_hash(data, vertex, edge,
+                                    solver=solver_name(second)))
+
+    @requires_solver
+    def test_solve_sweep(self):
+        """Each solve of the sweep matches a model built from patched data."""
+        data, vertex, edge = small_network()
+        prob = create_model(deepcopy(data), vertex.copy(), edge.copy(),
+                            mutable_params=True)
+        optim = setup_solver(solver())
+        patches = [{'commodity': {'Gas': {'cost-var': 0.5}}},
+                   {'commodity': {'Gas': {'cost-inv-fix': 300}}},
+                   {'process': {'Boiler': {'cost-inv-var': 0.6}}}]
+        objectives = []
+        for patch, result in solve_sweep(prob, patches, optim):
+            objectives.append(pyomo.value(prob.obj))
+        self.assertEqual(len(objectives), len(patches))
+
+        for patch, objective in zip(patches, objectives):
+            # patches are applied one after the other
+            for table, rows in patch.items():
+                for key, attributes in rows.items():
+                    for attribute, value in attributes.items():
+                        data[table].loc[key, attribute] = value
+            fresh = create_model(deepcopy(data), vertex.copy(), edge.copy())
+            solver().solve(fresh)
+            self.assertAlmostEqual(objective, pyomo.value(fresh.obj),
+                                   places=2)
+
+    def test_clear_flow_values(self):
+        """Only the variables of the MIP start keep their values."""
+        data, vertex, edge = small_network()
+        prob = create_model(data, vertex, edge)
+        for var in prob.component_objects(pyomo.Var):
+            for var_data in var.values():
+                var_data.value = 1
+        _clear_flow_values(prob)
+        self.assertTrue(all(var_data.value == 1
+                            for var_data in prob.Xi.values()))
+        self.assertTrue(all(var_data.value is None
+                            for var_data in prob.Pin.values()))
+
     def test_email_notification(self):
         """It only can test, whether the notification function run trhrough
         successfully.
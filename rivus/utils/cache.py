@@ -0,0 +1,224 @@
+"""Content-addressed cache of model solutions.
+
+Scenario scripts rebuild and resolve identical problems when re-run, e.g.
+after a crash in a later scenario. ``cached_solve`` hashes the model inputs
+(all frames of `data`, `vertex` and `edge`, incl. geometries), the model and
+solver options and the source of ``create_model``'s module. Under this key
+it stores the solution (``<key>.npz``, see ``rivus.io.archive.save_result``)
+in a cache directory, not the pickled model (``rivus.save``), which is
+larger and slower to load. An identical run loads the solution instead of
+building and solving the model. The least recently used entries are
+removed, when the cache exceeds its maximum size.
+
+Example
+-------
+::
+
+    result, hit = cached_solve(data, vertex, edge, solver='glpk',
+                               cache_dir='cache', max_size=2 * 1024 ** 3)
+    costs, pmax, kappa_hub, kappa_process = get_constants(result)
+"""
+import hashlib
+import os
+import warnings
+
+import pandas as pd
+import pyomo.environ  # although it is not used directly, it is needed by pyomo
+from pyomo.opt import TerminationCondition
+from pyomo.opt.base import SolverFactory
+
+from ..main import rivus
+from ..main.rivus import create_model
+from ..io.archive import save_result, load_result, to_result
+
+EXTENSIONS = ('.npz',)
+
+
+def cached_solve(data, vertex, edge, solver='glpk', cache_dir='cache',
+                 max_size=1024 ** 3, solver_options=None, tee=False,
+                 **model_kwargs):
+    """Return a solution, from the cache if it holds identical inputs.
+
+    Parameters
+    ----------
+    data, vertex, edge
+        As awaited by ``create_model``, not changed by this function.
+    solver : str or solver object, optional
+        Solver name, or a solver from ``SolverFactory``. A solver object is
+        part of the cache key by its registered name (see
+        ``solver_name``); options set on it are not, pass them as
+        `solver_options` to make them so.
+    cache_dir : str, optional
+        Directory of the cache, created if missing.
+    max_size : int, optional
+        Maximum size (bytes) of all cached files, see ``trim_cache``.
+    solver_options : dict, optional
+        Options passed to the solver.
+    tee : bool, optional
+        If True, print the solver log.
+    **model_kwargs
+        Passed to ``create_model``.
+
+    Returns
+    -------
+    (result, hit) tuple
+        + result: ``Result`` of the solved model, accepted by
+          ``get_constants``, ``report``, ``result_figures`` etc.
+        + hit: True, if it was loaded from the cache
+
+    Note
+    ----
+    Solutions are only cached if the solver terminated optimally.
+    """
+    solver_options = solver_options or {}
+    key = input_hash(data, vertex, edge,
+                     solver=solver_name(solver),
+                     solver_options=solver_options, **model_kwargs)
+    path = os.path.join(cache_dir, key)
+    if os.path.exists(path + '.npz'):
+        for extension in EXTENSIONS:
+            if os.path.exists(path + extension):
+                os.utime(path + extension, None)  # mark as recently used
+        return load_result(path + '.npz'), True
+
+    if not os.path.exists(cache_dir):
+        os.makedirs(cache_dir)
+    prob = create_model(data.copy(), vertex.copy(), edge.copy(),
+                        **model_kwargs)
+    optim = SolverFactory(solver) if isinstance(solver, str) else solver
+    for name, value in solver_options.items():
+        optim.options[name] = value
+    result = optim.solve(prob, tee=tee)
+    if result.solver.termination_condition == TerminationCondition.optimal:
+        save_result(prob, path + '.npz')
+    else:
+        warnings.warn("Solver terminated with '{}', solution is not cached."
+                      .format(result.solver.termination_condition))
+    trim_cache(cache_dir, max_size, keep=[key])
+    return to_result(prob), False
+
+
+def input_hash(data, vertex, edge, **options):
+    """Return a hex digest identifying model inputs and options.
+
+    Parameters
+    ----------
+    data : dict
+        DataFrames by name, e.g. from ``read_excel``
+    vertex, edge : GeoDataFrame
+        As awaited by ``create_model``
+    **options
+        Any further arguments, hashed by their ``repr``. Functions (e.g. a
+        `peak_multiplier`) are hashed by module, name and byte code.
+
+    Returns
+    -------
+    str
+        SHA-256 digest of values, index, column names and dtypes of all
+        frames, the options and the source code of the model.
+    """
+    digest = hashlib.sha256()
+    for name in sorted(data):
+        _update_frame(digest, name, data[name])
+    _update_frame(digest, 'vertex', vertex)
+    _update_frame(digest, 'edge', edge)
+    for name in sorted(options):
+        digest.update(repr((name, _option_key(options[name]))).encode())
+    with open(rivus.__file__, 'rb') as file_handle:
+        digest.update(file_handle.read())
+    return digest.hexdigest()
+
+
+def solver_name(solver):
+    """Return the name under which a solver is registered.
+
+    Parameters
+    ----------
+    solver : str or solver object
+        Solver name, or a solver from ``SolverFactory``
+
+    Returns
+    -------
+    str
+        e.g. 'glpk' or 'appsi_highs'. Solvers without a ``name`` attribute
+        (e.g. the APPSI solvers) are looked up in ``SolverFactory``, so
+        that the name is the same for each instance.
+    """
+    if isinstance(solver, str):
+        return solver
+    name = getattr(solver, 'name', None)
+    if isinstance(name, str):
+        return name
+    for registered in SolverFactory:
+        if SolverFactory.get_class(registered) is type(solver):
+            return registered
+    return type(solver).__name__
+
+
+def trim_cache(cache_dir, max_size, keep=()):
+    """Remove least recently used entries until the cache fits max_size.
+
+    Parameters
+    ----------
+    cache_dir : str
+        Directory of the cache
+    max_size : int
+        Maximum size (bytes) of all cached files
+    keep : iterable, optional
+        Keys never to be removed, e.g. the one just stored
+
+    Returns
+    -------
+    list
+        Removed keys, least recently used first
+    """
+    entries = {}
+    for filename in os.listdir(cache_dir):
+        key, extension = os.path.splitext(filename)
+        if extension not in EXTENSIONS:
+            continue
+        stat = os.stat(os.path.join(cache_dir, filename))
+        size, used = entries.get(key, (0, 0))
+        entries[key] = (size + stat.st_size, max(used, stat.st_mtime))
+
+    total = sum(size for size, _ in entries.values())
+    removed = []
+    for key in sorted(entries, key=lambda k: entries[k][1]):
+        if total <= max_size:
+            break
+        if key in keep:
+            continue
+        for extension in EXTENSIONS:
+            filename = os.path.join(cache_dir, key + extension)
+            if os.path.exists(filename):
+                os.remove(filename)
+        total -= entries[key][0]
+        removed.append(key)
+    return removed
+
+
+def _update_frame(digest, name, frame):
+    """Add name, shape and content of a DataFrame (or Series) to digest."""
+    frame = pd.DataFrame(frame)
+    geometries = [column for column in frame.columns
+                  if str(frame[column].dtype) in ('object', 'geometry') and
+                  any(hasattr(value, 'wkb_hex') for value in frame[column])]
+    if geometries:
+        # shapely geometries by their well-known binary representation
+        frame = frame.copy()
+        for column in geometries:
+            frame[column] = [getattr(value, 'wkb_hex', value)
+                             for value in frame[column]]
+    digest.update(repr((name, list(frame.columns), list(frame.index.names),
+                        [str(dtype) for dtype in frame.dtypes])).encode())
+    digest.update(pd.util.hash_pandas_object(frame, index=True)
+                  .values.tobytes())
+
+
+def _option_key(value):
+    """Return a deterministic, hashable representation of an option."""
+    if callable(value) and hasattr(value, '__code__'):
+        return (value.__module__, value.__name__, value.__code__.co_code)
+    if isinstance(value, dict):
+        return sorted((k, _option_key(v)) for k, v in value.items())
+    return value
@@ -3,10 +3,16 @@
 In use to avoid multiple solutions of the same task, like:
 
 + Setting up the solver.
++ Estimating the model size and spotting infeasible inputs before building.
 + Todo: Create needed directories
 
 """
 from multiprocessing import cpu_count
+from types import SimpleNamespace
+import pandas as pd
+from ..main.decompose import connected_components
+from ..main.rivus import prepare_inputs
+from .cache import solver_name
 
 
 def setup_solver(optim, logfile='solver.log', guro_time_lim=12000,
@@ -53,7 +59,9 @@ def setup_solver(optim, logfile='solver.log', guro_time_lim=12000,
     SolverFactory
         With applied modifications
     """
-    if optim.name == 'gurobi':
+    # persistent (APPSI) solver interfaces have no name attribute
+    name = solver_name(optim)
+    if name == 'gurobi':
         # reference with list of option names
         # http://www.gurobi.com/documentation/5.6/reference-manual/parameters
         to_console = 1 if log_to_console else 0
@@ -69,7 +77,7 @@ def setup_solver(optim, logfile='solver.log', guro_time_lim=12000,
             # No more threads than CPUs
             thread_num = CPUNum if guro_threads > CPUNum else guro_threads
             optim.set_options("Threads={}".format(thread_num))
-    elif optim.name == 'glpk':
+    elif name == 'glpk':
         # reference with list of options
         # execute 'glpsol --help'
         if log_to_console:
@@ -78,5 +86,276 @@ def setup_solver(optim, logfile='solver.log', guro_time_lim=12000,
             optim.set_options("y={}".format(logfile))
     else:
         print("Warning from setup_solver: no options set for solver "
-              "'{}'!".format(optim.name))
+              "'{}'!".format(name))
     return optim
+
+
+def analyze_inputs(data, vertex, edge, hub_only_in_edge=True, mode='mip',
+                   flow_formulation='timestep'):
+    """Predict the size of a rivus model and check necessary feasibility.
+
+    Uses only the input frames, so that batch runners can skip hopeless or
+    oversized instances before ``create_model`` is called. Sets and peak
+    demand are derived by ``prepare_inputs``, like for the model, from
+    copies of the inputs, which are not changed.
+
+    Sizes are the declared ones, the solver's presolve will shrink them.
+    Feasibility checks are necessary, not sufficient conditions:
+
+    + supply: per demand commodity, the peak demand of the time step with
+      the highest scaling exceeds the sum of its source capacities and of
+      the output of all processes and hubs producing it, at cap-max or as
+      far as their inputs can be supplied.
+    + reachability: a demand edge's commodity can neither flow through the
+      edge's graph component (from a source or a process there) nor be
+      produced by a hub from such a commodity.
+    + processes: a process never runs, as one of its inputs can not be
+      obtained anywhere. This is no infeasibility, but a sign of wrong
+      input data.
+
+    Parameters
+    ----------
+    data : dict
+        Processed Excel spreadsheet by ``read_excel``
+    vertex, edge : GeoDataFrame
+        As awaited by ``create_model``
+    hub_only_in_edge, mode, flow_formulation : optional
+        As for ``create_model``, they change the size of the model.
+
+    Returns
+    -------
+    (size, issues) tuple
+        + size: DataFrame indexed by component name, in order of
+          ``create_model``, with columns type ('Var' or 'Constraint'),
+          size (number of indices), nonzeros (constraint body entries,
+          NaN for variables) and binary (number of binaries). Totals by
+          ``size.groupby('type').sum()``.
+        + issues: list of strings, one per failed check, empty if none.
+
+    Example
+    -------
+    ::
+
+        size, issues = analyze_inputs(data, vertex, edge)
+        if issues or size['nonzeros'].sum() > 1e7:
+            print('skipped:', *issues, sep='\n')
+    """
+    # parameters and sets, derived on copies exactly as by create_model
+    m = SimpleNamespace(params=dict(data))
+    init = prepare_inputs(m, m.params, vertex.copy(), edge.copy(),
+                          hub_only_in_edge=hub_only_in_edge)
+    r_in, r_out = m.r_in, m.r_out
+    time = data['time']
+    edges = list(init['edge'])
+    vertices = list(init['vertex'])
+    hubs = list(init['hub'])
+    processes = list(init['process'])
+    process_in = [tuple(pc) for pc in init['process_input_tuples']]
+    process_out = [tuple(pc) for pc in init['process_output_tuples']]
+    co_all = list(init['commodity'])
+    co_demand = init['co_demand']
+    co_transportable = list(init['co_transportable'])
+    co_directed = list(init['co_directed'])
+    co_source = list(init['co_source'])
+    co_allowed_max = list(init['co_allowed_max'])
+
+    def count(pairs, co):
+        return sum(1 for (_, c) in pairs if c == co)
+
+    hub_in = [(h, co) for (h, co) in r_in.index if h in hubs]
+    hub_out = [(h, co) for (h, co) in r_out.index if h in hubs]
+    E, A, V, T = len(edges), 2 * len(edges), len(vertices), len(time)
+    C, Ct, Cs = len(co_all), len(co_transportable), len(co_source)
+    H, P = len(hubs), len(processes)
+    PI, PO = len(process_in), len(process_out)
+    binary = 1 if mode == 'mip' else 0
+    timestep = flow_formulation == 'timestep'
+
+    # Sigma, Pin, Pot in both directions and Psi (Xi) of the fixed losses
+    edge_equation_nz = sum((7 if timestep else 6)
+                           if co in co_transportable else 1 for co in co_all)
+    vertex_equation_nz = sum(
+        (V if co in co_source else 0) +
+        (2 * A if co in co_transportable else 0) +
+        V * (count(process_in, co) + count(process_out, co))
+        for co in co_all)
+    allowed_max_nz = sum(
+        T * (V * (count(process_in, co) + count(process_out, co)) +
+             E * (count(hub_in, co) + count(hub_out, co)))
+        for co in co_allowed_max)
+
+    # (name, type, size, nonzeros per index or total, binaries)
+    rows = [
+        ('Sigma', 'Var', E * C * T, None, 0),
+        ('Pin', 'Var', A * Ct * T, None, 0),
+        ('Pot', 'Var', A * Ct * T, None, 0),
+        ('Psi', 'Var', A * Ct * T, None, binary * A * Ct * T) if timestep
+        else ('Delta', 'Var', E * len(co_directed), None,
+              binary * E * len(co_directed)),
+        ('Pmax', 'Var', E * Ct, None, 0),
+        ('Xi', 'Var', E * Ct, None, binary * E * Ct),
+        ('Rho', 'Var', V * Cs * T, None, 0),
+        ('Kappa_hub', 'Var', E * H, None, 0),
+        ('Epsilon_hub', 'Var', E * H * T, None, 0),
+        ('Kappa_process', 'Var', V * P, None, 0),
+        ('Phi', 'Var', V * P, None, binary * V * P),
+        ('Tau', 'Var', V * P * T, None, 0),
+        ('Epsilon_in', 'Var', V * PI * T, None, 0),
+        ('Epsilon_out', 'Var', V * PO * T, None, 0),
+        ('costs', 'Var', 3, None, 0),
+        ('peak_satisfaction', 'Constraint', E * len(co_demand) * T,
+         E * T * sum(1 + count(hub_in, co) + count(hub_out, co)
+                     for co in co_demand), 0),
+        ('edge_equation', 'Constraint', E * C * T,
+         E * T * edge_equation_nz, 0),
+        ('arc_flow_by_capacity', 'Constraint', A * Ct * T,
+         2 * A * Ct * T, 0)]
+    if timestep:
+        rows += [
+            ('arc_flow_unidirectionality', 'Constraint', A * Ct * T,
+             2 * A * Ct * T, 0),
+            ('arc_unidirectionality', 'Constraint', A * Ct * T,
+             2 * A * Ct * T, 0)]
+    else:
+        rows += [
+            ('arc_flow_direction', 'Constraint', A * len(co_directed) * T,
+             2 * A * len(co_directed) * T, 0)]
+    rows += [
+        ('edge_capacity', 'Constraint', E * Ct, 2 * E * Ct, 0),
+        ('hub_supply', 'Constraint', E * C * T,
+         E * T * sum(1 + count(hub_in, co) + count(hub_out, co)
+                     for co in co_all), 0),
+        ('hub_output_by_capacity', 'Constraint', E * H * T, 2 * E * H * T,
+         0),
+        ('hub_capacity', 'Constraint', E * H, E * H, 0),
+        ('vertex_equation', 'Constraint', V * C * T, T * vertex_equation_nz,
+         0),
+        ('source_vertices', 'Constraint', V * Cs * T, V * Cs * T, 0),
+        ('commodity_maximum', 'Constraint',
+         sum(1 for co in co_allowed_max
+             if count(process_in + hub_in, co) + count(process_out + hub_out,
+                                                       co)),
+         allowed_max_nz, 0),
+        ('process_throughput_by_capacity', 'Constraint', V * P * T,
+         2 * V * P * T, 0),
+        ('process_capacity_min', 'Constraint', V * P, 2 * V * P, 0),
+        ('process_capacity_max', 'Constraint', V * P, 2 * V * P, 0),
+        ('process_input', 'Constraint', V * PI * T, 2 * V * PI * T, 0),
+        ('process_output', 'Constraint', V * PO * T, 2 * V * PO * T, 0),
+        ('def_costs', 'Constraint', 3,
+         (E * H + 2 * V * P + 2 * E * Ct + 1) + (E * H + V * P + E * Ct + 1) +
+         (E * H * T + V * P * T + V * Cs * T + 1), 0)]
+    size = pd.DataFrame.from_records(
+        rows, columns=['component', 'type', 'size', 'nonzeros', 'binary'],
+        index='component')
+    size['nonzeros'] = size['nonzeros'].astype(float)
+
+    issues = _check_inputs(m, init)
+    return size, issues
+
+
+def _check_inputs(m, init):
+    """Return issues found by the checks described in analyze_inputs.
+
+    `m` and `init` are the parameter container and the set values returned
+    by ``prepare_inputs``.
+    """
+    process = m.params['process']
+    time = m.params['time']
+    r_in, r_out = m.r_in, m.r_out
+    edges = list(init['edge'])
+    vertices = list(init['vertex'])
+    hubs = list(init['hub'])
+    processes = list(init['process'])
+    co_demand = init['co_demand']
+    co_transportable = list(init['co_transportable'])
+    co_source = list(init['co_source'])
+    issues = []
+
+    # peak (kW) per edge and commodity
+    peak = m.peak.reindex(columns=sorted(co_demand)).fillna(0)
+    source = m.params['vertex'][co_source].fillna(0)
+
+    def producers(pairs, co):
+        return [p for (p, c) in pairs if c == co]
+
+    def max_supply(co, visiting=()):
+        """Sources plus production, limited by cap-max and inputs."""
+        supply = source[co].sum() if co in source.columns else 0
+        for p in producers(r_out.index, co):
+            if p not in processes and p not in hubs:
+                continue
+            locations = len(edges) if p in hubs else len(vertices)
+            throughput = process.loc[p, 'cap-max'] * locations
+            for (q, ci) in r_in.index:
+                if q == p and ci not in visiting:
+                    throughput = min(throughput, max_supply(
+                        ci, visiting + (co,)) / r_in[p, ci])
+            supply += throughput * r_out[p, co]
+        return supply
+
+    # supply >= demand
+    for co in sorted(co_demand):
+        scaling = time[co].max() if co in time.columns else 1
+        demand = peak[co].sum() * scaling
+        supply = max_supply(co)
+        if demand > supply:
+            issues.append("supply: peak demand {:.0f} kW of {} exceeds its "
+                          "supply capacity {:.0f} kW".format(demand, co,
+                                                             supply))
+
+    # commodities available per graph component
+    neighbours = {v: m.neighbours.get(v, []) for v in vertices}
+    component_of = connected_components(neighbours)
+    network, local = {}, {}
+    for v, comp in component_of.items():
+        network.setdefault(comp, set())
+        local.setdefault(comp, set())
+        for co in co_source:
+            if source.loc[v, co] > 0:
+                local[comp].add(co)
+                if co in co_transportable:
+                    network[comp].add(co)
+    running = set()
+    for comp in network:
+        changed = True
+        while changed:
+            changed = False
+            for p in processes:
+                inputs = [co for (q, co) in r_in.index if q == p]
+                if (process.loc[p, 'cap-max'] > 0 and
+                        all(co in local[comp] for co in inputs)):
+                    running.add(p)
+                    for co in [c for (q, c) in r_out.index if q == p]:
+                        if co not in local[comp]:
+                            local[comp].add(co)
+                            changed = True
+                        if co in co_transportable and \
+                                co not in network[comp]:
+                            network[comp].add(co)
+                            changed = True
+
+    # demand edges reachable
+    for co in sorted(co_demand):
+        unreachable = []
+        for (v1, v2) in edges:
+            if not peak.loc[(v1, v2), co] > 0:
+                continue
+            available = network[component_of[v1]]
+            if co in available:
+                continue
+            if any(process.loc[h, 'cap-max'] > 0 and
+                   all(ci in available for (g, ci) in r_in.index if g == h)
+                   for h in producers(r_out.index, co) if h in hubs):
+                continue
+            unreachable.append((v1, v2))
+        if unreachable:
+            issues.append("reachability: demand of {} can not be supplied "
+                          "in {} edges, e.g. {}".format(
+                              co, len(unreachable), unreachable[:5]))
+
+    for p in processes:
+        if p not in running and process.loc[p, 'cap-max'] > 0:
+            issues.append("processes: {} never runs, its inputs are not "
+                          "available".format(p))
+    return issues
@@ -0,0 +1,125 @@
+"""Per-component timings and sizes of a model build.
+
+``create_model`` adds one pyomo component after the other to a
+``ConcreteModel``, each is constructed (indices generated, rules called)
+when it is added. ``profile_model`` hooks into this step to find out,
+which sets, variables and constraints dominate build time and memory.
+
+Example
+-------
+::
+
+    prob, profile = profile_model(data, vertex, edge)
+    print(profile.sort_values('time', ascending=False).head())
+    init_run(engine, profiler=profile)
+"""
+import sys
+import time
+from pandas import DataFrame
+import pyomo.core as pyomo
+from pyomo.core.expr.visitor import identify_variables
+try:
+    from pyomo.core.base.block import BlockData
+except ImportError:  # pyomo < 6.7
+    from pyomo.core.base.block import _BlockData as BlockData
+from ..main.rivus import create_model
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+COLUMNS = ['type', 'time', 'size', 'nonzeros', 'rss_delta']
+
+
+def profile_model(data, vertex, edge, builder=create_model, **model_kwargs):
+    """Build a model and record construction statistics of its components.
+
+    Parameters
+    ----------
+    data, vertex, edge
+        As awaited by ``create_model``
+    builder : callable, optional
+        Function building the model of (data, vertex, edge, **model_kwargs),
+        ``create_model`` by default.
+    **model_kwargs
+        Passed to the builder.
+
+    Returns
+    -------
+    (prob, profile) tuple
+        + prob: the built model
+        + profile: DataFrame indexed by component name, in order of
+          construction, with columns
+
+          - type: Set, Var, Constraint, ...
+          - time: construction time (s)
+          - size: number of indices
+          - nonzeros: variables in the constraint (objective) bodies, NaN
+            for other components
+          - rss_delta: increase of the process' peak resident set size
+            (MB) during construction, NaN if unavailable (Windows)
+
+          A last row 'other' holds the build time spent outside of
+          component construction (input preparation). The DataFrame can
+          be stored as ``profiler`` with ``rivus.io.db.init_run``.
+    """
+    records = []
+    depth = [0]
+    add_component = BlockData.add_component
+
+    def profiled_add_component(block, name, val):
+        if depth[0] > 0:
+            # implicit components (e.g. index sets) count to their owner
+            return add_component(block, name, val)
+        depth[0] += 1
+        rss_before = _peak_rss()
+        start = time.perf_counter()
+        try:
+            return add_component(block, name, val)
+        finally:
+            duration = time.perf_counter() - start
+            depth[0] -= 1
+            records.append((name, val, duration, _peak_rss() - rss_before))
+
+    start = time.perf_counter()
+    BlockData.add_component = profiled_add_component
+    try:
+        prob = builder(data, vertex, edge, **model_kwargs)
+    finally:
+        BlockData.add_component = add_component
+    total = time.perf_counter() - start
+
+    rows = [(name, _ctype(component).__name__, duration, len(component),
+             _nonzeros(component), rss_delta)
+            for (name, component, duration, rss_delta) in records]
+    profile = DataFrame.from_records(rows, columns=['component'] + COLUMNS,
+                                     index='component')
+    profile.loc['other'] = ['', total - profile['time'].sum(), float('nan'),
+                            float('nan'), float('nan')]
+    return prob, profile
+
+
+def _ctype(component):
+    ctype = getattr(component, 'ctype', None)  # pyomo < 5.7: type()
+    return ctype if ctype is not None else component.type()
+
+
+def _nonzeros(component):
+    """Count variables in the bodies of a constraint or objective."""
+    if isinstance(component, pyomo.Constraint):
+        return sum(len(list(identify_variables(con.body)))
+                   for con in component.values())
+    if isinstance(component, pyomo.Objective):
+        return sum(len(list(identify_variables(obj.expr)))
+                   for obj in component.values())
+    return float('nan')
+
+
+def _peak_rss():
+    """Return the peak resident set size (MB) of this process."""
+    if resource is None:
+        return float('nan')
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 1024 ** (2 if sys.platform == 'darwin' else 1)
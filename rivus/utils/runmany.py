@@ -1,7 +1,26 @@
 """Functions are collected here, which can be useful in case of a massive
 runs involving analysis of a broader parameter-space.
 """
+from math import isfinite
 from numpy import arange
+import pyomo.core as pyomo
+from pyomo.opt import TerminationCondition
+from ..main.rivus import update_parameters
+
+# Variables whose values are kept between the solves of a sweep. They fix
+# the network layout (binary decisions) and capacities, the remaining flow
+# variables follow from them and are left to the solver.
+WARMSTART_VARIABLES = ('Xi', 'Psi', 'Delta', 'Phi')
+
+# Termination conditions, which never come with a usable solution
+NO_SOLUTION = (TerminationCondition.infeasible,
+               TerminationCondition.infeasibleOrUnbounded,
+               TerminationCondition.unbounded,
+               TerminationCondition.invalidProblem,
+               TerminationCondition.solverFailure,
+               TerminationCondition.internalSolverError,
+               TerminationCondition.error,
+               TerminationCondition.noSolution)
 
 
 def parameter_range(data_df, index, column, lim_lo=None, lim_up=None,
@@ -88,3 +107,98 @@ def parameter_range(data_df, index, column, lim_lo=None, lim_up=None,
         else:
             df.loc[index, column] = mod
         yield df
+
+
+def _clear_flow_values(prob, keep=WARMSTART_VARIABLES):
+    """Reset values of all variables but `keep`, to form a partial MIP start.
+    """
+    for var in prob.component_objects(pyomo.Var, active=True):
+        if var.local_name not in keep:
+            for vardata in var.values():
+                vardata.value = None
+
+
+def _found_solution(result):
+    """Return whether a solve yielded a feasible solution.
+
+    Besides optimal solutions, this is the incumbent of a solve that hit a
+    time or iteration limit, recognised by its finite objective value (the
+    upper bound of the minimisation).
+    """
+    condition = result.solver.termination_condition
+    if condition == TerminationCondition.optimal:
+        return True
+    if condition in NO_SOLUTION:
+        return False
+    try:
+        return isfinite(float(result.problem.upper_bound))
+    except (TypeError, ValueError):
+        return False
+
+
+def solve_sweep(prob, patches, optim, warmstart=True, tee=False):
+    """Solve one model instance for a sequence of parameter changes.
+
+    The model is created only once (with ``mutable_params=True``) and each
+    entry of `patches` is applied to it with
+    :func:`rivus.main.rivus.update_parameters` before it is re-solved.
+
+    + Persistent solver interfaces (e.g. ``SolverFactory('appsi_highs')``)
+      keep the problem loaded in the solver and only receive the changed
+      coefficients.
+    + If the solver is warm start capable (appsi_highs, cbc, gurobi), the
+      previous values of the binaries ``Xi``, ``Psi`` (or ``Delta``) and
+      ``Phi`` are passed as MIP start. The other variable values are
+      cleared beforehand.
+    + Other solvers (e.g. glpk) are called cold on the updated model.
+      The model itself is not rebuilt, but pyomo's file-based interfaces
+      (glpk, cbc) write the complete problem file again for each solve.
+      Writing it once and only patching the changed coefficients is not
+      implemented.
+    + A feasible solution (optimal, or the incumbent of a time-limited
+      solve) is used as MIP start for the next patch.
+
+    Parameters
+    ----------
+    prob : ConcreteModel
+        rivus model instance, created with ``mutable_params=True``
+    patches : iterable
+        Each item is a `data_patch` as accepted by ``update_parameters``,
+        e.g. ``{'commodity': {'Elec': {'cost-var': 0.2}}}``
+    optim : SolverFactory
+        pyomo Solver object, e.g. prepared with
+        :func:`rivus.utils.prerun.setup_solver`
+    warmstart : bool, optional
+        If False, every solve is started cold.
+    tee : bool, optional
+        Pipe solver output to stdout.
+
+    Yields
+    ------
+    (patch, result)
+        The applied patch and the pyomo results object of its solve.
+        The solution is loaded into `prob` while the loop body runs.
+
+    Example
+    -------
+    ::
+
+        prob = create_model(data, vertex, edge, mutable_params=True)
+        optim = setup_solver(SolverFactory('appsi_highs'))
+        patches = [{'commodity': {'Elec': {'cost-var': val}}}
+                   for val in (0.15, 0.2, 0.25)]
+        for patch, result in solve_sweep(prob, patches, optim):
+            print(patch, pyomo.value(prob.obj))
+    """
+    can_warmstart = (warmstart and hasattr(optim, 'warm_start_capable') and
+                     optim.warm_start_capable())
+    has_solution = False
+    for patch in patches:
+        update_parameters(prob, patch)
+        if can_warmstart and has_solution:
+            _clear_flow_values(prob)
+            result = optim.solve(prob, tee=tee, warmstart=True)
+        else:
+            result = optim.solve(prob, tee=tee)
+        has_solution = _found_solution(result)
+        yield patch, result
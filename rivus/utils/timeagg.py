@@ -0,0 +1,223 @@
+"""Aggregation of long time series into few representative time steps.
+
+The size of a rivus model (and the number of ``Psi`` binaries) grows
+linearly with the number of time steps. With ``aggregate_time`` a long
+demand scaling series (e.g. 8760 hours) is clustered into `k` representative
+time steps, whose weights sum up to the represented duration. The resulting
+frame can replace the `time` sheet of ``read_excel``::
+
+    hourly = pd.read_csv('scaling.csv', index_col=0)  # columns Elec, Heat
+    data = read_excel(data_spreadsheet)
+    data['time'], labels, report = aggregate_time(hourly, k=6)
+    print(report)
+    prob = create_model(data, vertex, edge)
+"""
+import numpy as np
+import pandas as pd
+
+
+def aggregate_time(scaling, k, method='kmeans', keep_peak=True, seed=0,
+                   max_iter=300):
+    """Cluster time steps of a demand scaling series into k representatives.
+
+    Parameters
+    ----------
+    scaling : DataFrame
+        One row per time step, one column of demand scaling factors per
+        commodity (e.g. 'Elec', 'Heat'). A column 'weight' (e.g. hours per
+        step) is used as weight of the steps, if present, otherwise each
+        step weighs 1.
+    k : int
+        Number of representative time steps.
+    method : str, optional
+        'kmeans' (representatives are weighted means, which preserves the
+        total demand) or 'kmedoids' (representatives are actual time steps).
+    keep_peak : bool, optional
+        If True, the time step with the maximum of each column is kept as a
+        representative of its own, so the network is sized for the true peak.
+    seed : int, optional
+        Seed of the random initialisation, for reproducible results.
+    max_iter : int, optional
+        Maximum number of assignment/update iterations.
+
+    Returns
+    -------
+    (time, labels, report) tuple
+        + time: DataFrame indexed by 'Time' with columns 'weight' and the
+          scaling columns, as in the `time` sheet of ``read_excel``.
+          Peak steps come first, the rest is sorted by descending demand.
+        + labels: Series, the representative ('Time' label) of each step.
+        + report: DataFrame with one row per scaling column and the errors
+          between the full and the aggregated series: 'rmse', 'mae', 'max'
+          (absolute), 'energy' (relative error of the weighted sum) and
+          'peak' (relative error of the maximum).
+    """
+    if method not in ('kmeans', 'kmedoids'):
+        raise ValueError("Unknown method '{}'".format(method))
+
+    columns = [col for col in scaling.columns if col != 'weight']
+    values = scaling[columns].values.astype(float)
+    if 'weight' in scaling.columns:
+        weights = scaling['weight'].values.astype(float)
+    else:
+        weights = np.ones(len(scaling))
+    if not 0 < k <= len(values):
+        raise ValueError("k must be in 1..{}, got {}".format(len(values), k))
+
+    if keep_peak:
+        peaks = list(np.unique(values.argmax(axis=0)))
+    else:
+        peaks = []
+    if len(peaks) >= k:
+        raise ValueError("k={} leaves no cluster besides the {} peak steps"
+                         .format(k, len(peaks)))
+    rest = np.setdiff1d(np.arange(len(values)), peaks)
+
+    rng = np.random.RandomState(seed)
+    if method == 'kmeans':
+        centers, assignment = _kmeans(values[rest], weights[rest],
+                                      k - len(peaks), rng, max_iter)
+    else:
+        centers, assignment = _kmedoids(values[rest], weights[rest],
+                                        k - len(peaks), rng, max_iter)
+
+    # clusters of the whole series: peaks first, the others sorted by
+    # descending demand
+    order = np.argsort(-centers.sum(axis=1), kind='stable')
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    cluster = np.empty(len(values), dtype=int)
+    cluster[peaks] = np.arange(len(peaks))
+    cluster[rest] = len(peaks) + rank[assignment]
+    representatives = np.vstack([values[peaks], centers[order]])
+
+    digits = len(str(k - 1))
+    names = ['t{:0{}d}'.format(c, digits) for c in range(k)]
+    time = pd.DataFrame(representatives, columns=columns,
+                        index=pd.Index(names, name='Time'))
+    time.insert(0, 'weight', np.bincount(cluster, weights=weights,
+                                         minlength=k))
+    labels = pd.Series(np.array(names)[cluster], index=scaling.index,
+                       name='Time')
+
+    report = aggregation_error(scaling[columns], weights,
+                               representatives[cluster])
+    return time, labels, report
+
+
+def aggregation_error(scaling, weights, approximation):
+    """Compare a scaling series with its aggregated approximation.
+
+    Parameters
+    ----------
+    scaling : DataFrame
+        Full series, one column per commodity.
+    weights : array
+        Weight (duration) of each time step.
+    approximation : array
+        Value of the representative time step of each row of `scaling`.
+
+    Returns
+    -------
+    DataFrame
+        One row per column of `scaling`, errors as columns: 'rmse', 'mae',
+        'max', 'energy' and 'peak'.
+    """
+    values = scaling.values.astype(float)
+    diff = approximation - values
+    share = weights / weights.sum()
+    energy = (weights[:, np.newaxis] * values).sum(axis=0)
+    energy_approx = (weights[:, np.newaxis] * approximation).sum(axis=0)
+    peak = values.max(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        report = pd.DataFrame({
+            'rmse': np.sqrt((share[:, np.newaxis] * diff ** 2).sum(axis=0)),
+            'mae': (share[:, np.newaxis] * np.abs(diff)).sum(axis=0),
+            'max': np.abs(diff).max(axis=0),
+            'energy': (energy_approx - energy) / energy,
+            'peak': (approximation.max(axis=0) - peak) / peak},
+            index=scaling.columns)
+    return report
+
+
+def _squared_distances(points, centers):
+    """Squared euclidean distances, points x centers."""
+    return ((points[:, np.newaxis, :] - centers[np.newaxis, :, :]) ** 2
+            ).sum(axis=2)
+
+
+def _init_centers(points, weights, k, rng):
+    """k-means++ seeding, choosing k distinct points."""
+    chosen = [rng.choice(len(points), p=weights / weights.sum())]
+    closest = _squared_distances(points, points[chosen]).min(axis=1)
+    for _ in range(1, k):
+        prob = weights * closest
+        if prob.sum() == 0:
+            # all points coincide with centers: pick any unchosen one
+            prob = np.ones(len(points))
+            prob[chosen] = 0
+        chosen.append(rng.choice(len(points), p=prob / prob.sum()))
+        closest = np.minimum(
+            closest, _squared_distances(points, points[chosen[-1:]])[:, 0])
+    return np.array(chosen)
+
+
+def _kmeans(points, weights, k, rng, max_iter):
+    """Weighted Lloyd iteration.
+
+    Returns
+    -------
+    (centers, assignment)
+        k x columns array of weighted cluster means, cluster of each point
+    """
+    centers = points[_init_centers(points, weights, k, rng)]
+    assignment = None
+    for _ in range(max_iter):
+        new_assignment = _squared_distances(points, centers).argmin(axis=1)
+        if assignment is not None and (new_assignment == assignment).all():
+            break
+        assignment = new_assignment
+        for c in range(k):
+            members = assignment == c
+            if members.any():
+                centers[c] = np.average(points[members], axis=0,
+                                        weights=weights[members])
+    return centers, assignment
+
+
+def _kmedoids(points, weights, k, rng, max_iter):
+    """Weighted alternating (Voronoi iteration) k-medoids.
+
+    Returns
+    -------
+    (medoids, assignment)
+        k x columns array of medoid points, cluster of each point
+    """
+    medoids = _init_centers(points, weights, k, rng)
+    assignment = None
+    for _ in range(max_iter):
+        new_assignment = _squared_distances(points,
+                                            points[medoids]).argmin(axis=1)
+        if assignment is not None and (new_assignment == assignment).all():
+            break
+        assignment = new_assignment
+        for c in range(k):
+            members = np.flatnonzero(assignment == c)
+            if len(members):
+                medoids[c] = members[_medoid(points[members],
+                                             weights[members])]
+    return points[medoids], assignment
+
+
+def _medoid(points, weights, chunk_size=1000):
+    """Position of the point with the least weighted distance to the others.
+
+    Distances are computed for `chunk_size` points at a time, to limit
+    memory use for large clusters.
+    """
+    costs = np.empty(len(points))
+    for start in range(0, len(points), chunk_size):
+        chunk = points[start:start + chunk_size]
+        distances = np.sqrt(_squared_distances(chunk, points))
+        costs[start:start + chunk_size] = distances.dot(weights)
+    return costs.argmin()
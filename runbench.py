@@ -0,0 +1,316 @@
+"""Benchmark model creation time on the bundled datasets.
+
+Usage::
+
+    python runbench.py                    # all datasets
+    python runbench.py mnl haag           # selected datasets
+    python runbench.py commodity_maximum  # constraint micro-benchmark
+    python runbench.py solve mnl haag     # time-to-optimal, big-M variants
+    python runbench.py formulation mnl    # time step vs. aggregated flows
+    python runbench.py warmstart mnl      # with and without Steiner start
+
+All solving benchmarks use ``SOLVER``, the HiGHS MIP solver through
+pyomo's persistent interface ('appsi_highs', requires the ``highspy``
+package). Its timings are not comparable with those of other solvers.
+
+For every dataset, ``create_model`` is called ``REPEAT`` times on fresh
+copies of the input data (as it changes its inputs) and the best and mean
+build times are printed, together with the number of variables and
+constraints of the resulting model and the size of its LP file.
+
+The ``commodity_maximum`` micro-benchmark builds a 20x20 square grid with 24
+time steps and times the construction of the ``commodity_maximum``
+constraint alone.
+
+The ``solve`` benchmark solves each dataset with ``SOLVER`` twice, with
+the commodity cap-max as big-M of the flow and capacity constraints
+(``tighten_bounds=False``) and with the bounds derived from demand
+(``tighten_bounds=True``), and prints the time to optimality and the
+objective values.
+
+The ``formulation`` benchmark solves each dataset with ``SOLVER`` in the
+time step and in the aggregated flow formulation (see ``create_model``) and
+prints the number of binaries, the time to optimality and the objective
+values, together with the relative objective increase of the aggregated
+formulation.
+
+The ``warmstart`` benchmark solves each dataset with ``SOLVER`` without and
+with a MIP start from the Steiner tree heuristic (see
+``rivus.graph.steiner``) and prints the heuristic's time and objective and
+the time to optimality. The solver must be warm start capable, e.g.
+'appsi_highs', 'cbc' or 'gurobi'.
+"""
+import gc
+import os
+import sys
+import tempfile
+from copy import deepcopy
+from time import time as timenow
+
+import numpy as np
+import pandas as pd
+
+import pyomo.environ  # although it is not used directly, it is needed by pyomo
+import pyomo.core as pyomo
+from pyomo.opt.base import SolverFactory
+from rivus.main import rivus
+from rivus.graph.steiner import steiner_design, design_start
+from rivus.utils import pandashp as pdshp
+from rivus.gridder.create_grid import create_square_grid
+from rivus.gridder.extend_grid import extend_edge_data
+from rivus.gridder.extend_grid import vert_init_commodities
+
+REPEAT = 3
+SOLVER = 'appsi_highs'
+
+
+def prepare_mnl():
+    """Return (data, vertex, edge) of the data/mnl example, as in runmin.py"""
+    base_directory = os.path.join('data', 'mnl')
+    buildings = pdshp.read_shp(os.path.join(base_directory, 'building'))
+    buildings_grouped = buildings.groupby(['nearest', 'type'])
+    total_area = buildings_grouped.sum()['total_area'].unstack()
+
+    edge = pdshp.read_shp(os.path.join(base_directory, 'edge'))
+    edge = edge.set_index('Edge')
+    edge = edge.join(total_area)
+    edge = edge.fillna(0)
+
+    vertex = pdshp.read_shp(os.path.join(base_directory, 'vertex'))
+    data = rivus.read_excel(os.path.join(base_directory, 'data.xlsx'))
+    return data, vertex, edge
+
+
+def prepare_haag():
+    """Return (data, vertex, edge) of the data/haag example, as in runhaag.py"""
+    base_directory = os.path.join('data', 'haag')
+    buildings = pdshp.read_shp(os.path.join(base_directory, 'building'))
+    building_type_mapping = {
+        'church': 'other',
+        'farm': 'other',
+        'hospital': 'residential',
+        'hotel': 'commercial',
+        'house': 'residential',
+        'office': 'commercial',
+        'retail': 'commercial',
+        'school': 'commercial',
+        'yes': 'other'}
+    buildings.replace(to_replace={'type': building_type_mapping},
+                      inplace=True)
+    buildings_grouped = buildings.groupby(['nearest', 'type'])
+    total_area = buildings_grouped.sum()['AREA'].unstack()
+
+    edge = pdshp.read_shp(os.path.join(base_directory, 'edge'))
+    edge = edge.set_index('Edge')
+    edge = edge.join(total_area)
+    edge = edge.fillna(0)
+
+    vertex = pdshp.read_shp(os.path.join(base_directory, 'vertex'))
+    data = rivus.read_excel(os.path.join(base_directory, 'data.xlsx'))
+    return data, vertex, edge
+
+
+def prepare_grid(num_edge=20, num_timesteps=24):
+    """Return (data, vertex, edge) of a square grid with hourly time steps.
+
+    Non-spatial data is taken from data/chessboard, its `time` table is
+    replaced by ``num_timesteps`` equally weighted steps of a daily profile.
+    """
+    vertex, edge = create_square_grid(num_edge_x=num_edge, dx=100)
+    extend_edge_data(edge)  # only residential, with 1000 kW init
+    vert_init_commodities(vertex, ('Elec', 'Gas', 'Heat'),
+                          [('Elec', 0, 160000),
+                           ('Gas', len(vertex) - 1, 500000)])
+
+    data = rivus.read_excel(os.path.join('data', 'chessboard', 'data.xlsx'))
+    hours = np.arange(num_timesteps)
+    scaling = 0.65 + 0.35 * np.cos(2 * np.pi * (hours - 18) / num_timesteps)
+    data['time'] = pd.DataFrame(
+        {'weight': 8760. / num_timesteps, 'Elec': scaling, 'Heat': scaling},
+        index=pd.Index(['t{:02d}'.format(h) for h in hours], name='Time'))
+    return data, vertex, edge
+
+
+DATASETS = {
+    'mnl': prepare_mnl,
+    'haag': prepare_haag}
+
+
+def model_size(prob):
+    """Return number of variables and constraints of a model instance."""
+    num_vars = sum(len(var) for var in
+                   prob.component_objects(pyomo.Var, active=True))
+    num_cons = sum(len(con) for con in
+                   prob.component_objects(pyomo.Constraint, active=True))
+    return num_vars, num_cons
+
+
+def num_binaries(prob):
+    """Return number of binary variables of a model instance."""
+    return sum(1 for var in prob.component_data_objects(pyomo.Var,
+                                                         active=True)
+               if var.is_binary())
+
+
+def lp_file_size(prob):
+    """Return size (in bytes) of the LP file written for a model instance."""
+    handle, lp_filename = tempfile.mkstemp(suffix='.lp')
+    os.close(handle)
+    try:
+        prob.write(lp_filename)
+        return os.path.getsize(lp_filename)
+    finally:
+        os.remove(lp_filename)
+
+
+def bench_create_model(data, vertex, edge, repeat=REPEAT, **model_kwargs):
+    """Time ``create_model`` on fresh copies of the input.
+
+    Returns
+    -------
+    (best, mean, prob)
+        fastest and mean build time in seconds and the last model instance
+    """
+    timings = []
+    for _ in range(repeat):
+        _data, _vertex, _edge = deepcopy((data, vertex, edge))
+        start = timenow()
+        prob = rivus.create_model(_data, _vertex, _edge, **model_kwargs)
+        timings.append(timenow() - start)
+    return min(timings), sum(timings) / len(timings), prob
+
+
+def bench_commodity_maximum(prob, repeat=REPEAT):
+    """Time construction of the commodity_maximum constraint on a model.
+
+    Returns
+    -------
+    (best, mean)
+        fastest and mean construction time in seconds
+    """
+    timings = []
+    for k in range(repeat):
+        # do not let garbage of the model creation distort the timing
+        gc.collect()
+        start = timenow()
+        prob.add_component(
+            'commodity_maximum_bench{}'.format(k),
+            pyomo.Constraint(prob.co_allowed_max,
+                             rule=rivus.commodity_maximum_rule))
+        timings.append(timenow() - start)
+    return min(timings), sum(timings) / len(timings)
+
+
+def bench_solve(data, vertex, edge, solver=SOLVER, warmstart=False,
+                **model_kwargs):
+    """Build and solve a model on copies of the input.
+
+    With `warmstart`, the Steiner tree heuristic's design is passed to the
+    solver as MIP start, which must be warm start capable.
+
+    Returns
+    -------
+    (duration, objective, termination condition, number of binaries)
+    """
+    _data, _vertex, _edge = deepcopy((data, vertex, edge))
+    prob = rivus.create_model(_data, _vertex, _edge, **model_kwargs)
+    optim = SolverFactory(solver)
+    if warmstart and not optim.warm_start_capable():
+        raise ValueError("Solver '{}' does not accept a MIP start."
+                         .format(solver))
+    start = timenow()
+    if warmstart:
+        design_start(prob, steiner_design(prob))
+        result = optim.solve(prob, warmstart=True)
+    else:
+        result = optim.solve(prob)
+    duration = timenow() - start
+    return (duration, pyomo.value(prob.obj),
+            result.solver.termination_condition, num_binaries(prob))
+
+
+def run_solve_bench(names):
+    for name in names:
+        data, vertex, edge = DATASETS[name]()
+        for tighten_bounds in (False, True):
+            duration, objective, condition, _ = bench_solve(
+                data, vertex, edge, tighten_bounds=tighten_bounds)
+            print('{:8s} tighten_bounds={!s:5s} solve {:8.2f}s  '
+                  'obj {:14.2f}  ({})'.format(name, tighten_bounds,
+                                              duration, objective,
+                                              condition))
+
+
+def run_formulation_bench(names):
+    for name in names:
+        data, vertex, edge = DATASETS[name]()
+        objectives = {}
+        for formulation in ('timestep', 'aggregated'):
+            duration, objective, condition, binaries = bench_solve(
+                data, vertex, edge, flow_formulation=formulation)
+            objectives[formulation] = objective
+            print('{:8s} {:10s} #bin {:6d}  solve {:8.2f}s  '
+                  'obj {:14.2f}  ({})'.format(name, formulation, binaries,
+                                              duration, objective,
+                                              condition))
+        print('{:8s} aggregated objective {:+.2%}'.format(
+            name, objectives['aggregated'] / objectives['timestep'] - 1))
+
+
+def run_warmstart_bench(names):
+    if not SolverFactory(SOLVER).warm_start_capable():
+        print("warmstart skipped: solver '{}' does not accept a MIP start."
+              .format(SOLVER))
+        return
+    for name in names:
+        data, vertex, edge = DATASETS[name]()
+        prob = rivus.create_model(*deepcopy((data, vertex, edge)))
+        start = timenow()
+        violated = design_start(prob, steiner_design(prob))
+        duration = timenow() - start
+        print('{:8s} steiner heuristic {:8.2f}s  obj {:14.2f}  '
+              '({} violations)'.format(name, duration, pyomo.value(prob.obj),
+                                       len(violated)))
+        for warmstart in (False, True):
+            duration, objective, condition, _ = bench_solve(
+                data, vertex, edge, warmstart=warmstart)
+            print('{:8s} warmstart={!s:5s} solve {:8.2f}s  '
+                  'obj {:14.2f}  ({})'.format(name, warmstart, duration,
+                                              objective, condition))
+
+
+def run_commodity_maximum_bench():
+    data, vertex, edge = prepare_grid(num_edge=20, num_timesteps=24)
+    prob = rivus.create_model(data, vertex, edge)
+    best, mean = bench_commodity_maximum(prob)
+    print('20x20 grid, 24 time steps: commodity_maximum best {:7.3f}s  '
+          'mean {:7.3f}s'.format(best, mean))
+
+
+def run_bench(names):
+    for name in names:
+        data, vertex, edge = DATASETS[name]()
+        best, mean, prob = bench_create_model(data, vertex, edge)
+        num_vars, num_cons = model_size(prob)
+        lp_size = lp_file_size(prob)
+        print('{:8s} create_model best {:7.3f}s  mean {:7.3f}s  '
+              '#vars {:7d}  #cons {:7d}  LP {:6.2f} MB'
+              .format(name, best, mean, num_vars, num_cons, lp_size / 1e6))
+
+
+if __name__ == '__main__':
+    names = sys.argv[1:] or sorted(DATASETS)
+    if 'commodity_maximum' in names:
+        names.remove('commodity_maximum')
+        run_commodity_maximum_bench()
+    if 'solve' in names:
+        names.remove('solve')
+        run_solve_bench(names or sorted(DATASETS))
+    elif 'formulation' in names:
+        names.remove('formulation')
+        run_formulation_bench(names or sorted(DATASETS))
+    elif 'warmstart' in names:
+        names.remove('warmstart')
+        run_warmstart_bench(names or sorted(DATASETS))
+    else:
+        run_bench(names)
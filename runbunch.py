@@ -28,6 +28,7 @@ from rivus.io import db as rdb
 from rivus.graph.to_graph import to_nx
 from rivus.graph.analysis import minimal_graph_anal
 from rivus.main.rivus import read_excel, create_model, get_constants
+from rivus.main.rivus import update_parameters
 # EMAIL NOTIFICATION
 from rivus.utils.notify import email_me
 # =========================================================
@@ -155,6 +156,18 @@ def run_bunch(use_email=False):
                 dim_x = num_edge_x + 1
                 dim_y = dim_x
                 for _vdf in _source_variations(vdf, dim_x, dim_y):
+                    # Build the model once per spatial setup with mutable
+                    # parameters, variants only patch it in place.
+                    # Use temporal local versions.
+                    # As create_model is destructive. See Issue #31.
+                    __vdf = deepcopy(_vdf)
+                    __edf = deepcopy(edf)
+                    __data = deepcopy(original_data)
+                    print('\tcreating model')
+                    _p_model = timenow()
+                    prob = create_model(__data, __vdf, __edf,
+                                        mutable_params=True)
+                    profile_log['model_creation'] = (timenow() - _p_model)
                     for param in interesting_parameters:
                         para_name = param['args']['column']
                         print('{0}\n{3}x{3} grid\t'
@@ -167,16 +180,10 @@ def run_bunch(use_email=False):
                                        [param['args']['column']])
                             print('variant <{0}>:{1}'.format(counter, changed))
                             counter = counter + 1
-                            # Use temporal local versions.
-                            # As create_model is destructive. See Issue #31.
-                            __vdf = deepcopy(_vdf)
-                            __edf = deepcopy(edf)
-                            __data = data.copy()
-                            __data[param['df_name']] = variant
-                            print('\tcreating model')
+                            print('\tupdating model')
                             _p_model = timenow()
-                            prob = create_model(__data, __vdf, __edf)
-                            profile_log['model_creation'] = (
+                            update_parameters(prob, {param['df_name']: variant})
+                            profile_log['model_update'] = (
                                 timenow() - _p_model)
                             _p_solve = timenow()
                             print('\tsolving...')
@@ -243,12 +250,15 @@ def run_bunch(use_email=False):
                                     sub = run_summary + '[rivus][db-error]'
                                     email_me(db_error, subject=sub,
                                              **email_setup)
-                            del __vdf
-                            del __edf
-                            del __data
                             print('\tRun ended with: <{}>\n'.format(outcome))
 
-                        data = original_data
+                        # reset the swept parameter for the next one
+                        update_parameters(
+                            prob, {param['df_name']:
+                                   original_data[param['df_name']]})
+                    del __vdf
+                    del __edf
+                    del __data
                 if use_email:
                     status_txt = ('Finished iteration with edge number {}\n'
                                   'did: [source-var, param-seek]\n'
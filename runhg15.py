@@ -10,6 +10,8 @@ import geopandas
 import os
 from rivus.utils import pandashp as pdshp
 from rivus.main import rivus
+from rivus.utils.cache import cached_solve
+from rivus.io.archive import save_result
 from datetime import datetime
 
 base_directory = os.path.join('data', 'haag15')
@@ -219,18 +221,20 @@ def run_scenario(scenario, result_dir):
 
     log_filename = os.path.join(result_dir, sce + '.log')
 
-    # create & solve model
-    prob = rivus.create_model(data, vertex, edge)
-    if PYOMO3:
-        prob = prob.create()  # no longer needed in Pyomo 4+
+    # create & solve model, or load it from the cache of an identical run
     optim = SolverFactory('glpk')
     optim = setup_solver(optim, logfile=log_filename)
-    result = optim.solve(prob, tee=True)
     if PYOMO3:
+        prob = rivus.create_model(data, vertex, edge)
+        prob = prob.create()  # no longer needed in Pyomo 4+
+        result = optim.solve(prob, tee=True)
         prob.load(result)  # no longer needed in Pyomo 4+
+    else:
+        prob, _ = cached_solve(data, vertex, edge, optim, tee=True,
+                               cache_dir=os.path.join('result', 'cache'))
 
     # report
-    rivus.save(prob, os.path.join(result_dir, sce + '.pgz'))
+    save_result(prob, os.path.join(result_dir, sce + '.npz'))
     rivus.report(prob, os.path.join(result_dir, sce + '.xlsx'))
 
     # plot without buildings
@@ -39,63 +39,64 @@ def setup_solver(optim):
             "'{}'!".format(optim.name))
     return optim
 
-# load buildings and sum by type and nearest edge ID
-# 1. read shapefile to DataFrame (with special geometry column)
-# 2. group DataFrame by columns 'nearest' (ID of nearest edge) and 'type'
-#    (residential, commercial, industrial, other)
-# 3. sum by group and unstack, i.e. convert secondary index 'type' to columns
-buildings = pdshp.read_shp(building_shapefile)
-building_type_mapping = { 
-'church': 'other', 
-'farm': 'other',
-'hospital': 'residential',  
-'hotel': 'commercial',
-'house': 'residential',
-'office': 'commercial',
-'retail': 'commercial', 
-'school': 'commercial',  
-'yes': 'other',
-}
-buildings.replace(to_replace={'type': building_type_mapping}, inplace=True)
-buildings_grouped = buildings.groupby(['nearest', 'type'])
-total_area = buildings_grouped.sum()['AREA'].unstack()
 
-# load edges (streets) and join with summed areas 
-# 1. read shapefile to DataFrame (with geometry column)
-# 2. join DataFrame total_area on index (=ID)
-# 3. fill missing values with 0
-edge = pdshp.read_shp(edge_shapefile)
-edge = edge.set_index('Edge')
-edge = edge.join(total_area)
-edge = edge.fillna(0)
+if __name__ == '__main__':
+    # load buildings and sum by type and nearest edge ID
+    # 1. read shapefile to DataFrame (with special geometry column)
+    # 2. group DataFrame by columns 'nearest' (ID of nearest edge) and 'type'
+    #    (residential, commercial, industrial, other)
+    # 3. sum by group and unstack, i.e. convert secondary index 'type' to columns
+    buildings = pdshp.read_shp(building_shapefile)
+    building_type_mapping = { 
+    'church': 'other', 
+    'farm': 'other',
+    'hospital': 'residential',  
+    'hotel': 'commercial',
+    'house': 'residential',
+    'office': 'commercial',
+    'retail': 'commercial', 
+    'school': 'commercial',  
+    'yes': 'other',
+    }
+    buildings.replace(to_replace={'type': building_type_mapping}, inplace=True)
+    buildings_grouped = buildings.groupby(['nearest', 'type'])
+    total_area = buildings_grouped.sum()['AREA'].unstack()
 
-# load nodes
-vertex = pdshp.read_shp(vertex_shapefile)
+    # load edges (streets) and join with summed areas 
+    # 1. read shapefile to DataFrame (with geometry column)
+    # 2. join DataFrame total_area on index (=ID)
+    # 3. fill missing values with 0
+    edge = pdshp.read_shp(edge_shapefile)
+    edge = edge.set_index('Edge')
+    edge = edge.join(total_area)
+    edge = edge.fillna(0)
 
-# load spreadsheet data
-data = rivus.read_excel(data_spreadsheet)
+    # load nodes
+    vertex = pdshp.read_shp(vertex_shapefile)
 
-# create & solve model
-prob = rivus.create_model(data, vertex, edge)
-if PYOMO3:
-    prob = prob.create()  # no longer needed in Pyomo 4
-optim = SolverFactory('glpk')
-optim = setup_solver(optim)
-result = optim.solve(prob, tee=True)
-if PYOMO3:
-    prob.load(result)  # no longer needed in Pyomo 4
+    # load spreadsheet data
+    data = rivus.read_excel(data_spreadsheet)
 
-# load results
-costs, Pmax, Kappa_hub, Kappa_process = rivus.get_constants(prob)
-source, flows, hub_io, proc_io, proc_tau = rivus.get_timeseries(prob)
+    # create & solve model
+    prob = rivus.create_model(data, vertex, edge)
+    if PYOMO3:
+        prob = prob.create()  # no longer needed in Pyomo 4
+    optim = SolverFactory('glpk')
+    optim = setup_solver(optim)
+    result = optim.solve(prob, tee=True)
+    if PYOMO3:
+        prob.load(result)  # no longer needed in Pyomo 4
 
-result_dir = os.path.join('result', os.path.basename(base_directory))
+    # load results
+    costs, Pmax, Kappa_hub, Kappa_process = rivus.get_constants(prob)
+    source, flows, hub_io, proc_io, proc_tau = rivus.get_timeseries(prob)
 
-# create result directory if not existing already
-if not os.path.exists(result_dir):
-    os.makedirs(result_dir)
+    result_dir = os.path.join('result', os.path.basename(base_directory))
 
-rivus.save(prob, os.path.join(result_dir, 'prob.pgz'))
-rivus.report(prob, os.path.join(result_dir, 'prob.xlsx'))
-rivus.result_figures(prob, os.path.join(result_dir, 'plot'))
+    # create result directory if not existing already
+    if not os.path.exists(result_dir):
+        os.makedirs(result_dir)
 
+    rivus.save(prob, os.path.join(result_dir, 'prob.pgz'))
+    rivus.report(prob, os.path.join(result_dir, 'prob.xlsx'))
+    rivus.result_figures(prob, os.path.join(result_dir, 'plot'))